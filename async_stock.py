@@ -0,0 +1,123 @@
+import asyncio
+import os
+from singleflight import Async_Single_Flight
+from stock import Cache_Miss, cache_only
+
+FINANCIAL_DATASETS = ('company-overview', 'balance-sheet', 'cashflow', 'income-statement')
+DATASET_METHODS = {
+    'company-overview': 'company_overview',
+    'balance-sheet': 'get_balance_sheet',
+    'cashflow': 'get_cashflow',
+    'income-statement': 'get_income_statement',
+}
+
+STATEMENT_DATASETS = ('balance-sheet', 'cashflow', 'income-statement')
+
+BATCH_MAX_TICKERS = int(os.getenv("BATCH_MAX_TICKERS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+
+
+class Async_Data_Retriever:
+    """Awaitable facade over Data_Retriever.
+
+    Every blocking call is sent to the shared Upstream_Executor, and identical
+    concurrent calls are collapsed so they hold a single worker thread.
+    Retriever methods are first tried against the cache on the loop's
+    default threads, so fresh hits never queue for an upstream worker
+    behind calls waiting on the rate limiter.
+    """
+
+    def __init__(self, retriever, executor) -> None:
+        self.retriever = retriever
+        self.executor = executor
+        self.flights = Async_Single_Flight()
+
+    async def call(self, name, *args, timeout=None):
+        method = getattr(self.retriever, name)
+        if self.retriever.cache is not None:
+            try:
+                return await asyncio.to_thread(self._from_cache, method, *args)
+            except Cache_Miss:
+                pass
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        return await self.flights.do((name,) + args, lambda: self.executor.run(method, *args, **kwargs))
+
+    @staticmethod
+    def _from_cache(method, *args):
+        # to_thread runs us in a copy of the context, the flag stays local
+        cache_only.set(True)
+        return method(*args)
+
+    async def run(self, fn, *args, timeout=None):
+        """Run an arbitrary blocking helper (e.g. fetch_ticker_info) off-loop."""
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        key = (getattr(fn, '__qualname__', repr(fn)),) + args
+        return await self.flights.do(key, lambda: self.executor.run(fn, *args, **kwargs))
+
+    async def company_overview(self, ticker, timeout=None):
+        return await self.call('company_overview', ticker, timeout=timeout)
+
+    async def get_balance_sheet(self, ticker, shape='records', timeout=None):
+        return await self.call('get_balance_sheet', ticker, shape, timeout=timeout)
+
+    async def get_cashflow(self, ticker, shape='records', timeout=None):
+        return await self.call('get_cashflow', ticker, shape, timeout=timeout)
+
+    async def get_income_statement(self, ticker, shape='records', timeout=None):
+        return await self.call('get_income_statement', ticker, shape, timeout=timeout)
+
+    async def get_shareholders(self, ticker, timeout=None):
+        return await self.call('get_shareholders', ticker, timeout=timeout)
+
+    async def historical_data(self, ticker, period, timeout=None):
+        return await self.call('historical_data', ticker, period, timeout=timeout)
+
+    async def get_history(self, ticker, timeout=None):
+        return await self.call('get_history', ticker, timeout=timeout)
+
+    async def get_latest_history(self, ticker, timeout=None):
+        return await self.call('get_latest_history', ticker, timeout=timeout)
+
+    async def industry_wise_grouping(self, industry, timeout=None):
+        return await self.call('industry_wise_grouping', industry, timeout=timeout)
+
+    async def dataset(self, ticker, dataset, shape='records', timeout=None):
+        if dataset in STATEMENT_DATASETS:
+            return await self.call(DATASET_METHODS[dataset], ticker, shape, timeout=timeout)
+        return await self.call(DATASET_METHODS[dataset], ticker, timeout=timeout)
+
+    async def financials(self, ticker, datasets=FINANCIAL_DATASETS, shape='records'):
+        """The requested financial datasets for ``ticker``, fetched concurrently."""
+        results = await asyncio.gather(*(self.dataset(ticker, dataset, shape) for dataset in datasets))
+        return dict(zip(datasets, results))
+
+    async def financials_many(self, tickers, datasets=FINANCIAL_DATASETS, shape='records',
+                              concurrency=BATCH_CONCURRENCY):
+        """Yield ``(ticker, data, errors)`` for each ticker as soon as all its
+        datasets are in. At most ``concurrency`` (ticker, dataset) fetches are
+        outstanding at once; a failing dataset is reported in ``errors``
+        instead of failing the whole batch."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_dataset(ticker, dataset):
+            async with semaphore:
+                return await self.dataset(ticker, dataset, shape)
+
+        async def fetch_ticker(ticker):
+            results = await asyncio.gather(*(fetch_dataset(ticker, dataset) for dataset in datasets),
+                                           return_exceptions=True)
+            data, errors = dict(), dict()
+            for dataset, result in zip(datasets, results):
+                if isinstance(result, Exception):
+                    errors[dataset] = str(result) or type(result).__name__
+                else:
+                    data[dataset] = result
+            return ticker, data, errors
+
+        tasks = [asyncio.ensure_future(fetch_ticker(ticker)) for ticker in tickers]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,93 @@
+"""Latency of a cheap route (/stocks/tickers) while slow upstream calls are in flight.
+
+Company overviews are served by a fake upstream that blocks for ``SLOW``
+seconds. Compares the shared executor with making the same blocking call on
+the event loop, as the routes did before.
+
+    python -m benchmarks.bench_executor
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("KAFKA_PRODUCER", "memory")
+os.environ.setdefault("HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="history-"))
+os.environ.setdefault("REFERENCE_POLL_INTERVAL", "0")
+
+import httpx
+import main
+
+SLOW = 0.5
+IN_FLIGHT = 8
+WINDOW = 3.0  # seconds of cheap requests per scenario
+INTERVAL = 0.01  # seconds between cheap requests
+
+
+def slow_info(ticker):
+    time.sleep(SLOW)
+    return {'symbol': ticker.upper()}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples) * 1000, samples[int(len(samples) * 0.99) - 1] * 1000,
+            samples[-1] * 1000)
+
+
+async def cheap_latencies(client, slow_call, callers=IN_FLIGHT):
+    """Cheap requests sent on a fixed schedule for ``WINDOW`` seconds while
+    ``callers`` slow callers loop. Each is timed from when it was due, so a
+    stalled loop shows up as latency instead of as fewer requests."""
+    done = asyncio.Event()
+    calls = iter(range(10 ** 9))
+
+    async def slow_caller():
+        while not done.is_set():
+            await slow_call(next(calls))
+
+    async def cheap(due):
+        response = await client.get('/stocks/tickers')
+        assert response.status_code == 200
+        return time.perf_counter() - due
+
+    slow = [asyncio.ensure_future(slow_caller()) for _ in range(callers)]
+    await asyncio.sleep(0.05)
+    first = time.perf_counter()
+    requests = []
+    for k in range(int(WINDOW / INTERVAL)):
+        due = first + k * INTERVAL
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        requests.append(asyncio.ensure_future(cheap(due)))
+    samples = await asyncio.gather(*requests)
+    done.set()
+    await asyncio.gather(*slow)
+    return samples
+
+
+async def run():
+    main.stocks._fetch_info = slow_info
+    main.upstream_limiter.rate = main.upstream_limiter.burst = 1000
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            idle = await cheap_latencies(client, lambda i: asyncio.sleep(SLOW))
+            executor = await cheap_latencies(client, lambda i: client.get(f'/stocks/company-overview/SLOW{i}'))
+
+            async def on_loop(i):
+                # one caller blocking the loop half of the time; with more, nothing else gets through
+                await asyncio.sleep(SLOW)
+                slow_info(f'LOOP{i}')
+
+            blocking = await cheap_latencies(client, on_loop, callers=1)
+    print(f"/stocks/tickers every {INTERVAL * 1000:.0f}ms for {WINDOW:.0f}s, upstream calls take {SLOW}s")
+    print(f"{'':<28}{'p50':>10}{'p99':>10}{'max':>10}")
+    for name, samples in (('idle', idle), (f'{IN_FLIGHT} slow on the executor', executor),
+                          ('1 slow on the loop', blocking)):
+        p50, p99, worst = percentiles(samples)
+        print(f"{name:<28}{p50:>8.2f}ms{p99:>8.2f}ms{worst:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+"""Price history: cold and warm range queries on History_Store, and the
+bytes each copies out of the memory map, against re-downloading the history
+and round-tripping it through to_json() + json.loads as get_history did.
+
+The fake upstream takes ``LATENCY`` seconds per call, like a yfinance download.
+
+    python -m benchmarks.bench_history
+"""
+import json
+import tempfile
+import time
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from history_store import History_Store, bars_to_columns
+
+LATENCY = 0.3
+TODAY = date(2024, 6, 28)
+
+
+def daily_frame(start, end):
+    index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name='Date')
+    close = 100 * np.exp(np.sin(np.arange(len(index)) / 17.0) * 0.1)
+    return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                         'Volume': 1000.0, 'Dividends': 0.0, 'Stock Splits': 0.0}, index=index)
+
+
+def slow_fetch(ticker, start, end, interval):
+    time.sleep(LATENCY)
+    return daily_frame(start, end)
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    today = [TODAY]
+    store = History_Store(root=tempfile.mkdtemp(), fetch=slow_fetch, today=lambda: today[0])
+    ranges = [
+        ('cold, 1998-2024', date(1998, 1, 1), TODAY, 1),
+        ('warm, 1998-2024', date(1998, 1, 1), TODAY, 100),
+        ('warm, 1 year', TODAY - timedelta(days=365), TODAY, 1000),
+        ('warm, 2 months', TODAY - timedelta(days=61), TODAY, 1000),
+    ]
+    print(f"{'query':<24}{'time':>12}{'bars':>8}{'fetched':>9}{'bytes read':>12}")
+    for name, start, end, repeat in ranges:
+        seconds, (bars, info) = timed(lambda: store.range('AAPL', start, end), repeat)
+        print(f"{name:<24}{seconds * 1000:>10.3f}ms{len(bars):>8}{info['fetched']:>9}{info['bytes_read']:>12}")
+    # a new session: only the tail goes upstream
+    today[0] = TODAY + timedelta(days=3)
+    seconds, (bars, info) = timed(lambda: store.range('AAPL', TODAY - timedelta(days=61), today[0]))
+    print(f"{'next day, 2 months':<24}{seconds * 1000:>10.3f}ms{len(bars):>8}{info['fetched']:>9}{info['bytes_read']:>12}")
+    seconds, _ = timed(lambda: bars_to_columns(store.range('AAPL', date(1998, 1, 1), TODAY)[0]), 100)
+    print(f"{'warm 1998-2024, columns':<24}{seconds * 1000:>10.3f}ms")
+
+    frame = daily_frame(date(1998, 1, 1), TODAY)
+    seconds, _ = timed(lambda: json.loads(frame.to_json()), 10)
+    print(f"before: every call downloads ({LATENCY * 1000:.0f}ms here), then to_json + json.loads "
+          f"{seconds * 1000:.1f}ms for {len(frame)} bars")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Indicator kernels against plain Python loops over ten years of daily closes.
+
+    python -m benchmarks.bench_indicators
+"""
+import math
+import timeit
+import numpy as np
+from indicators import sma, ema, rsi, bollinger, volatility, drawdown
+
+CLOSE = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 2520))
+
+
+def loop_sma(close, window=20):
+    return [sum(close[i - window + 1:i + 1]) / window if i >= window - 1 else math.nan for i in range(len(close))]
+
+
+def loop_ema(close, span=20):
+    alpha, out = 2 / (span + 1), []
+    for value in close:
+        out.append(value if not out else alpha * value + (1 - alpha) * out[-1])
+    return out
+
+
+def loop_rsi(close, period=14):
+    out, gain, loss = [math.nan] * len(close), 0.0, 0.0
+    for i in range(1, len(close)):
+        change = close[i] - close[i - 1]
+        up, down = max(change, 0.0), max(-change, 0.0)
+        gain = up if i == 1 else gain + (up - gain) / period
+        loss = down if i == 1 else loss + (down - loss) / period
+        if i >= period:
+            out[i] = 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+    return out
+
+
+def loop_bollinger(close, window=20, k=2):
+    out = []
+    for i in range(window - 1, len(close)):
+        values = close[i - window + 1:i + 1]
+        mean = sum(values) / window
+        deviation = math.sqrt(sum((value - mean) ** 2 for value in values) / window)
+        out.append((mean + k * deviation, mean - k * deviation))
+    return out
+
+
+def loop_volatility(close, window=20):
+    logs = [math.log(close[i] / close[i - 1]) for i in range(1, len(close))]
+    out = []
+    for i in range(window, len(logs) + 1):
+        values = logs[i - window:i]
+        mean = sum(values) / window
+        out.append(math.sqrt(sum((value - mean) ** 2 for value in values) / (window - 1) * 252))
+    return out
+
+
+def loop_drawdown(close):
+    peak, out = -math.inf, []
+    for value in close:
+        peak = max(peak, value)
+        out.append(value / peak - 1)
+    return out
+
+
+CASES = [
+    ('sma:20', sma, loop_sma),
+    ('ema:20', ema, loop_ema),
+    ('rsi:14', rsi, loop_rsi),
+    ('bollinger:20,2', bollinger, loop_bollinger),
+    ('volatility:20', volatility, loop_volatility),
+    ('drawdown', drawdown, loop_drawdown),
+]
+
+
+def best(fn, arg, number):
+    return min(timeit.repeat(lambda: fn(arg), number=number, repeat=5)) / number
+
+
+def main():
+    closes = CLOSE.tolist()
+    print(f"{len(CLOSE)} closes")
+    print(f"{'indicator':<16}{'kernel':>12}{'loop':>12}{'speedup':>10}")
+    for name, kernel, loop in CASES:
+        fast = best(kernel, CLOSE, 200)
+        slow = best(loop, closes, 5)
+        print(f"{name:<16}{fast * 1e6:>10.0f}us{slow * 1e6:>10.0f}us{slow / fast:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Kafka publishing: json.dumps + produce + flush per message, as
+send_updated_stock_to_kafka did, against Kafka_Pipeline.send, which only
+enqueues and leaves batching to the client, with one flush on shutdown.
+
+The fake producer acknowledges a message ``ROUND_TRIP`` seconds after it
+was produced: poll() hands out the acknowledgements that are in, flush()
+waits for the rest, as librdkafka does with a broker.
+
+    python -m benchmarks.bench_kafka
+"""
+import json
+import os
+import time
+
+os.environ.setdefault("KAFKA_PRODUCER", "memory")
+
+from producer import Kafka_Pipeline, Memory_Producer
+
+ROUND_TRIP = 0.002
+MESSAGES = 50000
+PER_MESSAGE_FLUSHES = 500
+UPDATE = {
+    'ticker': 'AAPL',
+    'timestamp': '2024-06-28T16:00:00',
+    'financials': {'company-overview': {'symbol': 'AAPL', 'marketCap': 3400000000000, 'sector': 'Technology',
+                                        'industry': 'Consumer Electronics', 'trailingPE': 34.5}},
+}
+
+
+class Round_Trip_Producer(Memory_Producer):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.in_flight = []
+        self.flushes = 0
+
+    def produce(self, topic, value=None, key=None, on_delivery=None, callback=None):
+        self.in_flight.append((time.perf_counter(), (topic, value, key, on_delivery, callback)))
+
+    def poll(self, timeout=0):
+        acked_before = time.perf_counter() - ROUND_TRIP
+        ready = 0
+        while ready < len(self.in_flight) and self.in_flight[ready][0] <= acked_before:
+            ready += 1
+        for _, message in self.in_flight[:ready]:
+            super().produce(*message)
+        del self.in_flight[:ready]
+        return super().poll(timeout)
+
+    def flush(self, timeout=None):
+        if self.in_flight:
+            self.flushes += 1
+            time.sleep(max(self.in_flight[-1][0] + ROUND_TRIP - time.perf_counter(), 0))
+        self.poll()
+        return 0
+
+
+def flush_per_message(count):
+    producer = Round_Trip_Producer()
+    started = time.perf_counter()
+    for i in range(count):
+        producer.produce(topic='financial-updates', value=json.dumps({**UPDATE, 'seq': i}))
+        producer.poll(0)
+        producer.flush()
+    return time.perf_counter() - started, producer
+
+
+def pipelined(count):
+    producer = Round_Trip_Producer()
+    pipeline = Kafka_Pipeline(lambda: producer, max_queue=count)
+    pipeline.start()
+    started = time.perf_counter()
+    for i in range(count):
+        pipeline.send('financial-updates', {**UPDATE, 'seq': i}, key='AAPL')
+    enqueued = time.perf_counter() - started
+    pipeline.shutdown()
+    return enqueued, time.perf_counter() - started, producer, pipeline
+
+
+def main():
+    seconds, producer = flush_per_message(PER_MESSAGE_FLUSHES)
+    print(f"before: flush per message   {PER_MESSAGE_FLUSHES / seconds:>10.0f} msgs/s"
+          f"  ({seconds / PER_MESSAGE_FLUSHES * 1e6:.0f}us each, {producer.flushes} flushes, "
+          f"{ROUND_TRIP * 1000:.0f}ms round trip)")
+    enqueued, total, producer, pipeline = pipelined(MESSAGES)
+    print(f"after:  Kafka_Pipeline.send {MESSAGES / enqueued:>10.0f} msgs/s"
+          f"  ({enqueued / MESSAGES * 1e6:.1f}us each to enqueue)")
+    print(f"        delivered            {MESSAGES / total:>10.0f} msgs/s"
+          f"  ({len(producer.messages)} messages, {producer.flushes} flushes, "
+          f"{pipeline.stats()['bytes_enqueued'] / MESSAGES:.0f} bytes each)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Cost of the request instrumentation: Counter.inc and Histogram.observe,
+Metrics_Middleware around a trivial route against the same route without it,
+measured next to a full-app request, and rendering /metrics.
+
+    python -m benchmarks.bench_metrics
+"""
+import asyncio
+import os
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("KAFKA_PRODUCER", "memory")
+os.environ.setdefault("HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="history-"))
+os.environ.setdefault("REFERENCE_POLL_INTERVAL", "0")
+
+import httpx
+from fastapi import FastAPI
+
+import main
+from metrics import Counter, Histogram, Metrics_Middleware, registry
+
+REQUESTS = 20000
+
+
+def trivial_app(instrumented):
+    app = FastAPI()
+
+    @app.get('/ping/{name}')
+    def ping(name: str):
+        return {'name': name}
+
+    if instrumented:
+        app.add_middleware(Metrics_Middleware, routes=app.routes)
+    return app
+
+
+async def per_request(app, requests=REQUESTS):
+    """Seconds per request calling the ASGI app directly, no client or socket in between."""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': '/ping/abc', 'raw_path': b'/ping/abc', 'query_string': b'',
+             'root_path': '', 'headers': [], 'client': ('127.0.0.1', 1), 'server': ('bench', 80)}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    best = float('inf')
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(requests // 5):
+            await app(dict(scope), receive, send)
+        best = min(best, (time.perf_counter() - started) / (requests // 5))
+    return best
+
+
+async def full_app(requests=2000):
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            await client.get('/stocks/tickers')
+            started = time.perf_counter()
+            for _ in range(requests):
+                await client.get('/stocks/tickers')
+            elapsed = (time.perf_counter() - started) / requests
+            render = min(timeit.repeat(registry.render, number=100, repeat=5)) / 100
+            body = registry.render()
+    return elapsed, render, body
+
+
+def best(fn, number=200000):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def run():
+    counter = Counter('bench_total', 'bench', ('method', 'route', 'status'))
+    histogram = Histogram('bench_seconds', 'bench', ('method', 'route'))
+    print(f"Counter.inc        {best(lambda: counter.inc('GET', '/ping/{name}', 200)) * 1e9:8.0f}ns")
+    print(f"Histogram.observe  {best(lambda: histogram.observe(0.0012, 'GET', '/ping/{name}')) * 1e9:8.0f}ns")
+
+    bare = asyncio.run(per_request(trivial_app(False)))
+    instrumented = asyncio.run(per_request(trivial_app(True)))
+    print(f"trivial route      {bare * 1e6:8.1f}us bare, {instrumented * 1e6:.1f}us with Metrics_Middleware "
+          f"(+{(instrumented - bare) * 1e6:.1f}us)")
+
+    request, render, body = asyncio.run(full_app())
+    print(f"/stocks/tickers    {request * 1e6:8.1f}us per request through httpx and the whole app")
+    print(f"/metrics render    {render * 1e3:8.2f}ms for {len(body.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,73 @@
+"""Field projection: payload size and serialization time of a full company
+overview against typical dashboard field sets, and the peers info shape built
+by projection against the old per-field pydantic validation.
+
+    python -m benchmarks.bench_projection
+"""
+import os
+import tempfile
+import timeit
+
+os.environ.setdefault("KAFKA_PRODUCER", "memory")
+os.environ.setdefault("HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="history-"))
+
+from graphqlQuery.peersInfo import peers_info
+from main import peer_projection
+from projection import projection, OVERVIEW_FIELDS
+from responses import dumps
+
+FIELD_SETS = {
+    'ticker card': 'shortName,currentPrice,marketCap',
+    'dashboard': 'shortName,sector,industry,marketCap,currentPrice,trailingPE,forwardPE,beta,'
+                 'fiftyTwoWeekHigh,fiftyTwoWeekLow',
+}
+
+
+def overview(extra=60):
+    """An info dict shaped like yfinance's: the catalogued keys plus ones the catalog does not list."""
+    info = dict()
+    for i, field in enumerate(sorted(OVERVIEW_FIELDS)):
+        info[field] = [1234.5 + i, f'{field} value', 10 ** 9 + i, None][i % 4]
+    for i in range(extra):
+        info[f'uncatalogued{i}'] = 0.5 * i
+    info['longBusinessSummary'] = 'Designs, manufactures and markets smartphones and computers. ' * 20
+    return info
+
+
+def old_peer_info(info):
+    """fetch_ticker_info before: every field validated through the pydantic model."""
+    valid_fields = {
+        field: str(info.get(field)) if isinstance(info.get(field), (int, float)) else info.get(field)
+        for field in peers_info.__annotations__.keys()
+    }
+    return peers_info(**valid_fields).model_dump()
+
+
+def new_peer_info(info):
+    """load_peer_info now."""
+    info = peer_projection(info)
+    return {field: str(value) if isinstance(value, (int, float)) else value if isinstance(value, str) else None
+            for field, value in info.items()}
+
+
+def best(fn, number=2000):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main():
+    info = overview()
+    print(f"overview with {len(info)} keys")
+    print(f"{'fields':<14}{'bytes':>8}{'project+encode':>16}")
+    print(f"{'all':<14}{len(dumps(info)):>8}{best(lambda: dumps(info)) * 1e6:>14.2f}us")
+    for name, fields in FIELD_SETS.items():
+        body = dumps(projection(fields)(info))
+        seconds = best(lambda: dumps(projection(fields)(info)))
+        print(f"{name:<14}{len(body):>8}{seconds * 1e6:>14.2f}us")
+    print(f"cached plan lookup {best(lambda: projection(FIELD_SETS['dashboard']), 100000) * 1e6:.2f}us")
+    assert old_peer_info(info) == new_peer_info(info)
+    print(f"peers info: pydantic {best(lambda: old_peer_info(info)) * 1e6:.2f}us, "
+          f"projection {best(lambda: new_peer_info(info)) * 1e6:.2f}us")
+
+
+if __name__ == '__main__':
+    main()
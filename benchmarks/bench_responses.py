@@ -0,0 +1,61 @@
+"""Response rendering: the stdlib JSONResponse against Fast_JSON_Response
+(orjson) and pre-encoded payloads, time per render and body size.
+
+    python -m benchmarks.bench_responses
+"""
+import os
+import tempfile
+import timeit
+
+os.environ.setdefault("KAFKA_PRODUCER", "memory")
+os.environ.setdefault("HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="history-"))
+
+from fastapi.responses import JSONResponse
+from benchmarks.bench_statements import statement, old_records
+from main import stocks_page, ticker_list
+from responses import Fast_JSON_Response, Payload_Cache
+from stock import Data_Retriever, normalize_statement
+
+LISTING = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "nasdaq_large.csv")
+
+
+def overview(keys=186):
+    """A company overview about the size of a yfinance .info dict."""
+    info = {'symbol': 'AAPL', 'longBusinessSummary': 'Designs, manufactures and markets smartphones. ' * 20,
+            'companyOfficers': [{'name': f'Officer {i}', 'title': 'VP', 'totalPay': 1e6 + i} for i in range(10)]}
+    for i in range(keys - len(info)):
+        info[f'field{i}'] = [1.5 * i, f'text {i}', i, None, True][i % 5]
+    return info
+
+
+def render_time(response_class, content, number=200):
+    response = response_class.__new__(response_class)
+    return min(timeit.repeat(lambda: response.render(content), number=number, repeat=5)) / number
+
+
+def main():
+    listing = Data_Retriever(LISTING).listing
+    frame = statement(80, 5)
+    payloads = Payload_Cache()
+    cases = [
+        # (name, what JSONResponse had to render, what is rendered now, pre-encoded key)
+        ('company overview', overview(), overview(), None),
+        ('balance sheet', old_records(frame), normalize_statement(frame), None),
+        ('/stocks/tickers', ticker_list(listing), ticker_list(listing), 'tickers'),
+        ('/stocks page 1', stocks_page(listing.universe, 1), stocks_page(listing.universe, 1), 'stocks'),
+    ]
+    print(f"{'payload':<18}{'stdlib':>10}{'orjson':>10}{'encoded':>10}{'stdlib B':>10}{'orjson B':>10}")
+    for name, old, new, key in cases:
+        stdlib = render_time(JSONResponse, old)
+        fast = render_time(Fast_JSON_Response, new)
+        encoded = ''
+        if key is not None:
+            payloads.get(key, lambda: new)
+            encoded = min(timeit.repeat(lambda: payloads.get(key, lambda: new), number=2000, repeat=5)) / 2000
+            encoded = f"{encoded * 1e6:>8.2f}us"
+        print(f"{name:<18}{stdlib * 1e6:>8.0f}us{fast * 1e6:>8.0f}us{encoded:>10}"
+              f"{len(JSONResponse.render(None, old)):>10}{len(Fast_JSON_Response.render(None, new)):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""/stocks/search latency over a synthetic 50k-row listing, against a
+linear scan like the clients did over the downloaded ticker list.
+
+    python -m benchmarks.bench_search
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from benchmarks.listing import vocabulary, write_listing
+from search import Ticker_Search_Index, tokenize
+from stock import Data_Retriever
+
+ROWS = 50000
+# vocabulary(random.Random(seed)) is the one write_listing(seed=seed) drew names from
+WORDS = vocabulary(random.Random(0))[::4000]
+QUERIES = {
+    'exact symbol': ['AAPL', 'MSFT', 'ZZ', 'QX'],
+    'symbol prefix': ['A', 'BR', 'QU', 'XY'],
+    'name word': WORDS,
+    'name prefix': [word[:4] for word in WORDS],
+    'common word': ['quantum', 'solar', 'vertex', 'pharma'],
+    'typo': [word[:2] + word[3:] for word in WORDS],
+}
+
+
+def linear(store, query, limit=10):
+    query = query.lower()
+    return [symbol for symbol in store if query in symbol.lower() or query in store[symbol][0].lower()][:limit]
+
+
+def timings(fn, queries, repeat=200):
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            fn(query)
+            samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    path = write_listing(os.path.join(tempfile.mkdtemp(), 'listing.csv'), ROWS)
+    retriever = Data_Retriever(path)
+    listing = retriever.listing
+    started = time.perf_counter()
+    Ticker_Search_Index(listing.universe)
+    print(f"{len(listing.store)} tickers, index built in {(time.perf_counter() - started) * 1000:.0f}ms")
+    print(f"{'query':<16}{'p50':>10}{'p99':>10}")
+    index = listing.search_index
+    names = [listing.store.names[i] for i in range(0, len(listing.store), len(listing.store) // 4)]
+    queries = {**QUERIES, 'two words': [' '.join(tokenize(name)[:2]) for name in names]}
+    for name, group in queries.items():
+        p50, p99 = timings(lambda query: index.results(query, 10), group)
+        print(f"{name:<16}{p50 * 1e6:>8.1f}us{p99 * 1e6:>8.1f}us")
+    p50, p99 = timings(lambda query: linear(listing.store, query), QUERIES['name word'], repeat=3)
+    print(f"{'linear scan':<16}{p50 * 1e6:>8.0f}us{p99 * 1e6:>8.0f}us")
+    retriever.shutdown()
+
+
+if __name__ == '__main__':
+    main()
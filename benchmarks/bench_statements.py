@@ -0,0 +1,53 @@
+"""Statement serialization: the old astype(str) + dict loops against
+normalize_statement, on frames shaped like yfinance statements.
+
+    python -m benchmarks.bench_statements
+"""
+import timeit
+import numpy as np
+import pandas as pd
+from responses import dumps
+from stock import normalize_statement
+
+# (line items, periods): an annual balance sheet, and ten years of quarters
+SHAPES = ((80, 5), (80, 40))
+
+
+def statement(items, periods, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(1e9, 5e8, (items, periods)).round()
+    values[rng.random((items, periods)) < 0.15] = np.nan
+    columns = pd.date_range(end='2024-09-30', periods=periods, freq='QE')[::-1]
+    return pd.DataFrame(values, index=[f'Line Item {i}' for i in range(items)], columns=columns)
+
+
+def old_records(df):
+    """What get_balance_sheet did before."""
+    df_str = df.astype(str)
+    dct = df_str.to_dict()
+    balance_sheet = {k.strftime('%Y-%m-%d'): v for k, v in dct.items()}
+    res = list()
+    for key, value in balance_sheet.items():
+        value['year'] = key
+        res.append(value)
+    return res
+
+
+def best(fn, number=200):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main():
+    print(f"{'frame':<10}{'old':>10}{'records':>10}{'columnar':>10}{'old B':>10}{'records B':>11}{'columnar B':>12}")
+    for items, periods in SHAPES:
+        df = statement(items, periods)
+        timings = [best(lambda: old_records(df)), best(lambda: normalize_statement(df)),
+                   best(lambda: normalize_statement(df, 'columnar'))]
+        sizes = [len(dumps(old_records(df))), len(dumps(normalize_statement(df))),
+                 len(dumps(normalize_statement(df, 'columnar')))]
+        print(f"{items}x{periods:<7}" + ''.join(f"{t * 1e6:>8.0f}us" for t in timings)
+              + f"{sizes[0]:>10}{sizes[1]:>11}{sizes[2]:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""/stocks paging and filtering on a synthetic 50k-row listing: the old
+``list(ticker_dict.items())`` slice and linear sector scan against
+Ticker_Universe.
+
+    python -m benchmarks.bench_universe
+"""
+import csv
+import os
+import tempfile
+import time
+import timeit
+from benchmarks.listing import write_listing
+from stock import Data_Retriever
+
+ROWS = 50000
+LIMIT = 253
+
+
+def old_ticker_dict(path):
+    """How the listing was loaded before."""
+    with open(path, mode='r') as file:
+        data_list = list(csv.DictReader(file))
+    ticker_list = dict()
+    for data in data_list:
+        ticker_list[data['Symbol']] = [data['Name'], data['Sector'], data['Industry'], data['Country'],
+                                       int(float(data['Market Cap'])) / 1000000000]
+    return ticker_list
+
+
+def old_page(data, page):
+    all_items = list(data.items())
+    start = (page - 1) * LIMIT
+    return dict(all_items[start:start + LIMIT])
+
+
+def old_sector(data, sector):
+    return {key: [val] for key, val in data.items() if val[1] == sector}
+
+
+def old_by_market_cap(data, page):
+    items = sorted(data.items(), key=lambda item: -item[1][4])
+    start = (page - 1) * LIMIT
+    return dict(items[start:start + LIMIT])
+
+
+def best(fn, number=20):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number
+
+
+def main():
+    path = write_listing(os.path.join(tempfile.mkdtemp(), 'listing.csv'), ROWS)
+    started = time.perf_counter()
+    data = old_ticker_dict(path)
+    old_load = time.perf_counter() - started
+    started = time.perf_counter()
+    retriever = Data_Retriever(path)
+    new_load = time.perf_counter() - started
+    universe = retriever.universe
+    last = -(-len(universe) // LIMIT)
+
+    def new_page(page, **filters):
+        view = universe.select(**filters)
+        return universe.items(view[(page - 1) * LIMIT:page * LIMIT])
+
+    cases = [
+        ('page 1', lambda: old_page(data, 1), lambda: new_page(1)),
+        (f'page {last}', lambda: old_page(data, last), lambda: new_page(last)),
+        ('sector page 1', lambda: old_page(old_sector(data, 'Finance'), 1), lambda: new_page(1, sector='Finance')),
+        # every row decoded from the columns, against a dict that already holds them
+        ('sector, all rows', lambda: old_sector(data, 'Finance'), lambda: retriever.sector_wise_grouping('Finance')),
+        ('by market cap p2', lambda: old_by_market_cap(data, 2), lambda: new_page(2, sort='-market_cap')),
+    ]
+    print(f"{len(universe)} tickers; load {old_load * 1000:.0f}ms old, {new_load * 1000:.0f}ms new "
+          f"(universe and search index included)")
+    print(f"{'query':<20}{'old':>12}{'new':>12}")
+    for name, old, new in cases:
+        assert len(old()) == len(new())
+        print(f"{name:<20}{best(old) * 1e3:>10.3f}ms{best(new) * 1e3:>10.3f}ms")
+    retriever.shutdown()
+
+
+if __name__ == '__main__':
+    main()
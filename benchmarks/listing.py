@@ -0,0 +1,61 @@
+"""Synthetic NASDAQ screener listings for the benchmarks."""
+import csv
+import random
+
+HEADER = ['Symbol', 'Name', 'Last Sale', 'Net Change', '% Change', 'Market Cap', 'Country', 'IPO Year', 'Volume',
+          'Sector', 'Industry']
+SECTORS = {
+    'Technology': ['Computer Software: Prepackaged Software', 'Semiconductors', 'Computer Manufacturing'],
+    'Finance': ['Major Banks', 'Investment Managers', 'Diversified Commercial Services'],
+    'Health Care': ['Biotechnology: Pharmaceutical Preparations', 'Medical/Dental Instruments'],
+    'Consumer Discretionary': ['Restaurants', 'Auto Manufacturing', 'Catalog/Specialty Distribution'],
+    'Industrials': ['Industrial Machinery/Components', 'Air Freight/Delivery Services'],
+    'Energy': ['Oil & Gas Production', 'Integrated oil Companies'],
+}
+COUNTRIES = ['United States'] * 8 + ['Canada', 'United Kingdom', 'China', 'Israel', 'Netherlands']
+COMMON_WORDS = ['Global', 'American', 'Apex', 'Blue', 'Capital', 'Digital', 'Energy', 'First', 'General', 'Health',
+         'International', 'Micro', 'National', 'Pacific', 'Quantum', 'River', 'Solar', 'Systems', 'Therapeutics',
+         'United', 'Vertex', 'West', 'Bio', 'Data', 'Networks', 'Holdings', 'Pharma', 'Motors', 'Foods', 'Labs']
+SYLLABLES = ['ba', 'cor', 'den', 'fi', 'gen', 'hal', 'ix', 'ka', 'lum', 'mer', 'nov', 'or', 'pra', 'qui', 'ro',
+             'sen', 'tal', 'ul', 'vex', 'wa', 'xo', 'yor', 'zen', 'tri', 'sta']
+SUFFIXES = ['Inc. Common Stock', 'Corp. Common Stock', 'Holdings Inc. Class A Common Stock', 'Ltd. American Depositary Shares']
+
+
+def symbols(rows, rng):
+    seen = set()
+    while len(seen) < rows:
+        seen.add(''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(rng.randint(2, 5))))
+    return sorted(seen)
+
+
+def vocabulary(rng, size=20000):
+    """Made-up brand words, so a name word matches a few dozen companies at
+    most, as in real listings; the common words match thousands."""
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def company_name(rng, words):
+    brand = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 2))).title()
+    if rng.random() < 0.5:
+        brand += ' ' + rng.choice(COMMON_WORDS)
+    return f"{brand} {rng.choice(SUFFIXES)}"
+
+
+def write_listing(path, rows, seed=0):
+    """Write a screener CSV with ``rows`` distinct symbols to ``path``."""
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        for symbol in symbols(rows, rng):
+            sector = rng.choice(list(SECTORS))
+            name = company_name(rng, words)
+            market_cap = round(10 ** rng.uniform(6, 12), 2)
+            writer.writerow([symbol, name, f'${rng.uniform(1, 500):.2f}', '0.10', '0.1%', f'{market_cap:.2f}',
+                             rng.choice(COUNTRIES), rng.choice(['', '1999', '2012', '2021']), rng.randint(1, 10 ** 7),
+                             sector, rng.choice(SECTORS[sector])])
+    return path
@@ -0,0 +1,364 @@
+import contextvars
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Default time-to-live (seconds) per kind of upstream data. Quotes go stale in
+# seconds, company profiles in hours and reported financial statements only
+# change a few times a year.
+DEFAULT_TTLS = {
+    'quote': 15,
+    'company-overview': 60 * 60,
+    'peers': 60 * 60,
+    'balance-sheet': 24 * 60 * 60,
+    'cashflow': 24 * 60 * 60,
+    'income-statement': 24 * 60 * 60,
+    'history': 60 * 60,
+    'news': 15 * 60,
+    'shareholders': 24 * 60 * 60,
+    'industry': 24 * 60 * 60,
+    'close': 24 * 60 * 60,  # adjusted closes are rewritten by every later dividend and split
+}
+
+# How long (seconds) past its TTL an entry is still served while it is
+# refreshed in the background, or while the upstream is failing.
+DEFAULT_MAX_STALE = {
+    'quote': 5 * 60,
+    'company-overview': 24 * 60 * 60,
+    'peers': 24 * 60 * 60,
+    'balance-sheet': 7 * 24 * 60 * 60,
+    'cashflow': 7 * 24 * 60 * 60,
+    'income-statement': 7 * 24 * 60 * 60,
+    'history': 24 * 60 * 60,
+    'news': 60 * 60,
+    'shareholders': 7 * 24 * 60 * 60,
+    'industry': 7 * 24 * 60 * 60,
+    'close': 0,
+}
+
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "2048"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+MISSING = object()
+
+
+class Freshness:
+    """Per-request record of the oldest stale value served, in seconds."""
+
+    __slots__ = ('stale_age',)
+
+    def __init__(self) -> None:
+        self.stale_age = None
+
+    def stale(self, age):
+        self.stale_age = age if self.stale_age is None else max(self.stale_age, age)
+
+
+# Set to a Freshness per HTTP request by Freshness_Middleware; the
+# object is shared with the worker threads the request's calls run on.
+response_freshness = contextvars.ContextVar('response_freshness', default=None)
+
+
+def note_stale(age):
+    """Record that the current request is being served a value ``age`` seconds old."""
+    freshness = response_freshness.get()
+    if freshness is not None:
+        freshness.stale(age)
+
+
+class Cache_Backend:
+    """Storage interface used by Data_Cache.
+
+    Entries are stored as ``(expires_at, value, stored_at)`` where
+    ``expires_at`` and ``stored_at`` are absolute timestamps from the cache
+    clock. Backends only store and evict, expiry decisions are made by
+    Data_Cache. ``ttl`` is how long the backend must keep the entry.
+    """
+
+    evictions = 0
+    errors = 0
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, entry, ttl):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def size(self):
+        """Entry count for stats, or None when the backend cannot tell."""
+        return len(self)
+
+
+class Local_Backend(Cache_Backend):
+    """In-process backend with LRU eviction once ``max_size`` is reached."""
+
+    def __init__(self, max_size=CACHE_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Shared_Backend(Cache_Backend):
+    """Backend for a key/value server shared by every uvicorn worker.
+
+    ``client`` follows the redis-py API (``get``, ``set(name, value, ex=)``,
+    ``delete`` and ``scan_iter``). Size bounds and LRU eviction are left to the
+    server (e.g. ``maxmemory-policy allkeys-lru``). A server error is
+    counted and treated as a miss (or a dropped write), so an outage of the
+    cache sends lookups upstream instead of failing them. So is an entry that
+    does not deserialize.
+
+    ``serializer`` is anything with ``dumps`` and ``loads``. The default,
+    pickle, is needed for the DataFrames some kinds cache, and runs whatever
+    the server hands back: only point it at a server no one else can write to.
+    """
+
+    def __init__(self, client, prefix="fastapi-finance:", serializer=pickle) -> None:
+        self.client = client
+        self.prefix = prefix
+        self.serializer = serializer
+        self.errors = 0
+        self.last_error = None
+
+    def _key(self, key):
+        return self.prefix + "|".join(str(part) for part in key)
+
+    def _failed(self, e):
+        self.errors += 1
+        self.last_error = str(e) or type(e).__name__
+
+    def get(self, key):
+        try:
+            raw = self.client.get(self._key(key))
+            # a truncated or foreign entry is a miss like any other failure
+            return self.serializer.loads(raw) if raw is not None else None
+        except Exception as e:
+            self._failed(e)
+            return None
+
+    def set(self, key, entry, ttl):
+        ex = max(1, int(ttl) + 1) if ttl is not None else None
+        try:
+            self.client.set(self._key(key), self.serializer.dumps(entry), ex=ex)
+        except Exception as e:
+            self._failed(e)
+
+    def delete(self, key):
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._failed(e)
+
+    def clear(self):
+        try:
+            for name in list(self.client.scan_iter(match=self.prefix + "*")):
+                self.client.delete(name)
+        except Exception as e:
+            self._failed(e)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + "*"))
+
+    def size(self):
+        try:
+            return len(self)
+        except Exception as e:
+            self._failed(e)
+            return None
+
+
+class Memory_Client:
+    """Local stand-in for a redis client, used to exercise Shared_Backend
+    without a server. Honours ``ex`` against the given clock."""
+
+    def __init__(self, clock=time.time) -> None:
+        self.clock = clock
+        self.data = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            item = self.data.get(name)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and self.clock() >= expires_at:
+                del self.data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            self.data[name] = (value, self.clock() + ex if ex is not None else None)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def scan_iter(self, match="*"):
+        prefix = match.rstrip("*")
+        with self._lock:
+            names = [name for name in self.data if name.startswith(prefix)]
+        return iter(names)
+
+
+class Data_Cache:
+    """TTL cache keyed by ``(kind, key)`` in front of upstream calls.
+
+    Expired entries are kept for a further ``max_stale`` seconds per kind,
+    during which get() misses but get_stale() still returns them.
+    """
+
+    def __init__(self, backend=None, ttls=None, clock=time.time, max_stale=None) -> None:
+        self.backend = backend if backend is not None else Local_Backend()
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_stale = dict(DEFAULT_MAX_STALE)
+        if max_stale:
+            self.max_stale.update(max_stale)
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def ttl_for(self, kind):
+        return self.ttls.get(kind, 60)
+
+    def max_stale_for(self, kind):
+        return self.max_stale.get(kind, 0)
+
+    def get(self, kind, key):
+        entry = self.backend.get((kind, key))
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        expires_at, value = entry[0], entry[1]
+        now = self.clock()
+        if expires_at is not None and now >= expires_at:
+            if now >= expires_at + self.max_stale_for(kind):
+                self.backend.delete((kind, key))
+                self.expirations += 1
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return value
+
+    def get_stale(self, kind, key):
+        """``(value, age)`` of an expired entry still within its kind's max
+        staleness, ``age`` being seconds since it was stored; else MISSING."""
+        entry = self.backend.get((kind, key))
+        # entries written by an older release (shared backend) have no stored_at
+        if entry is None or entry[0] is None or len(entry) < 3:
+            return MISSING
+        expires_at, value, stored_at = entry
+        now = self.clock()
+        if now >= expires_at + self.max_stale_for(kind):
+            return MISSING
+        self.stale_hits += 1
+        return value, max(now - stored_at, 0.0)
+
+    def peek(self, kind, key):
+        """Like get() but without touching the hit/miss counters."""
+        entry = self.backend.get((kind, key))
+        if entry is None:
+            return MISSING
+        expires_at, value = entry[0], entry[1]
+        if expires_at is not None and self.clock() >= expires_at:
+            return MISSING
+        return value
+
+    def set(self, kind, key, value, ttl=None):
+        ttl = self.ttl_for(kind) if ttl is None else ttl
+        now = self.clock()
+        expires_at = now + ttl if ttl is not None else None
+        retention = ttl + self.max_stale_for(kind) if ttl is not None else None
+        self.backend.set((kind, key), (expires_at, value, now), retention)
+
+    def invalidate(self, kind, key):
+        self.backend.delete((kind, key))
+
+    def clear(self):
+        self.backend.clear()
+
+    def get_or_load(self, kind, key, loader):
+        value = self.get(kind, key)
+        if value is MISSING:
+            value = loader()
+            self.set(kind, key, value)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'size': self.backend.size(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'expirations': self.expirations,
+            'stale_hits': self.stale_hits,
+            'evictions': self.backend.evictions,
+            'backend_errors': self.backend.errors,
+            'ttls': self.ttls,
+            'max_stale': self.max_stale,
+        }
+
+
+def build_cache():
+    """Cache configured from the environment: a shared redis backend when
+    CACHE_REDIS_URL is set, otherwise a per-process LRU."""
+    ttls = {
+        kind: int(os.environ[f"CACHE_TTL_{kind.upper().replace('-', '_')}"])
+        for kind in DEFAULT_TTLS
+        if f"CACHE_TTL_{kind.upper().replace('-', '_')}" in os.environ
+    }
+    max_stale = {
+        kind: int(os.environ[f"CACHE_MAX_STALE_{kind.upper().replace('-', '_')}"])
+        for kind in DEFAULT_MAX_STALE
+        if f"CACHE_MAX_STALE_{kind.upper().replace('-', '_')}" in os.environ
+    }
+    if CACHE_REDIS_URL:
+        import redis  # optional, only needed for the shared backend
+        return Data_Cache(Shared_Backend(redis.Redis.from_url(CACHE_REDIS_URL)), ttls, max_stale=max_stale)
+    return Data_Cache(Local_Backend(CACHE_MAX_SIZE), ttls, max_stale=max_stale)
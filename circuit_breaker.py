@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+import requests
+from curl_cffi.requests import exceptions as curl_exceptions
+from rate_limiter import is_throttle
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+CIRCUIT_SLOW_CALL = float(os.getenv("CIRCUIT_SLOW_CALL", "10"))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class Circuit_Open(Exception):
+    """Raised instead of calling upstream while a dataset's circuit is open."""
+
+    def __init__(self, kind, retry_after) -> None:
+        super().__init__(f"Upstream {kind} circuit is open, retry in {retry_after:.0f}s")
+        self.kind = kind
+        self.retry_after = retry_after
+
+
+def is_upstream_failure(error):
+    """Whether ``error`` says the upstream is unhealthy: throttling, a
+    timeout, a connection problem or a 5xx. Anything else (an unknown or
+    delisted ticker, a 404, bad data for one symbol) is an answer, and
+    does not count against the circuit."""
+    if is_throttle(error) or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          curl_exceptions.ConnectionError, curl_exceptions.Timeout)):
+        return True
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return isinstance(status, int) and status >= 500
+
+
+class Circuit:
+    __slots__ = ('state', 'failures', 'opened_at', 'probing', 'calls', 'rejected', 'trips', 'last_error')
+
+    def __init__(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.calls = 0
+        self.rejected = 0
+        self.trips = 0
+        self.last_error = None
+
+
+class Circuit_Breakers:
+    """One circuit breaker per dataset kind in front of upstream calls.
+
+    ``threshold`` consecutive failures open a kind's circuit: calls then
+    raise Circuit_Open without going upstream. After ``reset_timeout``
+    seconds one probe call is let through (half-open); its success closes
+    the circuit, its failure opens it for another ``reset_timeout``. Only
+    errors for which is_upstream_failure() holds are failures, and so is a
+    call slower than ``slow_call`` seconds even if it returned. Calls are
+    timed from when ``fn`` starts, so put the breaker inside the rate
+    limiter and use check() to fail fast before waiting for admission.
+    """
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT,
+                 slow_call=CIRCUIT_SLOW_CALL, clock=time.monotonic) -> None:
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call = slow_call
+        self.clock = clock
+        self.circuits = dict()
+        self._lock = threading.Lock()
+
+    def _circuit(self, kind):
+        circuit = self.circuits.get(kind)
+        if circuit is None:
+            circuit = self.circuits.setdefault(kind, Circuit())
+        return circuit
+
+    def check(self, kind):
+        """Raise Circuit_Open if a call for ``kind`` would be rejected now.
+        Changes nothing, the call itself still goes through before()."""
+        with self._lock:
+            circuit = self.circuits.get(kind)
+            if circuit is None or circuit.state == CLOSED:
+                return
+            retry_after = circuit.opened_at + self.reset_timeout - self.clock()
+            if circuit.probing or (circuit.state == OPEN and retry_after > 0):
+                raise Circuit_Open(kind, max(retry_after, 1.0))
+
+    def before(self, kind):
+        """Admit a call for ``kind`` or raise Circuit_Open. Returns True if
+        the call is the half-open probe."""
+        with self._lock:
+            circuit = self._circuit(kind)
+            if circuit.state == CLOSED:
+                circuit.calls += 1
+                return False
+            retry_after = circuit.opened_at + self.reset_timeout - self.clock()
+            if circuit.state == OPEN and retry_after <= 0:
+                circuit.state = HALF_OPEN
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                circuit.calls += 1
+                return True
+            circuit.rejected += 1
+            raise Circuit_Open(kind, max(retry_after, 1.0))
+
+    def after(self, kind, probe, started, error=None):
+        """Record how an admitted call went."""
+        with self._lock:
+            circuit = self._circuit(kind)
+            if probe:
+                circuit.probing = False
+            failed = (is_upstream_failure(error) if error is not None
+                      else self.clock() - started > self.slow_call)
+            if not failed:
+                circuit.failures = 0
+                circuit.state = CLOSED
+                return
+            circuit.failures += 1
+            circuit.last_error = str(error) if error is not None else f"slow call ({self.clock() - started:.1f}s)"
+            if probe or (circuit.state == CLOSED and circuit.failures >= self.threshold):
+                circuit.state = OPEN
+                circuit.opened_at = self.clock()
+                circuit.trips += 1
+
+    def call(self, kind, fn, *args):
+        """``fn(*args)`` unless ``kind``'s circuit is open."""
+        probe = self.before(kind)
+        started = self.clock()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.after(kind, probe, started, e)
+            raise
+        self.after(kind, probe, started)
+        return result
+
+    def wrap(self, kind, fn):
+        """``fn`` with every call going through ``kind``'s breaker."""
+        def guarded(*args):
+            return self.call(kind, fn, *args)
+        return guarded
+
+    def stats(self):
+        with self._lock:
+            now = self.clock()
+            return {
+                'threshold': self.threshold,
+                'reset_timeout': self.reset_timeout,
+                'slow_call': self.slow_call,
+                'circuits': {
+                    kind: {
+                        'state': circuit.state,
+                        'failures': circuit.failures,
+                        'open_for': round(now - circuit.opened_at, 1) if circuit.state != CLOSED else None,
+                        'calls': circuit.calls,
+                        'rejected': circuit.rejected,
+                        'trips': circuit.trips,
+                        'last_error': circuit.last_error,
+                    }
+                    for kind, circuit in self.circuits.items()
+                },
+            }
+
+
+upstream_breakers = Circuit_Breakers()
@@ -0,0 +1,261 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+import orjson
+from confluent_kafka import Consumer, TopicPartition
+from fingerprints import apply_delta
+from producer import KAFKA_BOOTSTRAP_SERVERS, Memory_Producer
+
+FINANCIAL_UPDATES_TOPIC = "financial-updates"
+MATERIALIZED_VIEW_ENABLED = os.getenv("MATERIALIZED_VIEW_ENABLED", "false").lower() in ("1", "true", "yes")
+MATERIALIZED_VIEW_MAX_AGE = float(os.getenv("MATERIALIZED_VIEW_MAX_AGE", str(24 * 60 * 60)))
+# an unchanged ticker is re-confirmed once its last message is this share of the max age old
+MATERIALIZED_VIEW_HEARTBEAT_FRACTION = float(os.getenv("MATERIALIZED_VIEW_HEARTBEAT_FRACTION", "0.5"))
+KAFKA_VIEW_GROUP = os.getenv("KAFKA_VIEW_GROUP", "fastapi-stock-view")
+VIEW_LAG_INTERVAL = 5.0
+
+
+class Memory_Consumer:
+    """In-process stand-in for confluent_kafka.Consumer reading what a
+    Memory_Producer delivered (subscribe/poll/assignment/position/
+    get_watermark_offsets/close). Starts from the earliest message."""
+
+    def __init__(self, messages) -> None:
+        self.messages = messages
+        self.topics = ()
+        self._cursor = 0
+        self._positions = dict()
+
+    def subscribe(self, topics):
+        self.topics = tuple(topics)
+
+    def poll(self, timeout=None):
+        while self._cursor < len(self.messages):
+            message = self.messages[self._cursor]
+            self._cursor += 1
+            if message.topic() in self.topics:
+                self._positions[(message.topic(), message.partition())] = message.offset() + 1
+                return message
+        if timeout:
+            time.sleep(min(timeout, 0.05))
+        return None
+
+    def _partitions(self):
+        return sorted({(message.topic(), message.partition()) for message in list(self.messages)
+                       if message.topic() in self.topics})
+
+    def assignment(self):
+        return [TopicPartition(topic, partition) for topic, partition in self._partitions()]
+
+    def position(self, partitions):
+        return [TopicPartition(tp.topic, tp.partition, self._positions.get((tp.topic, tp.partition), 0))
+                for tp in partitions]
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        high = sum(1 for message in list(self.messages)
+                   if (message.topic(), message.partition()) == (partition.topic, partition.partition))
+        return 0, high
+
+    def close(self):
+        pass
+
+
+def create_consumer(producer=None):
+    """A consumer that replays the topic from the start. Reads what an
+    in-memory producer delivered when given one (KAFKA_PRODUCER=memory)."""
+    if isinstance(producer, Memory_Producer):
+        return Memory_Consumer(producer.messages)
+    return Consumer({
+        'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
+        # a group of its own, so every process rebuilds the whole view
+        'group.id': f"{KAFKA_VIEW_GROUP}-{socket.gethostname()}-{os.getpid()}",
+        'auto.offset.reset': 'earliest',
+        'enable.auto.commit': False,
+    })
+
+
+def _epoch(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class View_Entry:
+    __slots__ = ('payload', 'digest', 'fetched_at', 'size')
+
+    def __init__(self, payload, digest, fetched_at, size) -> None:
+        self.payload = payload
+        self.digest = digest
+        self.fetched_at = fetched_at
+        self.size = size
+
+
+class Materialized_View:
+    """Latest published financials per ticker, rebuilt from financial-updates
+    messages.
+
+    Snapshot datasets replace what is held; delta datasets are applied with
+    apply_delta() when the held digest matches the message's ``base``. A
+    delta without its base (e.g. the snapshot aged out of the topic) drops
+    that dataset, so reads for it go upstream until the next snapshot.
+    ``verified`` digests confirm an unchanged dataset: a held one with that
+    digest is as fresh as the message, a held one with another digest is
+    outdated and dropped. Age is measured from the last confirmation, not
+    the last change.
+    Each ticker's datasets are replaced as one dict, readers never see a
+    half-applied message.
+    """
+
+    def __init__(self, clock=time.time) -> None:
+        self.clock = clock
+        self.entries = dict()
+        self.applied = 0
+        self.gaps = 0
+        self.invalid = 0
+
+    def apply(self, value):
+        try:
+            message = orjson.loads(value)
+            ticker = message['ticker'].upper()
+        except (orjson.JSONDecodeError, KeyError, TypeError, AttributeError):
+            self.invalid += 1
+            return
+        fetched_at = _epoch(message.get('timestamp')) or self.clock()
+        digests = message.get('digests', {})
+        datasets = dict(self.entries.get(ticker, {}))
+        for dataset, payload in message.get('financials', {}).items():
+            datasets[dataset] = View_Entry(payload, digests.get(dataset), fetched_at, len(orjson.dumps(payload)))
+        for dataset, delta in message.get('deltas', {}).items():
+            held = datasets.get(dataset)
+            if held is None or held.digest != message.get('base', {}).get(dataset):
+                datasets.pop(dataset, None)
+                self.gaps += 1
+                continue
+            payload = apply_delta(held.payload, delta)
+            datasets[dataset] = View_Entry(payload, digests.get(dataset), fetched_at, len(orjson.dumps(payload)))
+        for dataset, digest in message.get('verified', {}).items():
+            held = datasets.get(dataset)
+            if held is None:
+                continue
+            if held.digest != digest:
+                datasets.pop(dataset)
+                self.gaps += 1
+                continue
+            datasets[dataset] = View_Entry(held.payload, digest, max(fetched_at, held.fetched_at), held.size)
+        self.entries[ticker] = datasets
+        self.applied += 1
+
+    def get(self, ticker, datasets, max_age=MATERIALIZED_VIEW_MAX_AGE):
+        """``({dataset: payload}, age in seconds of the oldest)``, or None
+        unless every dataset is held and younger than ``max_age``."""
+        held = self.entries.get(ticker.upper())
+        if held is None:
+            return None
+        now = self.clock()
+        data, oldest = dict(), now
+        for dataset in datasets:
+            entry = held.get(dataset)
+            if entry is None or now - entry.fetched_at > max_age:
+                return None
+            data[dataset] = entry.payload
+            oldest = min(oldest, entry.fetched_at)
+        return data, max(now - oldest, 0.0)
+
+    def stats(self):
+        entries = list(self.entries.values())
+        return {
+            'tickers': len(entries),
+            'datasets': sum(len(datasets) for datasets in entries),
+            'bytes': sum(entry.size for datasets in entries for entry in list(datasets.values())),
+            'applied': self.applied,
+            'gaps': self.gaps,
+            'invalid': self.invalid,
+        }
+
+
+class View_Consumer:
+    """Background thread feeding a Materialized_View from a Kafka topic.
+
+    ``start()`` / ``shutdown()`` are driven by the FastAPI lifespan. Lag
+    (high watermark minus position, summed over the assigned partitions)
+    is refreshed every VIEW_LAG_INTERVAL seconds and whenever the consumer
+    is idle.
+    """
+
+    def __init__(self, view, consumer_factory=create_consumer, topic=FINANCIAL_UPDATES_TOPIC,
+                 clock=time.time) -> None:
+        self.view = view
+        self.consumer_factory = consumer_factory
+        self.topic = topic
+        self.clock = clock
+        self.consumer = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.consumed = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_message_at = None
+        self.lag = None
+        self._lag_at = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.consumer = self.consumer_factory()
+        self.consumer.subscribe([self.topic])
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kafka-view", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        consumer = self.consumer
+        while not self._stop.is_set():
+            message = consumer.poll(0.5)
+            if message is None:
+                self._update_lag()
+                continue
+            if message.error():
+                self.errors += 1
+                self.last_error = str(message.error())
+                continue
+            self.view.apply(message.value())
+            self.consumed += 1
+            self.last_message_at = self.clock()
+            if self.clock() - self._lag_at >= VIEW_LAG_INTERVAL:
+                self._update_lag()
+        consumer.close()
+
+    def _update_lag(self):
+        consumer = self.consumer
+        try:
+            lag = 0
+            for position in consumer.position(consumer.assignment()):
+                _, high = consumer.get_watermark_offsets(position, timeout=1.0, cached=False)
+                # a negative position means nothing consumed yet on that partition
+                lag += max(high - max(position.offset, 0), 0)
+            self.lag = lag
+        except Exception as e:
+            self.last_error = f"lag: {e}"
+        self._lag_at = self.clock()
+
+    def shutdown(self):
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join()
+
+    def stats(self):
+        return {
+            'running': self._thread is not None,
+            'topic': self.topic,
+            'consumed': self.consumed,
+            'lag': self.lag,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_message_at': self.last_message_at,
+            'view': self.view.stats(),
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from rate_limiter import upstream_priority, BACKGROUND, UPSTREAM_BACKGROUND_SHARE
+from metrics import executor_queue_seconds, executor_call_seconds
+
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", "16"))
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "256"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "20"))
+
+_DEFAULT = object()
+
+
+class Executor_Saturated(Exception):
+    """Raised when the upstream executor already has max_queue calls waiting."""
+
+
+class Upstream_Timeout(Exception):
+    """Raised when an upstream call does not finish within its timeout."""
+
+
+class Upstream_Executor:
+    """Application-lifetime thread pool for blocking yfinance calls.
+
+    ``start()`` / ``shutdown()`` are driven by the FastAPI lifespan. At most
+    ``max_workers`` calls run at once and at most ``max_queue`` more may wait;
+    beyond that ``run`` fails fast with Executor_Saturated instead of letting
+    latency grow without bound. Calls run with the caller's context (so the
+    upstream priority carries over), and background calls may only occupy
+    ``background_share`` of the workers, keeping the rest for user requests.
+    """
+
+    def __init__(self, max_workers=UPSTREAM_MAX_WORKERS, max_queue=UPSTREAM_MAX_QUEUE,
+                 timeout=UPSTREAM_TIMEOUT, background_share=UPSTREAM_BACKGROUND_SHARE) -> None:
+        self.max_workers = max_workers
+        self.background_workers = max(1, int(max_workers * background_share))
+        self._background = None
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="upstream")
+            self._background = asyncio.Semaphore(self.background_workers)
+
+    def shutdown(self, wait=True):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+    @property
+    def queued(self):
+        return self.pending - self.active
+
+    async def run(self, fn, *args, timeout=_DEFAULT):
+        """Run ``fn(*args)`` on the pool and await its result."""
+        if self._pool is None:
+            raise RuntimeError("Upstream executor is not running")
+        if upstream_priority.get() == BACKGROUND:
+            async with self._background:
+                return await self._run(fn, args, timeout)
+        return await self._run(fn, args, timeout)
+
+    async def _run(self, fn, args, timeout):
+        timeout = self.timeout if timeout is _DEFAULT else timeout
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise Executor_Saturated(f"{self.pending} upstream calls already pending")
+            self.pending += 1
+        try:
+            future = self._pool.submit(contextvars.copy_context().run, self._call, fn, args, time.perf_counter())
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # A call that already started keeps its worker until yfinance
+            # returns; queued ones are cancelled by wait_for.
+            self.timeouts += 1
+            raise Upstream_Timeout(f"{getattr(fn, '__name__', 'upstream call')} timed out after {timeout}s")
+
+    def _call(self, fn, args, submitted):
+        started = time.perf_counter()
+        executor_queue_seconds.observe(started - submitted)
+        with self._lock:
+            self.active += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+            executor_call_seconds.observe(time.perf_counter() - started, getattr(fn, '__name__', 'call'))
+
+    def _release(self, future):
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self):
+        return {
+            'running': self._pool is not None,
+            'max_workers': self.max_workers,
+            'background_workers': self.background_workers,
+            'max_queue': self.max_queue,
+            'timeout': self.timeout,
+            'active': self.active,
+            'queued': self.queued,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+        }
@@ -0,0 +1,228 @@
+import hashlib
+import threading
+import time
+import orjson
+from responses import json_default, ORJSON_OPTIONS
+
+_MISSING = object()
+
+
+def canonical(payload) -> bytes:
+    return orjson.dumps(payload, default=json_default, option=ORJSON_OPTIONS | orjson.OPT_SORT_KEYS)
+
+
+def _dict_delta(old, new):
+    delta = {'set': {key: value for key, value in new.items() if old.get(key, _MISSING) != value}}
+    unset = [key for key in old if key not in new]
+    if unset:
+        delta['unset'] = unset
+    return delta
+
+
+def diff(old, new):
+    """Field-level delta turning ``old`` into ``new``.
+
+    Dicts (company overview) give ``{"set": {...}, "unset": [...]}``.
+    Statement record lists are matched by their ``year`` and give
+    ``{"periods": {year: field delta}, "order": [...]}``. Anything else is
+    sent whole as ``{"replace": new}``.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        return _dict_delta(old, new)
+    if (isinstance(old, list) and isinstance(new, list)
+            and all(isinstance(record, dict) and 'year' in record for record in old + new)):
+        previous = {record['year']: record for record in old}
+        periods = dict()
+        for record in new:
+            before = previous.get(record['year'])
+            if before is None:
+                periods[record['year']] = {'set': record}
+            elif before != record:
+                periods[record['year']] = _dict_delta(before, record)
+        return {'periods': periods, 'order': [record['year'] for record in new]}
+    return {'replace': new}
+
+
+def apply_delta(old, delta):
+    """Inverse of diff(): rebuild the new payload from ``old`` and ``delta``."""
+    if 'replace' in delta:
+        return delta['replace']
+    if 'periods' in delta:
+        previous = {record['year']: record for record in old}
+        records = []
+        for year in delta['order']:
+            change = delta['periods'].get(year)
+            record = previous.get(year, {})
+            records.append(apply_delta(record, change) if change is not None else record)
+        return records
+    result = {key: value for key, value in old.items() if key not in delta.get('unset', ())}
+    result.update(delta['set'])
+    return result
+
+
+class Fingerprint_Store:
+    """Last published digest (and payload, for deltas) per (ticker, dataset)."""
+
+    def get(self, ticker, dataset):
+        raise NotImplementedError
+
+    def set(self, ticker, dataset, digest, payload):
+        raise NotImplementedError
+
+    def delete(self, ticker, dataset):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class Memory_Fingerprint_Store(Fingerprint_Store):
+
+    def __init__(self) -> None:
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    def get(self, ticker, dataset):
+        return self._entries.get((ticker, dataset))
+
+    def set(self, ticker, dataset, digest, payload):
+        with self._lock:
+            self._entries[(ticker, dataset)] = (digest, payload)
+
+    def delete(self, ticker, dataset):
+        with self._lock:
+            self._entries.pop((ticker, dataset), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Change_Set:
+    """Outcome of comparing one ticker's financials with what was last
+    published. ``message`` is None when nothing changed."""
+
+    def __init__(self, ticker, message, digests, payloads, full_bytes, emitted_bytes) -> None:
+        self.ticker = ticker
+        self.message = message
+        self.digests = digests
+        self.payloads = payloads
+        self.full_bytes = full_bytes
+        self.emitted_bytes = emitted_bytes
+
+
+class Change_Detector:
+    """Decides what to publish for a ticker.
+
+    Unchanged datasets are left out of the message, only their digests are
+    listed under ``verified`` so consumers know the version they hold was
+    confirmed at ``timestamp``. A ticker with no changes sends no message,
+    except that with a ``heartbeat_interval`` (seconds, set when a
+    materialized view is consuming the topic) it sends a digests-only
+    ``"mode": "verified"`` heartbeat once its last message is that old, so
+    the view does not age out data that is still current. With ``deltas`` a changed dataset
+    is sent as a field-level delta against the previously published version
+    (see diff()), together with that version's digest as ``base``. ``force``
+    always sends a full snapshot of every dataset. Fingerprints only move
+    forward when commit() is called, just before the message is queued, so
+    the next update is compared with (and based on) it. If delivery then fails,
+    forget() drops the fingerprints of the datasets it carried: they are
+    sent again, whole, with the next update, which also resynchronizes
+    consumers that missed a delta's base.
+    """
+
+    def __init__(self, store=None, heartbeat_interval=None, clock=time.time) -> None:
+        self.store = store if store is not None else Memory_Fingerprint_Store()
+        self.heartbeat_interval = heartbeat_interval
+        self.clock = clock
+        self._confirmed_at = dict()
+        self.messages_emitted = 0
+        self.messages_skipped = 0
+        self.datasets_emitted = 0
+        self.datasets_skipped = 0
+        self.bytes_full = 0
+        self.bytes_emitted = 0
+        self.undelivered = 0
+        self.heartbeats = 0
+
+    def prepare(self, ticker, financials, timestamp, force=False, deltas=False):
+        digests, changed, delta_sets, bases, verified = dict(), dict(), dict(), dict(), dict()
+        full_bytes = emitted_bytes = 0
+        for dataset, payload in financials.items():
+            encoded = canonical(payload)
+            full_bytes += len(encoded)
+            digest = hashlib.blake2b(encoded, digest_size=16).hexdigest()
+            digests[dataset] = digest
+            previous = self.store.get(ticker, dataset)
+            if not force and previous is not None and previous[0] == digest:
+                self.datasets_skipped += 1
+                verified[dataset] = digest
+                continue
+            self.datasets_emitted += 1
+            if deltas and not force and previous is not None and previous[1] is not None:
+                delta_sets[dataset] = diff(previous[1], payload)
+                bases[dataset] = previous[0]
+                emitted_bytes += len(canonical(delta_sets[dataset]))
+            else:
+                changed[dataset] = payload
+                emitted_bytes += len(encoded)
+
+        message = None
+        if changed or delta_sets or (verified and self._heartbeat_due(ticker)):
+            message = {
+                "ticker": ticker,
+                "timestamp": timestamp,
+                "mode": "delta" if delta_sets else "snapshot" if changed else "verified",
+                "financials": changed,
+                "digests": {dataset: digests[dataset] for dataset in (*changed, *delta_sets)},
+            }
+            if delta_sets:
+                message["deltas"] = delta_sets
+                message["base"] = bases
+            if verified:
+                message["verified"] = verified
+        return Change_Set(ticker, message, digests, financials, full_bytes, emitted_bytes)
+
+    def _heartbeat_due(self, ticker):
+        if self.heartbeat_interval is None:
+            return False
+        confirmed_at = self._confirmed_at.get(ticker)
+        return confirmed_at is None or self.clock() - confirmed_at >= self.heartbeat_interval
+
+    def commit(self, change_set):
+        """Record a prepared change set as published. Byte counts cover the
+        dataset payloads only, not the message envelope."""
+        for dataset, digest in change_set.digests.items():
+            self.store.set(change_set.ticker, dataset, digest, change_set.payloads[dataset])
+        self.bytes_full += change_set.full_bytes
+        self.bytes_emitted += change_set.emitted_bytes
+        if change_set.message is None:
+            self.messages_skipped += 1
+            return
+        # every dataset is in the message, changed or verified
+        self._confirmed_at[change_set.ticker] = self.clock()
+        if not change_set.message['digests']:
+            self.heartbeats += 1
+        else:
+            self.messages_emitted += 1
+
+    def forget(self, change_set):
+        """Undo commit() for a message that was not delivered."""
+        for dataset in change_set.message['digests']:
+            self.store.delete(change_set.ticker, dataset)
+        self._confirmed_at.pop(change_set.ticker, None)
+        self.undelivered += 1
+
+    def stats(self):
+        return {
+            'tracked': len(self.store),
+            'messages_emitted': self.messages_emitted,
+            'messages_skipped': self.messages_skipped,
+            'heartbeats': self.heartbeats,
+            'heartbeat_interval': self.heartbeat_interval,
+            'datasets_emitted': self.datasets_emitted,
+            'datasets_skipped': self.datasets_skipped,
+            'bytes_full': self.bytes_full,
+            'bytes_emitted': self.bytes_emitted,
+            'bytes_saved': self.bytes_full - self.bytes_emitted,
+            'undelivered': self.undelivered,
+        }
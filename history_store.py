@@ -0,0 +1,267 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+try:
+    import fcntl
+except ImportError:  # Windows: series are only locked within one process
+    fcntl = None
+
+HISTORY_STORE_PATH = os.getenv("HISTORY_STORE_PATH", os.path.join(os.path.dirname(__file__), "data", "history"))
+HISTORY_TAIL_TTL = float(os.getenv("HISTORY_TAIL_TTL", "300"))
+HISTORY_INTERVALS = ('1d', '1wk', '1mo', '3mo')
+
+# One fixed-size record per bar. Timestamps are exchange-local and naive, in ns.
+BAR_DTYPE = np.dtype([('ts', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                      ('close', '<f8'), ('volume', '<f8'), ('dividends', '<f8')])
+BAR_COLUMNS = BAR_DTYPE.names[1:]
+_SOURCE_COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close',
+                   'volume': 'Volume', 'dividends': 'Dividends'}
+_TICKER = re.compile(r"[A-Z0-9.\-^=]{1,20}")
+
+
+def yfinance_bars(ticker, start, end, interval):
+    return yf.Ticker(ticker).history(start=start.isoformat(), end=end.isoformat(), interval=interval,
+                                     auto_adjust=False, actions=True)
+
+
+def to_bars(frame):
+    """yfinance history frame -> BAR_DTYPE array. Returns ``(bars, split)``
+    where ``split`` tells whether a stock split happened in the frame."""
+    frame = frame.dropna(subset=['Close']) if 'Close' in frame else frame.iloc[:0]
+    bars = np.zeros(len(frame), dtype=BAR_DTYPE)
+    if not len(frame):
+        return bars, False
+    index = frame.index
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    bars['ts'] = index.as_unit('ns').asi8
+    for column, source in _SOURCE_COLUMNS.items():
+        if source in frame:
+            bars[column] = frame[source].to_numpy(dtype='f8')
+    split = 'Stock Splits' in frame and bool((frame['Stock Splits'].fillna(0) != 0).any())
+    return bars, split
+
+
+def bars_to_columns(bars):
+    columns = {'date': np.datetime_as_string(bars['ts'].astype('datetime64[ns]'), unit='D').tolist()}
+    for column in BAR_COLUMNS:
+        columns[column] = np.ascontiguousarray(bars[column])
+    return columns
+
+
+def bars_to_records(bars):
+    dates = np.datetime_as_string(bars['ts'].astype('datetime64[ns]'), unit='D').tolist()
+    return [dict(zip(('date',) + BAR_COLUMNS, (day,) + row[1:])) for day, row in zip(dates, bars.tolist())]
+
+
+class History_Store:
+    """Price bars per (ticker, interval) kept on disk and read memory-mapped.
+
+    Each series is a flat file of BAR_DTYPE records sorted by time, plus a
+    JSON sidecar with the row count and the date range already fetched
+    (``covered_from`` / ``covered_to``, end exclusive). A request only
+    fetches what lies outside that range: an older head is merged in
+    front, a newer tail is written over the last stored bar (which may have
+    been partial) and appended. The bar for the current session is
+    re-fetched at most every ``tail_ttl`` seconds. A split in fetched data
+    re-fetches the whole covered range, since past prices are split-adjusted.
+    A fetch that returns no bars (yfinance answers most errors with an empty
+    frame) leaves the covered range as it was, so it is asked for again.
+
+    Files only grow or are replaced whole (through a temp file unique to
+    the writer), so a reader's memory map never points past the end of its
+    file. Reads and writes of a series are serialized by a thread lock and,
+    where fcntl is available, an advisory lock on a ``.lock`` file next to
+    it, so uvicorn workers sharing the directory do not interleave writes.
+    """
+
+    def __init__(self, root=HISTORY_STORE_PATH, fetch=yfinance_bars, tail_ttl=HISTORY_TAIL_TTL,
+                 clock=time.time, today=date.today) -> None:
+        self.root = root
+        self.fetch = fetch
+        self.tail_ttl = tail_ttl
+        self.clock = clock
+        self.today = today
+        self._locks = dict()
+        self._locks_guard = threading.Lock()
+        self.fetches = 0
+        self.rows_fetched = 0
+        self.rebuilds = 0
+        self.reads = 0
+        self.bytes_read = 0
+
+    def _lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @contextmanager
+    def _series_lock(self, ticker, interval):
+        with self._lock((ticker, interval)):
+            if fcntl is None:
+                yield
+                return
+            lock_path = os.path.join(self.root, interval, ticker + '.lock')
+            os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+            with open(lock_path, 'a') as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _write_atomic(path, content, mode):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + '.',
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, mode) as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _paths(self, ticker, interval):
+        base = os.path.join(self.root, interval, ticker)
+        return base + '.bin', base + '.json'
+
+    @staticmethod
+    def _read_meta(meta_path):
+        try:
+            with open(meta_path) as file:
+                meta = json.load(file)
+        except FileNotFoundError:
+            return None
+        meta['covered_from'] = date.fromisoformat(meta['covered_from'])
+        meta['covered_to'] = date.fromisoformat(meta['covered_to'])
+        return meta
+
+    def _write_meta(self, meta_path, rows, covered_from, covered_to):
+        meta = {'rows': rows, 'covered_from': covered_from.isoformat(), 'covered_to': covered_to.isoformat(),
+                'updated_at': self.clock()}
+        self._write_atomic(meta_path, json.dumps(meta), 'w')
+
+    def _replace(self, data_path, meta_path, bars, covered_from, covered_to):
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        self._write_atomic(data_path, bars.tobytes(), 'wb')
+        self._write_meta(meta_path, len(bars), covered_from, covered_to)
+
+    @staticmethod
+    def _map(data_path, rows):
+        if rows == 0:
+            return np.zeros(0, dtype=BAR_DTYPE)
+        return np.memmap(data_path, dtype=BAR_DTYPE, mode='r', shape=(rows,))
+
+    def _fetch(self, ticker, start, end, interval):
+        self.fetches += 1
+        bars, split = to_bars(self.fetch(ticker, start, end, interval))
+        self.rows_fetched += len(bars)
+        return bars, split
+
+    def _ensure(self, ticker, interval, start, end):
+        """Fetch whatever part of [start, end) is not stored yet. Returns the
+        number of bars fetched."""
+        data_path, meta_path = self._paths(ticker, interval)
+        meta = self._read_meta(meta_path)
+        if meta is None:
+            bars, _ = self._fetch(ticker, start, end, interval)
+            if len(bars):
+                self._replace(data_path, meta_path, bars, start, end)
+            return len(bars)
+
+        fetched = 0
+        covered_from, covered_to = meta['covered_from'], meta['covered_to']
+        if start < covered_from:
+            head, split = self._fetch(ticker, start, covered_from, interval)
+            fetched += len(head)
+            if split:
+                return fetched + self._rebuild(ticker, interval, start, covered_to)
+            if len(head):
+                stored = self._map(data_path, meta['rows'])
+                if len(stored):
+                    head = head[head['ts'] < stored['ts'][0]]
+                covered_from = start
+                self._replace(data_path, meta_path, np.concatenate([head, stored]), covered_from, covered_to)
+                meta = self._read_meta(meta_path)
+
+        live = covered_to > self.today() and self.clock() - meta['updated_at'] > self.tail_ttl
+        if end > covered_to or live:
+            rows = meta['rows']
+            stored = self._map(data_path, rows)
+            # start from the last stored bar, it may have been taken mid-session
+            tail_start = pd.Timestamp(stored['ts'][-1]).date() if rows else covered_to
+            tail_end = max(end, covered_to)
+            tail, split = self._fetch(ticker, tail_start, tail_end, interval)
+            fetched += len(tail)
+            if split:
+                return fetched + self._rebuild(ticker, interval, covered_from, tail_end)
+            if not len(tail):
+                # the tail starts at the last stored bar, so nothing back is a failed fetch
+                return fetched
+            keep = int(np.searchsorted(stored['ts'], tail['ts'][0]))
+            del stored
+            with open(data_path, 'r+b') as file:
+                file.seek(keep * BAR_DTYPE.itemsize)
+                file.write(tail.tobytes())
+            self._write_meta(meta_path, keep + len(tail), covered_from, tail_end)
+        return fetched
+
+    def _rebuild(self, ticker, interval, start, end):
+        self.rebuilds += 1
+        bars, _ = self._fetch(ticker, start, end, interval)
+        data_path, meta_path = self._paths(ticker, interval)
+        if len(bars):
+            self._replace(data_path, meta_path, bars, start, end)
+        else:
+            # the stored bars predate the split: forget them rather than serve them
+            os.remove(meta_path)
+        return len(bars)
+
+    def range(self, ticker, start, end, interval='1d'):
+        """Bars with ``start <= date < end``, fetching only what is not stored.
+
+        Returns ``(bars, info)`` with ``info`` holding the bars fetched
+        upstream and the bytes copied out of the mapped file.
+        """
+        ticker = ticker.upper()
+        if interval not in HISTORY_INTERVALS:
+            raise ValueError(f"Unknown interval {interval!r}, expected one of {list(HISTORY_INTERVALS)}")
+        if not _TICKER.fullmatch(ticker):
+            raise ValueError(f"Invalid ticker {ticker!r}")
+        end = min(end, self.today() + timedelta(days=1))
+        if start >= end:
+            return np.zeros(0, dtype=BAR_DTYPE), {'fetched': 0, 'bytes_read': 0}
+        data_path, meta_path = self._paths(ticker, interval)
+        with self._series_lock(ticker, interval):
+            fetched = self._ensure(ticker, interval, start, end)
+            meta = self._read_meta(meta_path)
+            stored = self._map(data_path, meta['rows'] if meta is not None else 0)
+            ts = stored['ts']
+            lo = np.searchsorted(ts, pd.Timestamp(start).value)
+            hi = np.searchsorted(ts, pd.Timestamp(end).value)
+            bars = np.array(stored[lo:hi])
+        self.reads += 1
+        self.bytes_read += bars.nbytes
+        return bars, {'fetched': fetched, 'bytes_read': bars.nbytes}
+
+    def stats(self):
+        return {
+            'path': self.root,
+            'series': sum(len([name for name in os.listdir(os.path.join(self.root, interval))
+                               if name.endswith('.bin')])
+                          for interval in HISTORY_INTERVALS if os.path.isdir(os.path.join(self.root, interval))),
+            'fetches': self.fetches,
+            'rows_fetched': self.rows_fetched,
+            'rebuilds': self.rebuilds,
+            'reads': self.reads,
+            'bytes_read': self.bytes_read,
+        }
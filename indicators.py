@@ -0,0 +1,209 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "1024"))
+INDICATOR_MAX_TICKERS = int(os.getenv("INDICATOR_MAX_TICKERS", "200"))
+INDICATOR_MAX_WINDOW = 5000  # bars; longer windows would need decades of warm-up history
+TRADING_DAYS = 252
+
+# calendar days per bar, used to turn a warm-up in bars into a date offset
+_INTERVAL_DAYS = {'1d': 1.5, '1wk': 7, '1mo': 31, '3mo': 92}
+# warm-up never reaches further back than this, no price history predates it
+_EARLIEST = date(1900, 1, 1)
+
+
+def _nan(n):
+    return np.full(n, np.nan)
+
+
+def sma(close, window=20):
+    out = _nan(len(close))
+    if len(close) >= window:
+        out[window - 1:] = sliding_window_view(close, window).mean(axis=1)
+    return out
+
+
+def ema(close, span=20):
+    return pd.Series(close).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def rsi(close, period=14):
+    """Wilder's RSI."""
+    change = np.diff(close, prepend=np.nan)
+    gains = pd.Series(np.where(change > 0, change, 0.0)[1:])
+    losses = pd.Series(np.where(change < 0, -change, 0.0)[1:])
+    average_gain = gains.ewm(alpha=1 / period, adjust=False, min_periods=period).mean().to_numpy()
+    average_loss = losses.ewm(alpha=1 / period, adjust=False, min_periods=period).mean().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = np.where(average_loss == 0, 100.0, 100 - 100 / (1 + average_gain / average_loss))
+    value[np.isnan(average_gain)] = np.nan
+    return np.concatenate(([np.nan], value))
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return {'macd': line, 'signal': signal_line, 'histogram': line - signal_line}
+
+
+def bollinger(close, window=20, k=2):
+    middle = sma(close, window)
+    deviation = _nan(len(close))
+    if len(close) >= window:
+        deviation[window - 1:] = sliding_window_view(close, window).std(axis=1)
+    return {'middle': middle, 'upper': middle + k * deviation, 'lower': middle - k * deviation}
+
+
+def volatility(close, window=20, periods=TRADING_DAYS):
+    """Rolling standard deviation of log returns, annualized over ``periods``."""
+    out = _nan(len(close))
+    if len(close) > window:
+        returns = np.diff(np.log(close))
+        out[window:] = sliding_window_view(returns, window).std(axis=1, ddof=1) * math.sqrt(periods)
+    return out
+
+
+def returns(close):
+    out = _nan(len(close))
+    out[1:] = close[1:] / close[:-1] - 1
+    return out
+
+
+def drawdown(close):
+    """Drop from the running peak, measured from the first bar given."""
+    drawdowns = close / np.maximum.accumulate(close) - 1 if len(close) else np.zeros(0)
+    return {'drawdown': drawdowns, 'max_drawdown': float(drawdowns.min()) if len(close) else None}
+
+
+class Indicator:
+    """``warmup(*params)`` is how many earlier bars the first value depends
+    on; None means the indicator is computed over the requested range only."""
+
+    def __init__(self, fn, defaults, warmup) -> None:
+        self.fn = fn
+        self.defaults = defaults
+        self.warmup = warmup
+
+
+INDICATORS = {
+    'sma': Indicator(sma, (20,), lambda window: window),
+    'ema': Indicator(ema, (20,), lambda span: 4 * span),
+    'rsi': Indicator(rsi, (14,), lambda period: 4 * period),
+    'macd': Indicator(macd, (12, 26, 9), lambda fast, slow, signal: 4 * slow + signal),
+    'bollinger': Indicator(bollinger, (20, 2.0), lambda window, k: window),
+    'volatility': Indicator(volatility, (20,), lambda window: window + 1),
+    'returns': Indicator(returns, (), lambda: 1),
+    'drawdown': Indicator(drawdown, (), None),
+}
+
+
+def parse_spec(spec):
+    """``"macd:12,26,9"`` -> ``("macd:12,26,9", "macd", (12, 26, 9))``. Missing
+    parameters take their defaults, so ``"sma"`` and ``"sma:20"`` are the same."""
+    name, _, raw = spec.strip().lower().partition(':')
+    indicator = INDICATORS.get(name)
+    if indicator is None:
+        raise ValueError(f"Unknown indicator {name!r}, expected one of {list(INDICATORS)}")
+    given = [part.strip() for part in raw.split(',') if part.strip()]
+    if len(given) > len(indicator.defaults):
+        raise ValueError(f"{name} takes at most {len(indicator.defaults)} parameters")
+    params = []
+    for default, raw_value in zip(indicator.defaults, given):
+        try:
+            value = float(raw_value)
+        except ValueError:
+            raise ValueError(f"Invalid parameter {raw_value!r} in {spec!r}")
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid parameter {raw_value!r} in {spec!r}")
+        if isinstance(default, int):
+            if not value.is_integer():
+                raise ValueError(f"{name} needs whole-number periods, got {raw_value!r}")
+            value = int(value)
+            if value > INDICATOR_MAX_WINDOW:
+                raise ValueError(f"{name} periods are limited to {INDICATOR_MAX_WINDOW} bars, got {value}")
+        if value <= 0:
+            raise ValueError(f"Parameters in {spec!r} must be positive")
+        params.append(value)
+    params = tuple(params) + indicator.defaults[len(params):]
+    key = name + (':' + ','.join(f"{param:g}" for param in params) if params else '')
+    return key, name, params
+
+
+class Indicator_Engine:
+    """Computes indicators over bars from the History_Store.
+
+    Enough earlier bars are loaded for every indicator to be warmed up at
+    ``start``. Results are memoized per (ticker, interval, range,
+    indicators, last bar), so a repeat request costs one range read until a
+    new or updated bar arrives.
+    """
+
+    def __init__(self, history, max_entries=INDICATOR_CACHE_SIZE) -> None:
+        self.history = history
+        self.max_entries = max_entries
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def compute(self, ticker, specs, start, end, interval='1d'):
+        """Indicators for ``start <= date < end``, columnar, keyed by spec."""
+        parsed = list(dict.fromkeys(parse_spec(spec) for spec in specs))
+        if not parsed:
+            raise ValueError("No indicators requested")
+        warmup = max((INDICATORS[name].warmup(*params) for _, name, params in parsed
+                      if INDICATORS[name].warmup is not None), default=0)
+        lookback = (math.ceil(warmup * _INTERVAL_DAYS[interval]) + 7) if warmup else 0
+        lookback = min(lookback, max((start - _EARLIEST).days, 0))
+        bars, _ = self.history.range(ticker, start - timedelta(days=lookback), end, interval)
+
+        key = (ticker.upper(), interval, start, end, tuple(key for key, _, _ in parsed),
+               len(bars), int(bars['ts'][-1]) if len(bars) else None,
+               float(bars['close'][-1]) if len(bars) else None)
+        with self._lock:
+            result = self._memo.get(key)
+            if result is not None:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        close = np.ascontiguousarray(bars['close'])
+        first = int(np.searchsorted(bars['ts'], pd.Timestamp(start).value))
+        result = {
+            'date': np.datetime_as_string(bars['ts'][first:].astype('datetime64[ns]'), unit='D').tolist(),
+            'close': close[first:],
+        }
+        for spec_key, name, params in parsed:
+            indicator = INDICATORS[name]
+            if indicator.warmup is None:
+                result[spec_key] = indicator.fn(close[first:], *params)
+                continue
+            values = indicator.fn(close, *params)
+            if isinstance(values, dict):
+                result[spec_key] = {part: series[first:] for part, series in values.items()}
+            else:
+                result[spec_key] = values[first:]
+
+        with self._lock:
+            self._memo[key] = result
+            while len(self._memo) > self.max_entries:
+                self._memo.popitem(last=False)
+        return result
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._memo),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'indicators': list(INDICATORS),
+        }
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+from rate_limiter import upstream_priority, BACKGROUND
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "0.5"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+
+FINISHED = ('completed', 'cancelled')
+
+
+class Job:
+
+    def __init__(self, tickers, options=None) -> None:
+        self.id = uuid.uuid4().hex
+        self.tickers = list(tickers)
+        self.options = options or dict()
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.outcomes = {ticker: {'status': 'pending', 'attempts': 0, 'error': None, 'elapsed': None}
+                         for ticker in self.tickers}
+
+    @property
+    def done(self):
+        return sum(1 for outcome in self.outcomes.values() if outcome['status'] in ('success', 'error'))
+
+    def to_dict(self):
+        counts = dict()
+        for outcome in self.outcomes.values():
+            counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+        end = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'status': self.status,
+            'options': self.options,
+            'progress': {'done': self.done, 'total': len(self.outcomes), **counts},
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration': round(end - self.started_at, 3) if self.started_at else None,
+            'results': self.outcomes,
+        }
+
+
+class Job_Store:
+    """Where jobs are kept between the submit and status calls."""
+
+    def add(self, job):
+        raise NotImplementedError
+
+    def get(self, job_id):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class Memory_Job_Store(Job_Store):
+    """Keeps the last ``max_jobs`` jobs of this process, dropping the oldest
+    finished ones first."""
+
+    def __init__(self, max_jobs=JOB_HISTORY) -> None:
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+
+    def add(self, job):
+        self._jobs[job.id] = job
+        if len(self._jobs) > self.max_jobs:
+            for job_id, old in list(self._jobs.items()):
+                if old.status in FINISHED:
+                    del self._jobs[job_id]
+                    if len(self._jobs) <= self.max_jobs:
+                        break
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def __len__(self):
+        return len(self._jobs)
+
+
+class Job_Runner:
+    """Runs ticker jobs in the background.
+
+    ``process`` is an async callable doing the work for one ticker, called
+    as ``process(ticker, **job.options)``. It is
+    retried with exponential backoff and jitter up to ``max_attempts`` times.
+    A single semaphore bounds concurrency across every job.
+    """
+
+    def __init__(self, process, store=None, concurrency=JOB_CONCURRENCY, max_attempts=JOB_MAX_ATTEMPTS,
+                 backoff=JOB_RETRY_BACKOFF, sleep=asyncio.sleep) -> None:
+        self.process = process
+        self.store = store if store is not None else Memory_Job_Store()
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.sleep = sleep
+        self._semaphore = None
+        self._tasks = dict()
+
+    def submit(self, tickers, options=None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        job = Job(tickers, options)
+        self.store.add(job)
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def _run(self, job):
+        upstream_priority.set(BACKGROUND)
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            await asyncio.gather(*(self._run_ticker(job, ticker) for ticker in job.outcomes))
+            job.status = 'completed'
+        except asyncio.CancelledError:
+            job.status = 'cancelled'
+            for outcome in job.outcomes.values():
+                if outcome['status'] in ('pending', 'running'):
+                    outcome['status'] = 'cancelled'
+        finally:
+            job.finished_at = time.time()
+
+    async def _run_ticker(self, job, ticker):
+        outcome = job.outcomes[ticker]
+        async with self._semaphore:
+            outcome['status'] = 'running'
+            started = time.perf_counter()
+            for attempt in range(1, self.max_attempts + 1):
+                outcome['attempts'] = attempt
+                try:
+                    await self.process(ticker, **job.options)
+                    outcome['status'] = 'success'
+                    outcome['error'] = None
+                    break
+                except Exception as e:
+                    outcome['error'] = str(e) or type(e).__name__
+                    if attempt == self.max_attempts:
+                        outcome['status'] = 'error'
+                    else:
+                        await self.sleep(self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            outcome['elapsed'] = round(time.perf_counter() - started, 3)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a running job. Returns False if it is unknown or already done."""
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def shutdown(self):
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {'running': len(self._tasks), 'stored': len(self.store), 'concurrency': self.concurrency}
@@ -1,29 +1,99 @@
 import asyncio
 import os
 import json
-from typing import List
-from fastapi import FastAPI
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from fastapi import FastAPI, Query, Request, Response, WebSocket
 import uvicorn
 from models.ticker_update_model import TickerUpdate
-from peers import Peers_Retriever
-from producer import send_updated_stock_to_kafka
-from stock import Data_Retriever
-from fastapi.responses import JSONResponse
+from projection import projection
+from peers import Peers_Retriever, PEERS_DEFAULT_N, PEERS_MAX_N, PEERS_REFRESH_INTERVAL, PEER_GROUPS, RANK_METRICS
+from producer import pipeline
+from stock import Data_Retriever, STATEMENT_SHAPES, records_to_columnar
+from universe import SORTS
+from cache import build_cache
+from circuit_breaker import upstream_breakers, Circuit_Open, CLOSED, HALF_OPEN
+from metrics import registry, Metrics_Middleware, CONTENT_TYPE, peer_info_errors
+from executor import Upstream_Executor, Executor_Saturated, Upstream_Timeout
+from rate_limiter import upstream_limiter, Upstream_Rate_Limited, upstream_priority, BACKGROUND
+from reference_data import Reference_Data_Manager
+from ticker_store import snapshot_status
+from jobs import Job_Runner
+from fingerprints import Change_Detector
+from scheduler import (Refresh_Scheduler, scheduled_tickers, SCHEDULER_ENABLED, SCHEDULER_UNIVERSE,
+                       SCHEDULER_QUOTE_INTERVAL, SCHEDULER_FUNDAMENTALS_INTERVAL, SCHEDULER_BATCH_SIZE,
+                       SCHEDULER_CONCURRENCY, SCHEDULER_PUBLISH)
+from async_stock import (Async_Data_Retriever, FINANCIAL_DATASETS, STATEMENT_DATASETS, BATCH_MAX_TICKERS,
+                         BATCH_CONCURRENCY)
+from consumer import (Materialized_View, View_Consumer, create_consumer, MATERIALIZED_VIEW_ENABLED,
+                      MATERIALIZED_VIEW_MAX_AGE, MATERIALIZED_VIEW_HEARTBEAT_FRACTION)
+from fastapi.responses import StreamingResponse
+from responses import Fast_JSON_Response, Freshness_Middleware, Payload_Cache, dumps
 import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
 from fastapi.middleware.cors import CORSMiddleware
 from graphqlQuery.peersInfo import peers_info
-from concurrent.futures import ThreadPoolExecutor
 from models.current_price import Event
+from models.financials_batch import FinancialsBatch
+from models.portfolio import Portfolio
+from portfolio import value_positions, PORTFOLIO_MAX_POSITIONS
+from history_store import History_Store, yfinance_bars, HISTORY_INTERVALS, bars_to_columns, bars_to_records
+from indicators import Indicator_Engine, parse_spec, INDICATOR_MAX_TICKERS
+from models.indicator_query import IndicatorQuery
+from quote_hub import Quote_Hub, Quote_Subscriber, frame_tick, QUOTE_STREAM_HEARTBEAT
+from screener import Screener, Screen_Not_Ready, SCREENER_ENABLED, SCREENER_UNIVERSE, SCREENER_INTERVAL
+from models.screen_query import ScreenQuery
 from datetime import datetime, timedelta, date
 
 NASDAQ_CSV_PATH = os.getenv("NASDAQ_CSV_PATH", os.path.join(os.path.dirname(__file__), "data", "nasdaq.csv"))
 SP500_CSV_PATH = os.getenv("SP500_CSV_PATH", os.path.join(os.path.dirname(__file__), "data", "sp500_companies.csv"))
 
-stocks = Data_Retriever(NASDAQ_CSV_PATH)
-peers = Peers_Retriever(SP500_CSV_PATH)
+cache = build_cache()
+stocks = Data_Retriever(NASDAQ_CSV_PATH, cache=cache, limiter=upstream_limiter, breakers=upstream_breakers)
+peers = Peers_Retriever(SP500_CSV_PATH, info_fields=peers_info.model_fields)
+executor = Upstream_Executor()
+async_stocks = Async_Data_Retriever(stocks, executor)
+payloads = Payload_Cache()
+history_store = History_Store(fetch=lambda *args: stocks.upstream(yfinance_bars, *args, kind='history'))
+indicator_engine = Indicator_Engine(history_store)
+screener = Screener(stocks)
+view = Materialized_View()
+view_consumer = View_Consumer(view, lambda: create_consumer(pipeline.producer))
+reference = Reference_Data_Manager(on_reload=lambda names: warm_payloads())
+reference.watch('nasdaq', NASDAQ_CSV_PATH, stocks.reload)
+reference.watch('sp500', SP500_CSV_PATH, peers.reload)
 
-app = FastAPI()
+
+def warm_payloads():
+    """Encode the static listings once up front rather than on first request."""
+    listing = stocks.listing
+    payloads.clear()
+    payloads.get(('tickers', listing.version), lambda: ticker_list(listing))
+    payloads.get(('stocks', listing.version, 1, 'symbol'), lambda: stocks_page(listing.universe, 1))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    executor.start()
+    warm_payloads()
+    reference.start()
+    pipeline.start()
+    if MATERIALIZED_VIEW_ENABLED:
+        view_consumer.start()
+    if scheduler.tasks:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    await quote_hub.stop()
+    await jobs.shutdown()
+    await reference.stop()
+    await asyncio.to_thread(view_consumer.shutdown)
+    await asyncio.to_thread(pipeline.shutdown)
+    stocks.shutdown()
+    executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=Fast_JSON_Response)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,24 +102,65 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(Freshness_Middleware)
+app.add_middleware(Metrics_Middleware, routes=app.routes)
+
+
+@app.exception_handler(Executor_Saturated)
+async def executor_saturated_handler(request: Request, exc: Executor_Saturated):
+    return Fast_JSON_Response(status_code=503, content={"error": "Upstream capacity exhausted, retry shortly"},
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(Upstream_Timeout)
+async def upstream_timeout_handler(request: Request, exc: Upstream_Timeout):
+    return Fast_JSON_Response(status_code=504, content={"error": str(exc)})
+
+
+@app.exception_handler(Upstream_Rate_Limited)
+async def upstream_rate_limited_handler(request: Request, exc: Upstream_Rate_Limited):
+    return Fast_JSON_Response(status_code=429, content={"error": "Upstream rate limit reached, retry shortly"},
+                              headers={"Retry-After": "1"})
+
+
+@app.exception_handler(Circuit_Open)
+async def circuit_open_handler(request: Request, exc: Circuit_Open):
+    return Fast_JSON_Response(status_code=503, content={"error": str(exc)},
+                              headers={"Retry-After": f"{exc.retry_after:.0f}"})
+
+
+STOCKS_PAGE_LIMIT = 253
+STOCKS_MAX_PAGE_SIZE = 1000
 
 @app.get("/stocks")
-async def get_all_stocks(page:int = 1):
-    data = stocks.ticker_dict
-    limit = 253
-    all_items = list(data.items())  # Convert dictionary to a list of tuples
-    total_items = len(all_items)
-    total_pages = (total_items // limit) + (1 if total_items % limit > 0 else 0)
-    
-    # Calculate the start and end indices for the current page
+async def get_all_stocks(page: int = 1, page_size: int = STOCKS_PAGE_LIMIT, sector: Optional[str] = None,
+                         industry: Optional[str] = None, country: Optional[str] = None,
+                         min_market_cap: Optional[float] = None, sort: str = 'symbol'):
+    """Page through the listing. ``min_market_cap`` is in billions, ``sort`` is one
+    of symbol, -symbol, name, market_cap, -market_cap."""
+    if sort not in SORTS:
+        return Fast_JSON_Response(status_code=400, content={
+            "error": f"Unknown sort {sort!r}, expected one of {list(SORTS)}"})
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), STOCKS_MAX_PAGE_SIZE)
+    filters = (sector, industry, country, min_market_cap)
+    listing = stocks.listing
+    if filters == (None, None, None, None) and page_size == STOCKS_PAGE_LIMIT:
+        # unfiltered pages are the common case and only change on reload, serve them pre-encoded
+        total_pages = -(-len(listing.universe) // page_size)
+        if page <= total_pages:
+            return payloads.response(('stocks', listing.version, page, sort),
+                                     lambda: stocks_page(listing.universe, page, page_size, sort=sort))
+    return stocks_page(listing.universe, page, page_size, sector, industry, country, min_market_cap, sort)
+
+def stocks_page(universe, page: int, limit: int = STOCKS_PAGE_LIMIT, sector=None, industry=None, country=None,
+                min_market_cap=None, sort='symbol'):
+    view = universe.select(sector, industry, country, min_market_cap, sort)
+    total_items = len(view)
+    total_pages = -(-total_items // limit)
     start = (page - 1) * limit
-    end = start + limit
-    
-    # Slice the items list to get the items for the current page
-    paginated_items = dict(all_items[start:end])
-    
     return {
-        "items": paginated_items,
+        "items": universe.items(view[start:start + limit]),
         "total": total_items,
         "page": page,
         "limit": limit,
@@ -59,150 +170,681 @@ async def get_all_stocks(page:int = 1):
     }
     
 
+SEARCH_MAX_LIMIT = 50
+
+@app.get('/stocks/search')
+async def search_stocks(q: str, limit: int = 10, fuzzy: bool = True):
+    """Symbol / company-name search, ranked by match quality then market cap."""
+    limit = min(max(limit, 1), SEARCH_MAX_LIMIT)
+    return {"query": q, "results": stocks.search_index.results(q, limit, fuzzy)}
+
+def ticker_list(listing):
+    return list(listing.store.keys())
+
 @app.get('/stocks/tickers') 
 async def get_tickers():
-    return JSONResponse(list(stocks.ticker_dict.keys()))
+    listing = stocks.listing
+    return payloads.response(('tickers', listing.version), lambda: ticker_list(listing))
+
+UPSTREAM_HEADERS = {"X-Data-Source": "upstream"}
+
+def view_headers(age: float):
+    """Headers of a response served from the materialized view."""
+    return {"X-Data-Source": "view", "X-Data-Age": f"{age:.0f}"}
+
+def invalid_fields_response(error: ValueError):
+    return Fast_JSON_Response(status_code=400, content={"error": str(error)})
 
 @app.get("/stocks/company-overview/{ticker}")
-async def get_company_info(ticker):
-    return JSONResponse(stocks.company_overview(ticker))
+async def get_company_info(ticker, fields: Optional[str] = None):
+    """Company overview; ``fields=shortName,marketCap`` returns only those keys."""
+    try:
+        project = projection(fields) if fields else None
+    except ValueError as e:
+        return invalid_fields_response(e)
+    held = view.get(ticker, ('company-overview',))
+    if held is not None:
+        info = held[0]['company-overview']
+        return Fast_JSON_Response(project(info) if project else info, headers=view_headers(held[1]))
+    info = await async_stocks.company_overview(ticker)
+    return Fast_JSON_Response(project(info) if project else info, headers=UPSTREAM_HEADERS)
 
-def get_financial_data(ticker: str):
+async def get_financial_data(ticker: str, shape: str = 'records'):
     """Reusable function to get financial data for a ticker"""
-    def get_company_overview():
-        return 'company-overview', stocks.company_overview(ticker)
+    return await async_stocks.financials(ticker, shape=shape)
 
-    def get_balance_sheet():
-        return 'balance-sheet', stocks.get_balance_sheet(ticker)
+def unknown_shape_response(shape: str):
+    return Fast_JSON_Response(status_code=400, content={
+        "error": f"Unknown shape {shape!r}, expected one of {list(STATEMENT_SHAPES)}"})
 
-    def get_cashflow():
-        return 'cashflow', stocks.get_cashflow(ticker)
+@app.get('/stocks/financials/ticker')
+async def get_financials(ticker, shape: str = 'records'):
+    if shape not in STATEMENT_SHAPES:
+        return unknown_shape_response(shape)
+    held = view.get(ticker, FINANCIAL_DATASETS)
+    if held is not None:
+        # the view holds the records shape that update_ticker publishes
+        data, age = held
+        if shape == 'columnar':
+            data = {dataset: records_to_columnar(payload) if dataset in STATEMENT_DATASETS else payload
+                    for dataset, payload in data.items()}
+        return Fast_JSON_Response(data, headers=view_headers(age))
+    data = await get_financial_data(ticker, shape)
+    return Fast_JSON_Response(data, headers=UPSTREAM_HEADERS)
 
-    def get_income_statement():
-        return 'income-statement', stocks.get_income_statement(ticker)
-    
-    tasks = [get_company_overview, get_balance_sheet, get_cashflow, get_income_statement]
-    
-    data = {}
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = [executor.submit(task) for task in tasks]
-        for future in futures:
-            key, value = future.result()
-            data[key] = value
-    
-    return data
+HISTORY_DEFAULT_DAYS = 365
 
-@app.get('/stocks/financials/ticker')
-async def get_financials(ticker):
-    data = get_financial_data(ticker)
-    return JSONResponse(data)
+def history_window(start, end, interval):
+    """Defaults for an inclusive date range. Returns (start, end, error response)."""
+    if interval not in HISTORY_INTERVALS:
+        return None, None, Fast_JSON_Response(status_code=400, content={
+            "error": f"Unknown interval {interval!r}, expected one of {list(HISTORY_INTERVALS)}"})
+    end = end or date.today()
+    start = start or end - timedelta(days=HISTORY_DEFAULT_DAYS)
+    if start > end:
+        return None, None, Fast_JSON_Response(status_code=400, content={"error": "start must not be after end"})
+    return start, end, None
 
+@app.get('/stocks/history/{ticker}')
+async def get_price_history(ticker: str, start: Optional[date] = None, end: Optional[date] = None,
+                            interval: str = '1d', shape: str = 'columnar'):
+    """Price bars from ``start`` to ``end`` (inclusive, default: the last year),
+    served from the local history store. Only bars not stored yet are fetched."""
+    if shape not in STATEMENT_SHAPES:
+        return unknown_shape_response(shape)
+    start, end, error = history_window(start, end, interval)
+    if error is not None:
+        return error
+    try:
+        bars, info = await executor.run(history_store.range, ticker, start, end + timedelta(days=1), interval)
+    except ValueError as e:
+        return Fast_JSON_Response(status_code=400, content={"error": str(e)})
+    return Fast_JSON_Response({
+        "ticker": ticker.upper(),
+        "interval": interval,
+        "start": start,
+        "end": end,
+        "count": len(bars),
+        "bars": bars_to_columns(bars) if shape == 'columnar' else bars_to_records(bars),
+        **info,
+    })
 
-def fetch_ticker_info(ticker: str):
+def invalid_indicators_response(indicators):
+    if not indicators:
+        return Fast_JSON_Response(status_code=400, content={"error": "No indicators requested"})
     try:
-        tkr = yf.Ticker(ticker)
-        info = tkr.info
-        info.pop('companyOfficers', None)
-        info.pop('52WeekChange', None)
-
-        valid_fields = {
-            field: str(info.get(field)) if isinstance(info.get(field), (int, float)) else info.get(field)
-            for field in peers_info.__annotations__.keys()
-        }
-        return peers_info(**valid_fields).model_dump()
+        for spec in indicators:
+            parse_spec(spec)
+    except ValueError as e:
+        return Fast_JSON_Response(status_code=400, content={"error": str(e)})
+    return None
+
+@app.get('/stocks/indicators/{ticker}')
+async def get_indicators(ticker: str, indicators: List[str] = Query(...), start: Optional[date] = None,
+                         end: Optional[date] = None, interval: str = '1d'):
+    """Technical indicators over stored history, e.g.
+    ``?indicators=sma:20&indicators=rsi&indicators=macd:12,26,9``."""
+    start, end, error = history_window(start, end, interval)
+    error = error or invalid_indicators_response(indicators)
+    if error is not None:
+        return error
+    try:
+        result = await executor.run(indicator_engine.compute, ticker, indicators, start,
+                                    end + timedelta(days=1), interval)
+    except ValueError as e:
+        return Fast_JSON_Response(status_code=400, content={"error": str(e)})
+    return Fast_JSON_Response({"ticker": ticker.upper(), "interval": interval, "start": start, "end": end,
+                               "indicators": result})
+
+@app.post('/stocks/indicators')
+async def get_indicators_batch(query: IndicatorQuery):
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in query.tickers if ticker.strip()))
+    if len(tickers) > INDICATOR_MAX_TICKERS:
+        return Fast_JSON_Response(status_code=400, content={
+            "error": f"At most {INDICATOR_MAX_TICKERS} tickers per request, got {len(tickers)}"})
+    start, end, error = history_window(query.start, query.end, query.interval)
+    error = error or invalid_indicators_response(query.indicators)
+    if error is not None:
+        return error
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def compute(ticker):
+        async with semaphore:
+            return await executor.run(indicator_engine.compute, ticker, query.indicators, start,
+                                      end + timedelta(days=1), query.interval)
+
+    outcomes = await asyncio.gather(*(compute(ticker) for ticker in tickers), return_exceptions=True)
+    results, errors = dict(), dict()
+    for ticker, outcome in zip(tickers, outcomes):
+        if isinstance(outcome, Exception):
+            errors[ticker] = str(outcome) or type(outcome).__name__
+        else:
+            results[ticker] = outcome
+    return Fast_JSON_Response({"interval": query.interval, "start": start, "end": end,
+                               "results": results, "errors": errors})
+
+@app.get('/history/stats')
+async def get_history_stats():
+    return {**await asyncio.to_thread(history_store.stats), 'indicators': indicator_engine.stats()}
+
+@app.post('/stocks/financials/batch')
+async def get_financials_batch(batch: FinancialsBatch):
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in batch.tickers if ticker.strip()))
+    datasets = tuple(batch.datasets) if batch.datasets else FINANCIAL_DATASETS
+    unknown = [dataset for dataset in datasets if dataset not in FINANCIAL_DATASETS]
+    if unknown:
+        return Fast_JSON_Response(status_code=400, content={
+            "error": f"Unknown datasets {unknown}, expected any of {list(FINANCIAL_DATASETS)}"})
+    if len(tickers) > BATCH_MAX_TICKERS:
+        return Fast_JSON_Response(status_code=400, content={
+            "error": f"At most {BATCH_MAX_TICKERS} tickers per batch, got {len(tickers)}"})
+    if batch.shape not in STATEMENT_SHAPES:
+        return unknown_shape_response(batch.shape)
+
+    if batch.stream:
+        async def lines():
+            async for ticker, data, errors in async_stocks.financials_many(tickers, datasets, batch.shape):
+                yield dumps({"ticker": ticker, "data": data, "errors": errors}) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    results, failures = dict(), dict()
+    async for ticker, data, errors in async_stocks.financials_many(tickers, datasets, batch.shape):
+        results[ticker] = data
+        if errors:
+            failures[ticker] = errors
+    # keep the caller's ticker order regardless of completion order
+    return Fast_JSON_Response({
+        "results": {ticker: results[ticker] for ticker in tickers},
+        "errors": failures,
+        "requested": len(tickers),
+    })
+
+
+PEER_FIELDS = frozenset(peers_info.model_fields)
+peer_projection = projection(','.join(peers_info.model_fields), PEER_FIELDS)
+
+def load_peer_info(ticker: str):
+    # the peers_info shape: numbers as strings, anything else non-string as None
+    info = peer_projection(yf.Ticker(ticker).info)
+    return {field: str(value) if isinstance(value, (int, float)) else value if isinstance(value, str) else None
+            for field, value in info.items()}
+
+
+def fetch_ticker_info(ticker: str, refresh: bool = False):
+    try:
+        return stocks.cached('peers', ticker.upper(), lambda: load_peer_info(ticker), refresh)
     except Exception as e:
-        print(f"[{ticker}] Error: {e}")
+        peer_info_errors.inc(type(e).__name__)
         return None
 
-# Use ThreadPoolExecutor to fetch all in parallel
-def fetch_all_in_parallel(ticker_list: List[str]):
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        results = list(executor.map(fetch_ticker_info, ticker_list))
-    return [r for r in results if r is not None]
+# Fetch all in parallel on the shared upstream executor, keyed by ticker
+async def fetch_all_in_parallel(ticker_list: List[str], refresh: bool = False):
+    results = await asyncio.gather(
+        *(async_stocks.run(fetch_ticker_info, ticker, refresh) for ticker in ticker_list), return_exceptions=True)
+    return {ticker: r for ticker, r in zip(ticker_list, results) if isinstance(r, dict)}
+
+# symbols whose peer info is being fetched in the background
+peer_fills = set()
+peer_fill_tasks = set()
+
+async def fill_peer_info(tickers: List[str], refresh: bool = False):
+    upstream_priority.set(BACKGROUND)
+    try:
+        peers.update_info(await fetch_all_in_parallel(tickers, refresh))
+    finally:
+        peer_fills.difference_update(tickers)
+
+def start_peer_fill(tickers: List[str], refresh: bool = False):
+    tickers = [ticker for ticker in tickers if ticker not in peer_fills]
+    if tickers:
+        peer_fills.update(tickers)
+        task = asyncio.create_task(fill_peer_info(tickers, refresh))
+        peer_fill_tasks.add(task)
+        task.add_done_callback(peer_fill_tasks.discard)
+
+def peers_response(tickers: List[str], project=None):
+    """Peer metrics from the snapshot, each with its ``fetched_at``. Symbols
+    it does not hold yet are answered from the listing and fetched in the
+    background; entries older than PEERS_REFRESH_INTERVAL are re-fetched in
+    the background, past the cache. The request itself never waits on
+    yfinance."""
+    results, missing, outdated = peers.peer_info(tickers)
+    if project is not None:
+        results = [{**project(result), 'fetched_at': result['fetched_at']} for result in results]
+    start_peer_fill(missing)
+    start_peer_fill(outdated, refresh=True)
+    return Fast_JSON_Response(results)
+
+def peers_projection(fields: Optional[str]):
+    """Projection for a peers ``fields=`` parameter (peers_info keys only)."""
+    return projection(fields, PEER_FIELDS) if fields else None
+
+def invalid_peers_query(n: int, metric: str):
+    if not 1 <= n <= PEERS_MAX_N:
+        return Fast_JSON_Response(status_code=400, content={"error": f"n must be between 1 and {PEERS_MAX_N}"})
+    if metric not in RANK_METRICS:
+        return Fast_JSON_Response(status_code=400,
+                                  content={"error": f"Unknown metric {metric!r}, expected one of {list(RANK_METRICS)}"})
+    return None
 
 # Route for Industry
 @app.get('/stocks/peers/industry/{industry}')
-async def get_company_by_industry(industry: str):
-    tickers = peers.top_five_peers_by_industry(industry)
-    results = fetch_all_in_parallel(tickers)
-    return JSONResponse(results)
+async def get_company_by_industry(industry: str, n: int = PEERS_DEFAULT_N, metric: str = 'marketcap',
+                                  fields: Optional[str] = None):
+    error = invalid_peers_query(n, metric)
+    if error is not None:
+        return error
+    try:
+        project = peers_projection(fields)
+    except ValueError as e:
+        return invalid_fields_response(e)
+    return peers_response(peers.top_peers('industry', industry, n, metric), project)
 
 # Route for Sector
 @app.get('/stocks/peers/sector/{sector}')
-async def get_company_by_sector(sector: str):
-    tickers = peers.top_five_peers_by_sector(sector)
-    results = fetch_all_in_parallel(tickers)
-    return JSONResponse(results)
+async def get_company_by_sector(sector: str, n: int = PEERS_DEFAULT_N, metric: str = 'marketcap',
+                                fields: Optional[str] = None):
+    error = invalid_peers_query(n, metric)
+    if error is not None:
+        return error
+    try:
+        project = peers_projection(fields)
+    except ValueError as e:
+        return invalid_fields_response(e)
+    return peers_response(peers.top_peers('sector', sector, n, metric), project)
+
+# Route for the peers of one company
+@app.get('/stocks/peers/ticker/{ticker}')
+async def get_company_peers(ticker: str, by: str = 'industry', n: int = PEERS_DEFAULT_N,
+                            metric: str = 'marketcap', fields: Optional[str] = None):
+    error = invalid_peers_query(n, metric)
+    if error is not None:
+        return error
+    try:
+        project = peers_projection(fields)
+    except ValueError as e:
+        return invalid_fields_response(e)
+    if by not in PEER_GROUPS:
+        return Fast_JSON_Response(status_code=400,
+                                  content={"error": f"Unknown group {by!r}, expected one of {list(PEER_GROUPS)}"})
+    found = peers.peers_of(ticker, by, n, metric)
+    if found is None:
+        return Fast_JSON_Response(status_code=404, content={"error": f"{ticker.upper()} is not in the S&P 500 list"})
+    name, tickers = found
+    response = peers_response(tickers, project)
+    response.headers['X-Peer-Group'] = name
+    return response
+
+@app.get('/peers/status')
+async def get_peers_status():
+    return {**peers.stats(), 'filling': len(peer_fills)}
+
+@app.get('/cache/stats')
+async def get_cache_stats():
+    return {**cache.stats(), **stocks.stale_stats(), 'coalescing': stocks.flights.stats(),
+            'async_coalescing': async_stocks.flights.stats(), 'payloads': payloads.stats()}
+
+@app.get('/reference/status')
+async def get_reference_status():
+    listing = stocks.listing
+    return {**reference.status(), 'listing_version': listing.version, 'listing_loaded_at': listing.loaded_at,
+            'listing_size': len(listing.store), 'listing_snapshot': dict(snapshot_status)}
+
+@app.get('/kafka/stats')
+async def get_kafka_stats():
+    return {**pipeline.stats(), 'change_detection': change_detector.stats(), 'consumer': view_consumer.stats()}
+
+@app.get('/executor/stats')
+async def get_executor_stats():
+    return executor.stats()
+
+@app.get('/upstream/limits')
+async def get_upstream_limits():
+    return upstream_limiter.stats()
+
+@app.get('/upstream/breakers')
+async def get_upstream_breakers():
+    return upstream_breakers.stats()
+
+# gauges and counters over state the components already keep, read at scrape time
+CIRCUIT_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1}
+registry.callback('executor_active', 'Upstream executor workers busy.', lambda: executor.active)
+registry.callback('executor_queued', 'Calls waiting for an upstream executor worker.', lambda: executor.queued)
+registry.callback('executor_rejected_total', 'Calls rejected because the executor queue was full.',
+                  lambda: executor.rejected, 'counter')
+registry.callback('executor_timeouts_total', 'Executor calls that timed out.', lambda: executor.timeouts, 'counter')
+registry.callback('upstream_concurrency_limit', 'Current adaptive limit on concurrent yfinance calls.',
+                  lambda: int(upstream_limiter.limit))
+registry.callback('upstream_inflight', 'yfinance calls in progress.', lambda: upstream_limiter.inflight)
+registry.callback('upstream_throttled_total', 'yfinance calls that were throttled.',
+                  lambda: upstream_limiter.throttled, 'counter')
+registry.callback('upstream_rejected_total', 'Calls not admitted by the rate limiter in time, by priority.',
+                  lambda: {(priority,): count for priority, count in upstream_limiter.rejected.items()},
+                  'counter', ('priority',))
+registry.callback('upstream_circuit_state', 'Circuit breaker state per dataset: 0 closed, 1 half-open, 2 open.',
+                  lambda: {(kind,): CIRCUIT_STATE_VALUES.get(circuit.state, 2)
+                           for kind, circuit in list(upstream_breakers.circuits.items())},
+                  labels=('dataset',))
+registry.callback('cache_requests_total', 'Cache lookups by result.',
+                  lambda: {('hit',): cache.hits, ('miss',): cache.misses, ('stale',): stocks.stale_served},
+                  'counter', ('result',))
+registry.callback('kafka_queue_depth', 'Messages waiting for the Kafka delivery thread.', lambda: pipeline.stats()['queued'])
+registry.callback('kafka_messages_total', 'Kafka messages by outcome.',
+                  lambda: {('enqueued',): pipeline.enqueued, ('rejected',): pipeline.rejected,
+                           ('delivered',): pipeline.delivered, ('failed',): pipeline.failed},
+                  'counter', ('outcome',))
+registry.callback('kafka_view_lag', 'Messages the materialized view is behind.', lambda: view_consumer.lag)
+registry.callback('quote_stream_connections', 'Open quote streaming connections.', lambda: quote_hub.connections)
+
+@app.get('/metrics')
+async def get_metrics():
+    """Every metric in the Prometheus text format."""
+    return Response(await asyncio.to_thread(registry.render), media_type=CONTENT_TYPE)
 
 @app.post('/stocks/get_price')
 async def get_stock_price(event: Event):
+    status_code, content = await executor.run(lookup_stock_price, event)
+    return Fast_JSON_Response(status_code=status_code, content=content)
+
+
+def lookup_stock_price(event: Event):
     try:
-        # Format dates for yfinance
-        end_date = event.date + timedelta(days=1)
-        start_str = event.date.strftime('%Y-%m-%d')
-        end_str = end_date.strftime('%Y-%m-%d')
-
-        # Fetch historical close price for the purchase date
-        historical_data = yf.download(
-            event.ticker,
-            start=start_str,
-            end=end_str,
-            interval='1d',
-            progress=False  # Suppresses tqdm in Jupyter/output
-        )
-
-        if historical_data.empty:
-            return JSONResponse(status_code=400, content={
+        ticker = event.ticker.upper()
+        purchase_close_price = stocks.get_closes([(ticker, event.date)])[(ticker, event.date)]
+
+        if purchase_close_price is None:
+            return 400, {
                 "error": f"No historical price data available on {event.date}. "
                          f"It might be a weekend or market holiday."
-            })
-
-        purchase_close_price = float(historical_data['Close'].iloc[0])
+            }
 
-        # Fetch current price (most recent 1-minute candle)
-        ticker_data = yf.Ticker(event.ticker)
-        current_data = ticker_data.history(period="1d", interval="1m")
+        current_price = stocks.get_last_prices([ticker])[ticker]
 
-        if current_data.empty:
-            return JSONResponse(status_code=200, content={
+        if current_price is None:
+            return 200, {
                 "ticker": event.ticker,
                 "purchase_price": round(purchase_close_price, 2),
                 "current_price": None,
                 "message": "Market data not available. It may be a weekend or holiday."
-            })
-
-        current_price = float(current_data['Close'].iloc[-1])
+            }
 
-        return JSONResponse(status_code=200, content={
+        return 200, {
             "ticker": event.ticker,
             "purchase_price": round(purchase_close_price, 2),
             "current_price": round(current_price, 2)
-        })
+        }
 
+    except (Circuit_Open, Upstream_Rate_Limited):
+        raise
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Internal server error: {str(e)}"})
-    
+        return 500, {"error": f"Internal server error: {str(e)}"}
+
+
+@app.post('/stocks/portfolio/value')
+async def get_portfolio_value(portfolio: Portfolio):
+    """Value many (ticker, purchase date, quantity) positions at once: one range
+    download per cluster of purchase dates and one quote download, run concurrently."""
+    positions = portfolio.positions
+    if len(positions) > PORTFOLIO_MAX_POSITIONS:
+        return Fast_JSON_Response(status_code=400, content={
+            "error": f"At most {PORTFOLIO_MAX_POSITIONS} positions per request, got {len(positions)}"})
+    tickers = list(dict.fromkeys(position.ticker.upper() for position in positions))
+    closes, prices = await asyncio.gather(
+        executor.run(stocks.get_closes, [(position.ticker, position.date) for position in positions]),
+        executor.run(stocks.get_last_prices, tickers))
+    return Fast_JSON_Response(value_positions(positions, closes, prices))
+
+
+def load_ticks(tickers: List[str]):
+    ticks = {ticker: frame_tick(ticker, frame) for ticker, frame in stocks.get_quotes(tickers).items()}
+    return {ticker: tick for ticker, tick in ticks.items() if tick is not None}
+
+async def fetch_ticks(tickers: List[str]):
+    return await executor.run(load_ticks, tickers)
 
-@app.post("/stocks/get_tickers_update")
-async def get_tickers_for_update(tickers: List[TickerUpdate]):
-    ticker_list = [ticker.ticker for ticker in tickers]
-    results = []
-    print(ticker_list)
-    for ticker in ticker_list:
+quote_hub = Quote_Hub(fetch_ticks)
+
+@app.get('/stocks/stream')
+async def stream_quotes(tickers: str):
+    """Server-sent events: a ``quote`` event whenever the price of one of
+    ``tickers`` (comma-separated) changes."""
+    subscriber = Quote_Subscriber()
+    try:
+        quote_hub.subscribe(subscriber, tickers)
+    except ValueError as e:
+        return Fast_JSON_Response(status_code=400, content={"error": str(e)})
+
+    async def events():
         try:
-            financial_data = get_financial_data(ticker)
-            
-            kakfa_message = {
-                "ticker": ticker,
-                "timestamp": datetime.now().isoformat(),
-                "financials": financial_data
-            }
-            
-            send_updated_stock_to_kafka("financial-updates", kakfa_message)
-            results.append({"ticker": ticker, "status": "success"})
-        except Exception as e:
-            results.append({"ticker": ticker, "status": "error", "error": str(e)})
-    return JSONResponse({"processed": len(ticker_list), "results": results})
+            while True:
+                try:
+                    ticks = await asyncio.wait_for(subscriber.next(), QUOTE_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"".join(b"event: quote\ndata: " + dumps(tick) + b"\n\n" for tick in ticks)
+        finally:
+            quote_hub.unsubscribe(subscriber)
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket('/stocks/ws/quotes')
+async def quote_socket(websocket: WebSocket):
+    """Send ``{"subscribe": [...]}`` / ``{"unsubscribe": [...]}`` (a list or a
+    comma-separated string); quotes arrive as ``{"type": "quote", ...}``
+    messages and invalid requests get a ``{"type": "error", ...}`` reply."""
+    await websocket.accept()
+    subscriber = Quote_Subscriber()
+
+    async def receive():
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError("Expected {\"subscribe\": [...]} or {\"unsubscribe\": [...]}")
+                if message.get('subscribe'):
+                    quote_hub.subscribe(subscriber, message['subscribe'])
+                if message.get('unsubscribe'):
+                    quote_hub.unsubscribe(subscriber, message['unsubscribe'])
+            except (TypeError, AttributeError, ValueError) as e:
+                await websocket.send_text(dumps({"type": "error", "error": str(e)}).decode())
+                continue
+            await websocket.send_text(dumps({"type": "subscribed", "tickers": sorted(subscriber.tickers)}).decode())
+
+    async def send():
+        while True:
+            for tick in await subscriber.next():
+                await websocket.send_text(dumps({"type": "quote", **tick}).decode())
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        quote_hub.unsubscribe(subscriber)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.get('/stocks/stream/status')
+async def get_stream_status():
+    return quote_hub.stats()
+
+
+async def update_ticker(ticker: str, force: bool = False, deltas: bool = False):
+    """Re-fetch the financials for one ticker from yfinance and publish
+    whatever changed to Kafka, stamped with when the fetch started. The
+    cache may hold (or serve stale) data up to days old, so it is refreshed
+    first rather than read through."""
+    fetched_at = datetime.now().isoformat()
+    await executor.run(stocks.refresh_fundamentals, ticker)
+    financial_data = await get_financial_data(ticker)
+    changes = change_detector.prepare(ticker, financial_data, fetched_at, force, deltas)
+    # committed before enqueueing, so a fast delivery failure cannot be undone by a late commit
+    change_detector.commit(changes)
+    if changes.message is None:
+        return
+
+    def delivered(error):
+        if error is not None:
+            change_detector.forget(changes)
+
+    try:
+        await pipeline.publish("financial-updates", changes.message, key=ticker, on_delivery=delivered)
+    except BaseException:
+        change_detector.forget(changes)
+        raise
+
+change_detector = Change_Detector(heartbeat_interval=MATERIALIZED_VIEW_MAX_AGE * MATERIALIZED_VIEW_HEARTBEAT_FRACTION
+                                  if MATERIALIZED_VIEW_ENABLED else None)
+jobs = Job_Runner(update_ticker)
+
+@app.post("/stocks/get_tickers_update", status_code=202)
+async def get_tickers_for_update(tickers: List[TickerUpdate], force: bool = False, deltas: bool = False):
+    """Queue an update job. Only datasets that changed since the last publish
+    are sent; ``deltas`` sends field-level deltas, ``force`` full snapshots."""
+    ticker_list = list(dict.fromkeys(ticker.ticker.strip().upper() for ticker in tickers if ticker.ticker.strip()))
+    job = jobs.submit(ticker_list, {"force": force, "deltas": deltas})
+    return Fast_JSON_Response(status_code=202, content={
+        "job_id": job.id,
+        "status": job.status,
+        "tickers": len(ticker_list),
+        "status_url": f"/jobs/{job.id}",
+    })
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return Fast_JSON_Response(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        return Fast_JSON_Response(status_code=404, content={"error": f"Unknown job {job_id}"})
+    if not jobs.cancel(job_id):
+        return Fast_JSON_Response(status_code=409, content={"error": f"Job {job_id} is already {job.status}"})
+    return {"job_id": job_id, "status": "cancelling"}
+
+
+async def refresh_quotes():
+    """Scheduled: re-download the latest bar of every scheduled ticker into the
+    quote cache, SCHEDULER_BATCH_SIZE tickers per request."""
+    tickers = scheduled_tickers(SCHEDULER_UNIVERSE, stocks, peers)
+    refreshed = 0
+    for start in range(0, len(tickers), SCHEDULER_BATCH_SIZE):
+        await scheduler.wait_for_capacity()
+        quotes = await executor.run(stocks.get_quotes, tickers[start:start + SCHEDULER_BATCH_SIZE], True)
+        refreshed += len(quotes)
+    return {"tickers": len(tickers), "refreshed": refreshed}
+
+async def refresh_fundamentals():
+    """Scheduled: re-fetch overview and statements of every scheduled ticker,
+    optionally publishing what changed to Kafka. A rate-limit error ends the
+    sweep so the scheduler backs off."""
+    tickers = scheduled_tickers(SCHEDULER_UNIVERSE, stocks, peers)
+    errors = dict()
+
+    async def refresh(ticker):
+        if SCHEDULER_PUBLISH:
+            await update_ticker(ticker)  # refreshes the cache itself
+        else:
+            await executor.run(stocks.refresh_fundamentals, ticker)
+
+    for start in range(0, len(tickers), SCHEDULER_CONCURRENCY):
+        await scheduler.wait_for_capacity()
+        chunk = tickers[start:start + SCHEDULER_CONCURRENCY]
+        results = await asyncio.gather(*(refresh(ticker) for ticker in chunk), return_exceptions=True)
+        for ticker, result in zip(chunk, results):
+            if isinstance(result, YFRateLimitError):
+                raise result
+            if isinstance(result, Exception):
+                errors[ticker] = str(result) or type(result).__name__
+    return {"tickers": len(tickers), "refreshed": len(tickers) - len(errors), "errors": errors}
+
+async def refresh_screener():
+    """Scheduled: load company overviews (from the cache where still fresh)
+    for the screener universe and fold them into the screener snapshot, one
+    SCHEDULER_BATCH_SIZE batch at a time."""
+    tickers = scheduled_tickers(SCREENER_UNIVERSE, stocks, peers)
+    semaphore = asyncio.Semaphore(SCHEDULER_CONCURRENCY)
+    failed = 0
+
+    async def overview(ticker):
+        async with semaphore:
+            return await executor.run(stocks.company_overview, ticker)
+
+    for start in range(0, len(tickers), SCHEDULER_BATCH_SIZE):
+        await scheduler.wait_for_capacity()
+        batch = tickers[start:start + SCHEDULER_BATCH_SIZE]
+        results = await asyncio.gather(*(overview(ticker) for ticker in batch), return_exceptions=True)
+        if any(isinstance(result, YFRateLimitError) for result in results):
+            raise next(result for result in results if isinstance(result, YFRateLimitError))
+        failed += sum(1 for result in results if isinstance(result, Exception))
+        screener.update({ticker: result for ticker, result in zip(batch, results) if isinstance(result, dict)})
+    return {"tickers": len(tickers), "refreshed": len(tickers) - failed, "failed": failed}
+
+async def refresh_peers():
+    """Scheduled: re-fetch peer info for every S&P 500 company and swap it
+    into the peers snapshot, one SCHEDULER_BATCH_SIZE batch at a time."""
+    tickers = peers.symbols
+    semaphore = asyncio.Semaphore(SCHEDULER_CONCURRENCY)
+    failed = 0
+
+    async def info(ticker):
+        async with semaphore:
+            return await executor.run(stocks.cached, 'peers', ticker, lambda: load_peer_info(ticker), True)
+
+    for start in range(0, len(tickers), SCHEDULER_BATCH_SIZE):
+        await scheduler.wait_for_capacity()
+        batch = tickers[start:start + SCHEDULER_BATCH_SIZE]
+        results = await asyncio.gather(*(info(ticker) for ticker in batch), return_exceptions=True)
+        if any(isinstance(result, YFRateLimitError) for result in results):
+            raise next(result for result in results if isinstance(result, YFRateLimitError))
+        failed += sum(1 for result in results if isinstance(result, Exception))
+        peers.update_info({ticker: result for ticker, result in zip(batch, results) if isinstance(result, dict)})
+    return {"tickers": len(tickers), "refreshed": len(tickers) - failed, "failed": failed}
+
+scheduler = Refresh_Scheduler(busy=lambda: executor.queued > 0)
+if SCHEDULER_ENABLED:
+    scheduler.add('quotes', SCHEDULER_QUOTE_INTERVAL, refresh_quotes)
+    scheduler.add('fundamentals', SCHEDULER_FUNDAMENTALS_INTERVAL, refresh_fundamentals)
+    scheduler.add('peers', PEERS_REFRESH_INTERVAL, refresh_peers)
+# without it the screener only knows market caps, so it runs unless turned off on its own
+if SCREENER_ENABLED:
+    scheduler.add('screener', SCREENER_INTERVAL, refresh_screener)
+
+@app.post('/stocks/screen')
+async def screen_stocks(query: ScreenQuery):
+    """Filter, sort and page the whole listing on snapshot metrics, e.g.
+    Technology stocks over $10B with a trailing P/E under 25."""
+    try:
+        return Fast_JSON_Response(screener.screen([condition.model_dump() for condition in query.filters],
+                                                  query.sort, query.limit, max(query.offset, 0), query.fields))
+    except Screen_Not_Ready as e:
+        return Fast_JSON_Response(status_code=503, content={"error": str(e), "coverage": e.coverage},
+                                  headers={"Retry-After": "60"})
+    except ValueError as e:
+        return Fast_JSON_Response(status_code=400, content={"error": str(e)})
+
+@app.get('/screener/status')
+async def get_screener_status():
+    return screener.stats()
+
+@app.get('/scheduler/status')
+async def get_scheduler_status():
+    return {**scheduler.status(), 'enabled': SCHEDULER_ENABLED, 'universe': SCHEDULER_UNIVERSE}
+
+@app.post('/scheduler/{task}/run', status_code=202)
+async def run_scheduled_task(task: str):
+    """Make a scheduled task due now; it starts on the scheduler's next tick."""
+    if not scheduler.running:
+        return Fast_JSON_Response(status_code=409, content={"error": "Scheduler is not running"})
+    if not scheduler.trigger(task):
+        return Fast_JSON_Response(status_code=404, content={
+            "error": f"Unknown task {task!r}, expected one of {list(scheduler.tasks)}"})
+    return Fast_JSON_Response(status_code=202, content={"task": task, "status": "scheduled"})
     
     
 
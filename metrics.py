@@ -0,0 +1,230 @@
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; covers cache hits (sub-millisecond) up to slow yfinance calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value):
+    if value is None:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labels=()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """Monotonic count per label set."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()) -> None:
+        super().__init__(name, help, labels)
+        self.values = dict()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self.values.items())
+        return [f"{self.name}{_label_text(self.labels, labels)} {_number(value)}" for labels, value in values]
+
+
+class Gauge(Counter):
+    """Value per label set that goes up and down."""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative ``buckets`` per label set."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = dict()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                # per-bucket counts (last one is +Inf), then sum
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self.series.items()]
+        names = self.labels + ('le',)
+        lines = []
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(names, labels + (_number(bound),))} {cumulative}")
+            label_text = _label_text(self.labels, labels)
+            lines.append(f"{self.name}_sum{label_text} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Callback(Metric):
+    """Value read from ``fn()`` at scrape time, so the hot path pays nothing.
+    ``fn`` returns a number, or ``{label values tuple: number}`` when the
+    metric has labels."""
+
+    def __init__(self, name, help, fn, kind='gauge', labels=()) -> None:
+        super().__init__(name, help, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        values = self.fn()
+        if not self.labels:
+            values = {(): values}
+        return [f"{self.name}{_label_text(self.labels, labels)} {_number(value)}" for labels, value in values.items()]
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self.metrics = dict()
+        self.scrape_errors = 0
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name, help, fn, kind='gauge', labels=()):
+        return self.register(Callback(name, help, fn, kind, labels))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            try:
+                samples = metric.render()
+            except Exception:
+                # one broken source must not take the whole scrape down
+                self.scrape_errors += 1
+                continue
+            lines += metric.header() + samples
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# recorded on the hot path; gauges over existing stats() are registered in main.py
+http_requests = registry.counter(
+    'http_requests_total', 'HTTP requests by route template and status.', ('method', 'route', 'status'))
+http_request_seconds = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route template, until the response is sent.',
+    ('method', 'route'))
+http_in_flight = registry.gauge('http_requests_in_flight', 'HTTP requests being handled.')
+response_render_seconds = registry.histogram(
+    'response_render_seconds', 'Time spent JSON-encoding response bodies.')
+executor_queue_seconds = registry.histogram(
+    'executor_queue_wait_seconds', 'Time calls wait for an upstream executor worker.')
+executor_call_seconds = registry.histogram(
+    'executor_call_duration_seconds', 'Time calls hold an upstream executor worker, by function.', ('function',))
+upstream_seconds = registry.histogram(
+    'upstream_call_duration_seconds', 'yfinance call latency by dataset and outcome, including rate limiting.',
+    ('dataset', 'outcome'))
+kafka_produce_seconds = registry.histogram(
+    'kafka_produce_seconds', 'Time handing one message to the Kafka client.')
+peer_info_errors = registry.counter(
+    'peer_info_errors_total', 'Failed peer info fetches by exception type.', ('error',))
+
+
+class Metrics_Middleware:
+    """ASGI middleware recording per-route latency, status counts and the
+    number of requests in flight.
+
+    Routes are labelled by their path template (``/stocks/peers/ticker/{ticker}``),
+    looked up from the endpoint the router matched, so the label set stays
+    bounded; requests that match no route share one label.
+    """
+
+    def __init__(self, app, routes=()) -> None:
+        self.app = app
+        self.routes = routes
+        self._paths = None
+
+    def route_path(self, scope):
+        if self._paths is None:
+            # built on the first request, once every route is declared
+            self._paths = {route.endpoint: route.path for route in self.routes if hasattr(route, 'endpoint')}
+        return self._paths.get(scope.get('endpoint'), UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        started = time.perf_counter()
+
+        async def send_observed(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_observed)
+        finally:
+            http_in_flight.dec()
+            route = self.route_path(scope)
+            http_request_seconds.observe(time.perf_counter() - started, scope['method'], route)
+            http_requests.inc(scope['method'], route, status)
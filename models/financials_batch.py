@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class FinancialsBatch(BaseModel):
+    tickers: List[str]
+    datasets: Optional[List[str]] = None # defaults to every financial dataset
+    shape: str = "records" # or "columnar" for the financial statements
+    stream: bool = False # newline-delimited JSON, one line per ticker as it completes
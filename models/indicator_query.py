@@ -0,0 +1,10 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import date
+
+class IndicatorQuery(BaseModel):
+    tickers: List[str]
+    indicators: List[str] # e.g. ["sma:20", "rsi:14", "macd:12,26,9", "drawdown"]
+    start: Optional[date] = None # defaults to a year before end
+    end: Optional[date] = None # inclusive, defaults to today
+    interval: str = "1d"
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+from typing import List
+from datetime import date
+
+class Position(BaseModel):
+    ticker: str
+    date: date # purchase date, valued at that session's close
+    quantity: float = 1.0
+
+class Portfolio(BaseModel):
+    positions: List[Position]
@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+from typing import List, Optional, Union
+
+class ScreenFilter(BaseModel):
+    field: str # a metric such as marketCap or trailingPE, or sector / industry / country
+    op: str # eq, ne, lt, lte, gt, gte, in, between
+    value: Union[float, str, List[Union[float, str]]]
+
+class ScreenQuery(BaseModel):
+    filters: List[ScreenFilter] = []
+    sort: Optional[str] = "-marketCap" # metric, "-" prefix for descending
+    limit: int = 50
+    offset: int = 0
+    fields: Optional[List[str]] = None # metrics to return, defaults to the ones filtered and sorted on
@@ -1,42 +1,191 @@
 import csv
 import os
-import pandas as pd
+import time
+from array import array
+
+PEERS_DEFAULT_N = int(os.getenv("PEERS_DEFAULT_N", "5"))
+PEERS_MAX_N = 50
+PEERS_REFRESH_INTERVAL = float(os.getenv("PEERS_REFRESH_INTERVAL", str(60 * 60)))
+# ranking metric -> S&P 500 CSV column
+RANK_METRICS = {
+    'marketcap': 'Marketcap',
+    'ebitda': 'Ebitda',
+    'revenuegrowth': 'Revenuegrowth',
+    'employees': 'Fulltimeemployees',
+}
+PEER_GROUPS = ('industry', 'sector')
+
+
+def _number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return float('-inf')  # unknown values rank last
+
+
+class Peer_Rankings:
+    """Everything derived from one read of the S&P 500 CSV.
+
+    Each sector and industry keeps, per ranking metric, the row positions of
+    its members sorted best first, as compact arrays. Swapped as a single
+    reference on reload.
+    """
+
+    __slots__ = ('symbols', 'names', 'sectors', 'industries', 'metrics', 'prices', 'positions', 'rankings',
+                 'by_marketcap')
 
-class Peers_Retriever:
-    
     def __init__(self, path) -> None:
+        with open(path, mode='r', newline='', encoding='utf-8') as file:
+            rows = [row for row in csv.DictReader(file) if row.get('Symbol')]
+        self.symbols = [row['Symbol'].strip() for row in rows]
+        self.names = [row['Shortname'].strip() for row in rows]
+        self.sectors = [row['Sector'].strip() for row in rows]
+        self.industries = [row['Industry'].strip() for row in rows]
+        self.metrics = {metric: array('d', (_number(row[column]) for row in rows))
+                        for metric, column in RANK_METRICS.items()}
+        self.prices = array('d', (_number(row['Currentprice']) for row in rows))
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        caps = self.metrics['marketcap']
+        self.by_marketcap = [self.symbols[i] for i in sorted(range(len(rows)), key=lambda i: (-caps[i], i))]
+
+        members = {'industry': dict(), 'sector': dict()}
+        for i in range(len(rows)):
+            members['industry'].setdefault(self.industries[i], []).append(i)
+            members['sector'].setdefault(self.sectors[i], []).append(i)
+        self.rankings = {
+            group: {
+                name: {metric: array('I', sorted(positions, key=lambda i, values=values: (-values[i], i)))
+                       for metric, values in self.metrics.items()}
+                for name, positions in groups.items()
+            }
+            for group, groups in members.items()
+        }
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+class Peers_Retriever:
+    """Ranked peer lists per sector / industry, plus a snapshot of peer
+    metrics so the peers routes never wait on an upstream call.
+
+    ``info`` maps symbol -> ``(peers_info dict, fetched_at)`` and is filled
+    in the background (update_info); symbols it does not know yet are
+    answered from the CSV, with every other one of ``info_fields`` left None.
+    """
+
+    def __init__(self, path, info_fields=(), clock=time.time) -> None:
         self.path = path
-        self.companies_by_industry = dict()
-        self.companies_by_sector = dict()
+        self.info_fields = tuple(info_fields)
+        self.clock = clock
+        self.rankings = None
+        self.info = dict()
+        self.info_updated_at = None
         self.init_company_dataframe()
-        
+
     def init_company_dataframe(self):
-        df = pd.read_csv(self.path)
-        df_filtered = df[['Sector', 'Industry', 'Symbol', 'Shortname', 'Marketcap', 'Currentprice']]
-        
-        # Group by Industry
-        industry_groups = dict(tuple(df_filtered.groupby('Industry')))
-        self.companies_by_industry = {k: v for k, v in industry_groups.items()}
-        
-        # Group by Sector
-        sector_groups = dict(tuple(df_filtered.groupby('Sector')))
-        self.companies_by_sector = {k: v for k, v in sector_groups.items()}
-    
-    def top_five_peers_by_industry(self, industry):
-        if industry not in self.companies_by_industry:
+        self.rankings = Peer_Rankings(self.path)
+
+    def reload(self):
+        self.init_company_dataframe()
+
+    @property
+    def symbols(self):
+        """Every symbol, largest market cap first."""
+        return self.rankings.by_marketcap
+
+    def top_peers(self, group, name, n=PEERS_DEFAULT_N, metric='marketcap'):
+        """Top ``n`` symbols of a sector or industry by ``metric``."""
+        if group not in PEER_GROUPS:
+            raise ValueError(f"Unknown peer group {group!r}, expected one of {list(PEER_GROUPS)}")
+        if metric not in RANK_METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {list(RANK_METRICS)}")
+        rankings = self.rankings
+        ranking = rankings.rankings[group].get(name)
+        if ranking is None:
             return []
-        return self.companies_by_industry[industry].iloc[:5]['Symbol'].unique().tolist()
-    
+        return [rankings.symbols[i] for i in ranking[metric][:n]]
+
+    def peers_of(self, ticker, group='industry', n=PEERS_DEFAULT_N, metric='marketcap'):
+        """``(group name, top n other members)`` for ``ticker``'s sector or
+        industry, or None if the ticker is not in the list."""
+        rankings = self.rankings
+        i = rankings.positions.get(ticker.upper())
+        if i is None:
+            return None
+        name = rankings.industries[i] if group == 'industry' else rankings.sectors[i]
+        peers = self.top_peers(group, name, n + 1, metric)
+        return name, [symbol for symbol in peers if symbol != rankings.symbols[i]][:n]
+
+    def top_five_peers_by_industry(self, industry):
+        return self.top_peers('industry', industry)
+
     def top_five_peers_by_sector(self, sector):
-        if sector not in self.companies_by_sector:
-            return []
-        return self.companies_by_sector[sector].iloc[:5]['Symbol'].unique().tolist()
+        return self.top_peers('sector', sector)
+
+    def update_info(self, infos):
+        """Merge freshly fetched ``{symbol: peers_info dict}`` into the snapshot."""
+        now = self.clock()
+        info = dict(self.info)
+        info.update((symbol, (entry, now)) for symbol, entry in infos.items())
+        self.info, self.info_updated_at = info, now
+
+    def _fallback_info(self, symbol):
+        rankings = self.rankings
+        i = rankings.positions.get(symbol)
+        if i is None:
+            return None
+
+        def text(value):
+            if value == float('-inf'):
+                return None
+            return str(int(value)) if value.is_integer() else str(value)
+
+        entry = dict.fromkeys(self.info_fields)
+        entry.update({
+            'shortName': rankings.names[i],
+            'marketCap': text(rankings.metrics['marketcap'][i]),
+            'ebitda': text(rankings.metrics['ebitda'][i]),
+            'currentPrice': text(rankings.prices[i]),
+        })
+        return entry
+
+    def peer_info(self, symbols, max_age=PEERS_REFRESH_INTERVAL):
+        """``(results, missing, outdated)``: snapshot metrics for ``symbols``,
+        each with the ``fetched_at`` of its snapshot entry (None when answered
+        from the CSV), the symbols the snapshot lacks and those whose entry
+        is ``max_age`` seconds old or more."""
+        info = self.info
+        now = self.clock()
+        results, missing, outdated = [], [], []
+        for symbol in symbols:
+            held = info.get(symbol)
+            if held is None:
+                missing.append(symbol)
+                entry, fetched_at = self._fallback_info(symbol), None
+            else:
+                entry, fetched_at = held
+                if now - fetched_at >= max_age:
+                    outdated.append(symbol)
+            if entry is not None:
+                results.append({**entry, 'fetched_at': fetched_at})
+        return results, missing, outdated
+
+    def stats(self):
+        rankings = self.rankings
+        return {
+            'companies': len(rankings),
+            'sectors': len(rankings.rankings['sector']),
+            'industries': len(rankings.rankings['industry']),
+            'metrics': list(RANK_METRICS),
+            'info_snapshot': len(self.info),
+            'info_updated_at': self.info_updated_at,
+            'info_oldest': min((fetched_at for _, fetched_at in self.info.values()), default=None),
+        }
+
 
-        
 
-        
-        
 # sp_path = os.path.join(os.path.dirname(__file__), r"data\sp500_companies.csv")
 # peers = Peers_Retriever(sp_path)
 # print(peers.topFivePeers('Semiconductors'))
-# Semiconductors
\ No newline at end of file
+# Semiconductors
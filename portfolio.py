@@ -0,0 +1,58 @@
+import os
+
+PORTFOLIO_MAX_POSITIONS = int(os.getenv("PORTFOLIO_MAX_POSITIONS", "500"))
+
+
+def _pct(change, base):
+    return round(change / base * 100, 2) if base else None
+
+
+def value_positions(positions, closes, prices):
+    """P&L per position and for the whole portfolio.
+
+    ``closes`` maps ``(TICKER, date)`` to the purchase-day close and
+    ``prices`` maps ``TICKER`` to the current price, as returned by
+    Data_Retriever.get_closes / get_last_prices. Positions missing either
+    price are reported with an ``error`` and left out of the totals.
+    """
+    rows = []
+    cost_total = value_total = 0.0
+    for position in positions:
+        ticker = position.ticker.upper()
+        purchase_price = closes.get((ticker, position.date))
+        current_price = prices.get(ticker)
+        row = {
+            "ticker": ticker,
+            "date": position.date.isoformat(),
+            "quantity": position.quantity,
+            "purchase_price": round(purchase_price, 2) if purchase_price is not None else None,
+            "current_price": round(current_price, 2) if current_price is not None else None,
+        }
+        if purchase_price is None:
+            row["error"] = (f"No historical price data available on {position.date}. "
+                            f"It might be a weekend or market holiday.")
+        elif current_price is None:
+            row["error"] = "Market data not available. It may be a weekend or holiday."
+        else:
+            cost = purchase_price * position.quantity
+            value = current_price * position.quantity
+            row.update({
+                "cost_basis": round(cost, 2),
+                "market_value": round(value, 2),
+                "pnl": round(value - cost, 2),
+                "pnl_pct": _pct(value - cost, cost),
+            })
+            cost_total += cost
+            value_total += value
+        rows.append(row)
+    return {
+        "positions": rows,
+        "totals": {
+            "cost_basis": round(cost_total, 2),
+            "market_value": round(value_total, 2),
+            "pnl": round(value_total - cost_total, 2),
+            "pnl_pct": _pct(value_total - cost_total, cost_total),
+            "valued": sum(1 for row in rows if "error" not in row),
+            "errors": sum(1 for row in rows if "error" in row),
+        },
+    }
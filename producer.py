@@ -1,41 +1,268 @@
 from confluent_kafka import Producer
-import json
+import asyncio
 import os
+import queue
+import threading
+import time
+from responses import dumps
+from metrics import kafka_produce_seconds
 
 # Use environment variable with fallback
 KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+KAFKA_PRODUCER = os.getenv("KAFKA_PRODUCER", "kafka")  # "memory" runs without a broker
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "50"))
+KAFKA_BATCH_NUM_MESSAGES = int(os.getenv("KAFKA_BATCH_NUM_MESSAGES", "10000"))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "lz4")
+KAFKA_QUEUE_SIZE = int(os.getenv("KAFKA_QUEUE_SIZE", "10000"))
+KAFKA_ENQUEUE_TIMEOUT = float(os.getenv("KAFKA_ENQUEUE_TIMEOUT", "1.0"))
+KAFKA_FLUSH_TIMEOUT = float(os.getenv("KAFKA_FLUSH_TIMEOUT", "10"))
 
 conf = {
     'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
-    'client.id': 'fastapi-stock-producer'
+    'client.id': 'fastapi-stock-producer',
+    'linger.ms': KAFKA_LINGER_MS,
+    'batch.num.messages': KAFKA_BATCH_NUM_MESSAGES,
+    'compression.type': KAFKA_COMPRESSION,
 }
 
-producer = Producer(conf)
+_STOP = object()
 
-def delivery_report(err, msg):
-    if err:
-        print(f"Delivery failed for {msg.key()}: {err}")
-    else:
-        print(f"Message delivered to {msg.topic()} [{msg.partition()}] at offset {msg.offset()}")
 
-def send_updated_stock_to_kafka(topic: str, data):
-    try:
-        # Convert data to JSON string if it's not already
-        if isinstance(data, dict):
-            message = json.dumps(data)
-        elif isinstance(data, str):
-            message = data
+class Producer_Queue_Full(Exception):
+    """Raised when the outgoing queue stays full for the whole enqueue timeout."""
+
+
+class Memory_Message:
+
+    def __init__(self, topic, key, value, partition, offset) -> None:
+        self._topic, self._key, self._value = topic, key, value
+        self._partition, self._offset = partition, offset
+
+    def topic(self):
+        return self._topic
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def error(self):
+        return None
+
+
+class Memory_Producer:
+    """In-process stand-in for confluent_kafka.Producer (produce/poll/flush).
+
+    Messages are 'delivered' on the next poll or flush and kept in
+    ``messages``. ``fail`` may be a callable ``(topic, key, value) -> error``
+    to inject delivery failures.
+    """
+
+    def __init__(self, partitions=1, fail=None) -> None:
+        self.partitions = partitions
+        self.fail = fail
+        self.messages = []
+        self._pending = []
+        self._offsets = dict()
+        self._lock = threading.Lock()
+
+    def produce(self, topic, value=None, key=None, on_delivery=None, callback=None):
+        with self._lock:
+            self._pending.append((topic, key, value, on_delivery or callback))
+
+    def poll(self, timeout=0):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for topic, key, value, report in pending:
+            error = self.fail(topic, key, value) if self.fail else None
+            partition = hash(key) % self.partitions if key is not None else 0
+            offset = -1
+            if error is None:
+                offset = self._offsets.get((topic, partition), 0)
+                self._offsets[(topic, partition)] = offset + 1
+            message = Memory_Message(topic, key, value, partition, offset)
+            if error is None:
+                self.messages.append(message)
+            if report is not None:
+                report(error, message)
+        return len(pending)
+
+    def flush(self, timeout=None):
+        self.poll()
+        return 0
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def create_producer():
+    if KAFKA_PRODUCER == "memory":
+        return Memory_Producer()
+    return Producer(conf)
+
+
+class Kafka_Pipeline:
+    """Background producer fed by a bounded queue.
+
+    ``send`` only enqueues; a single delivery thread hands messages to the
+    client, which batches and compresses them (linger.ms / batch.num.messages
+    / compression.type). A full queue pushes back on callers instead of
+    growing without bound. Messages are keyed (by ticker) so one ticker's
+    updates stay ordered on one partition. The client is flushed once, on
+    shutdown, not per message. ``on_delivery(error)`` given to send or
+    publish is called from the delivery thread once the message is
+    delivered (error None) or has failed.
+    """
+
+    def __init__(self, producer_factory=create_producer, max_queue=KAFKA_QUEUE_SIZE,
+                 enqueue_timeout=KAFKA_ENQUEUE_TIMEOUT, flush_timeout=KAFKA_FLUSH_TIMEOUT) -> None:
+        self.producer_factory = producer_factory
+        self.enqueue_timeout = enqueue_timeout
+        self.flush_timeout = flush_timeout
+        self.producer = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self.enqueued = 0
+        self.rejected = 0
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        self.bytes_enqueued = 0
+        self.undelivered_on_shutdown = 0
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.producer is None:
+            self.producer = self.producer_factory()
+        self._thread = threading.Thread(target=self._run, name="kafka-pipeline", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def encode(data):
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, str):
+            return data.encode()
+        return dumps(data)
+
+    def send(self, topic, data, key=None, timeout=None, on_delivery=None):
+        """Enqueue ``data`` for ``topic``, waiting up to ``timeout`` seconds
+        for room. Raises Producer_Queue_Full if the queue stays full."""
+        value = self.encode(data)
+        if isinstance(key, str):
+            key = key.encode()
+        try:
+            self._queue.put((topic, key, value, on_delivery), timeout=self.enqueue_timeout if timeout is None else timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise Producer_Queue_Full(f"Kafka queue full ({self._queue.maxsize} messages)")
+        self.enqueued += 1
+        self.bytes_enqueued += len(value)
+
+    async def publish(self, topic, data, key=None, timeout=None, on_delivery=None):
+        """``send`` for coroutines: waits for queue room without blocking the loop."""
+        value = self.encode(data)
+        if isinstance(key, str):
+            key = key.encode()
+        deadline = time.monotonic() + (self.enqueue_timeout if timeout is None else timeout)
+        while True:
+            try:
+                self._queue.put_nowait((topic, key, value, on_delivery))
+                break
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    self.rejected += 1
+                    raise Producer_Queue_Full(f"Kafka queue full ({self._queue.maxsize} messages)")
+                await asyncio.sleep(0.01)
+        self.enqueued += 1
+        self.bytes_enqueued += len(value)
+
+    def _run(self):
+        producer = self.producer
+        while True:
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                producer.poll(0)  # serve delivery callbacks while idle
+                continue
+            if item is _STOP:
+                break
+            topic, key, value, on_delivery = item
+            report = self._delivery_report
+            if on_delivery is not None:
+                report = lambda err, msg, on_delivery=on_delivery: self._delivery_report(err, msg, on_delivery)
+            while True:
+                started = time.perf_counter()
+                try:
+                    producer.produce(topic=topic, value=value, key=key, on_delivery=report)
+                    kafka_produce_seconds.observe(time.perf_counter() - started)
+                    self.produced += 1
+                    break
+                except BufferError:
+                    # client-side queue is full: let librdkafka drain, then retry
+                    producer.poll(0.1)
+                except Exception as e:
+                    self.failed += 1
+                    self.last_error = f"{topic}/{key}: {e}"
+                    self._notify(on_delivery, e)
+                    break
+            producer.poll(0)
+
+    def _delivery_report(self, err, msg, on_delivery=None):
+        if err:
+            self.failed += 1
+            self.last_error = f"{msg.topic()}/{msg.key()}: {err}"
         else:
-            message = json.dumps(data)
-        
-        producer.produce(
-            topic=topic,
-            value=message,
-            callback=delivery_report
-        )
-        producer.poll(0)  # Trigger delivery report callbacks
-        
-    except Exception as e:
-        print(f"Failed to send message to Kafka: {e}")
-    finally:
-        producer.flush()  # Ensure all messages are sent
\ No newline at end of file
+            self.delivered += 1
+        self._notify(on_delivery, err or None)
+
+    def _notify(self, on_delivery, error):
+        if on_delivery is None:
+            return
+        try:
+            on_delivery(error)
+        except Exception as e:
+            self.last_error = f"on_delivery: {e}"
+
+
+    def shutdown(self, timeout=None):
+        """Stop the delivery thread once the queue is drained, then flush."""
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join()
+        self.undelivered_on_shutdown = self.producer.flush(self.flush_timeout if timeout is None else timeout)
+
+    def stats(self):
+        return {
+            'running': self._thread is not None,
+            'queued': self._queue.qsize(),
+            'max_queue': self._queue.maxsize,
+            'enqueued': self.enqueued,
+            'rejected': self.rejected,
+            'produced': self.produced,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'bytes_enqueued': self.bytes_enqueued,
+            'in_client': len(self.producer) if self.producer is not None else 0,
+            'undelivered_on_shutdown': self.undelivered_on_shutdown,
+            'last_error': self.last_error,
+        }
+
+
+pipeline = Kafka_Pipeline()
+
+
+def send_updated_stock_to_kafka(topic: str, data):
+    key = data.get('ticker') if isinstance(data, dict) else None
+    pipeline.send(topic, data, key=key)
@@ -0,0 +1,34 @@
+from functools import lru_cache
+from graphqlQuery.companyOverview import CompanyOverview
+
+# every key a company overview projection may ask for
+OVERVIEW_FIELDS = frozenset(CompanyOverview.__annotations__)
+PROJECTION_CACHE_SIZE = 256
+
+
+class Projection:
+    """A validated, ordered field set. Calling it on an info dict returns
+    just those keys, None where the dict lacks one."""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields) -> None:
+        self.fields = fields
+
+    def __call__(self, info):
+        get = info.get
+        return {field: get(field) for field in self.fields}
+
+
+@lru_cache(maxsize=PROJECTION_CACHE_SIZE)
+def projection(raw, catalog=OVERVIEW_FIELDS):
+    """``"shortName,marketCap"`` -> Projection, parsed and checked against
+    ``catalog`` once per distinct string."""
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    if not fields:
+        raise ValueError("fields is empty")
+    unknown = [field for field in fields if field not in catalog]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}" + (f", expected any of {sorted(catalog)}"
+                                                       if len(catalog) <= 50 else ""))
+    return Projection(fields)
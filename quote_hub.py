@@ -0,0 +1,214 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+
+QUOTE_STREAM_INTERVAL = float(os.getenv("QUOTE_STREAM_INTERVAL", "15"))
+QUOTE_STREAM_BATCH_SIZE = int(os.getenv("QUOTE_STREAM_BATCH_SIZE", "50"))
+QUOTE_STREAM_MAX_TICKERS = int(os.getenv("QUOTE_STREAM_MAX_TICKERS", "50"))
+QUOTE_STREAM_HEARTBEAT = float(os.getenv("QUOTE_STREAM_HEARTBEAT", "15"))
+
+_TICKER = re.compile(r"[A-Z0-9.\-^=]{1,20}")
+
+
+def frame_tick(ticker, frame):
+    """Latest bar of a get_quotes frame -> tick dict, None if it has no close."""
+    frame = frame.dropna(subset=['Close'])
+    if frame.empty:
+        return None
+    row = frame.iloc[-1]
+    tick = {'ticker': ticker, 'price': float(row['Close']), 'time': frame.index[-1].isoformat()}
+    for column in ('Open', 'High', 'Low', 'Volume'):
+        if column in row:
+            tick[column.lower()] = float(row[column])
+    return tick
+
+
+def parse_tickers(tickers):
+    """Upper-cased, de-duplicated symbols from a list or a comma-separated
+    string. Raises ValueError on anything else or on a malformed symbol."""
+    if isinstance(tickers, str):
+        tickers = tickers.split(',')
+    if not isinstance(tickers, (list, tuple)) or not all(isinstance(ticker, str) for ticker in tickers):
+        raise ValueError(f"Expected a list of tickers, got {tickers!r}")
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers if ticker.strip()))
+    invalid = [ticker for ticker in tickers if not _TICKER.fullmatch(ticker)]
+    if invalid:
+        raise ValueError(f"Invalid tickers {invalid}")
+    return tickers
+
+
+class Quote_Subscriber:
+    """One connection's side of the hub.
+
+    Pending ticks are kept per ticker, so the queue is bounded by the number
+    of tickers subscribed: a consumer that falls behind gets the newest tick
+    of each ticker on its next read and the older ones are dropped.
+    """
+
+    def __init__(self, max_tickers=QUOTE_STREAM_MAX_TICKERS) -> None:
+        self.max_tickers = max_tickers
+        self.tickers = set()
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.delivered = 0
+        self.dropped = 0
+
+    def offer(self, tick):
+        """Queue ``tick``. Returns True if it replaced an unsent older one."""
+        stale = self.pending.pop(tick['ticker'], None) is not None
+        if stale:
+            self.dropped += 1
+        self.pending[tick['ticker']] = tick
+        self.ready.set()
+        return stale
+
+    async def next(self):
+        """Wait for ticks and take all pending ones, oldest first."""
+        await self.ready.wait()
+        ticks = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        self.delivered += len(ticks)
+        return ticks
+
+
+class Quote_Hub:
+    """Fans quotes out from one upstream poller to every subscriber.
+
+    Tickers are reference counted across subscribers. A single poll loop
+    fetches every ticker with at least one subscriber, ``batch_size`` per
+    upstream call, every ``interval`` seconds, and stops when the last
+    subscription goes away. Tickers nobody followed before are fetched once
+    straight away, so a new subscriber does not wait a whole interval. A
+    tick is only fanned out when it differs from the previous one for that
+    ticker. ``fetch(tickers)`` is async and returns ``{TICKER: tick}``.
+    """
+
+    def __init__(self, fetch, interval=QUOTE_STREAM_INTERVAL, batch_size=QUOTE_STREAM_BATCH_SIZE,
+                 clock=time.time, sleep=asyncio.sleep) -> None:
+        self.fetch = fetch
+        self.interval = interval
+        self.batch_size = batch_size
+        self.clock = clock
+        self.sleep = sleep
+        self.refcounts = dict()
+        self.subscribers = dict()
+        self.latest = dict()
+        self.connections = 0
+        self._task = None
+        self._primes = set()
+        self.polls = 0
+        self.fetched = 0
+        self.published = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_poll_at = None
+
+    def subscribe(self, subscriber, tickers):
+        """Add ``tickers`` to a subscriber; the latest known tick of each is
+        offered right away."""
+        tickers = [ticker for ticker in parse_tickers(tickers) if ticker not in subscriber.tickers]
+        if len(subscriber.tickers) + len(tickers) > subscriber.max_tickers:
+            raise ValueError(f"At most {subscriber.max_tickers} tickers per connection")
+        if not subscriber.tickers and tickers:
+            self.connections += 1
+        unpolled = []
+        for ticker in tickers:
+            subscriber.tickers.add(ticker)
+            self.refcounts[ticker] = self.refcounts.get(ticker, 0) + 1
+            self.subscribers.setdefault(ticker, set()).add(subscriber)
+            if ticker in self.latest:
+                subscriber.offer(self.latest[ticker])
+            elif self.refcounts[ticker] == 1:
+                unpolled.append(ticker)
+        if self._task is None:
+            if self.refcounts:
+                self._task = asyncio.create_task(self._run())
+        elif unpolled:
+            prime = asyncio.create_task(self._guarded(self._fetch(unpolled)))
+            self._primes.add(prime)
+            prime.add_done_callback(self._primes.discard)
+        return tickers
+
+    def unsubscribe(self, subscriber, tickers=None):
+        """Remove ``tickers`` (all of them by default); tickers nobody follows
+        any more are no longer polled; the poller stops with the last one."""
+        tickers = list(subscriber.tickers) if tickers is None else parse_tickers(tickers)
+        tickers = [ticker for ticker in tickers if ticker in subscriber.tickers]
+        for ticker in tickers:
+            subscriber.tickers.discard(ticker)
+            subscriber.pending.pop(ticker, None)
+            self.subscribers[ticker].discard(subscriber)
+            self.refcounts[ticker] -= 1
+            if not self.refcounts[ticker]:
+                del self.refcounts[ticker], self.subscribers[ticker]
+                self.latest.pop(ticker, None)
+        if tickers and not subscriber.tickers:
+            self.connections -= 1
+        if not self.refcounts and self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+
+    def publish(self, tick):
+        ticker = tick['ticker']
+        previous = self.latest.get(ticker)
+        if ticker not in self.refcounts or tick == previous:
+            return
+        self.latest[ticker] = tick
+        for subscriber in self.subscribers[ticker]:
+            if subscriber.offer(tick):
+                self.dropped += 1
+        self.published += 1
+
+    async def _fetch(self, tickers):
+        for start in range(0, len(tickers), self.batch_size):
+            ticks = await self.fetch(tickers[start:start + self.batch_size])
+            self.fetched += len(ticks)
+            for tick in ticks.values():
+                self.publish(tick)
+
+    async def poll(self):
+        await self._fetch(list(self.refcounts))
+        self.polls += 1
+        self.last_poll_at = self.clock()
+
+    async def _guarded(self, call):
+        try:
+            await call
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e) or type(e).__name__
+
+    async def _run(self):
+        try:
+            while self.refcounts:
+                await self._guarded(self.poll())
+                await self.sleep(self.interval)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+    async def stop(self):
+        tasks = [task for task in (self._task, *self._primes) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self):
+        return {
+            'connections': self.connections,
+            'tickers': len(self.refcounts),
+            'subscriptions': sum(self.refcounts.values()),
+            'polling': self._task is not None,
+            'interval': self.interval,
+            'polls': self.polls,
+            'fetched': self.fetched,
+            'published': self.published,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'last_poll_at': self.last_poll_at,
+        }
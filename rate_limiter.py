@@ -0,0 +1,178 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from yfinance.exceptions import YFRateLimitError
+
+UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "8"))  # calls per second
+UPSTREAM_BURST = int(os.getenv("UPSTREAM_BURST", "16"))
+UPSTREAM_MIN_CONCURRENCY = int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1"))
+UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+UPSTREAM_LATENCY_TARGET = float(os.getenv("UPSTREAM_LATENCY_TARGET", "5"))
+UPSTREAM_LIMIT_WAIT = float(os.getenv("UPSTREAM_LIMIT_WAIT", "10"))
+UPSTREAM_BACKGROUND_SHARE = float(os.getenv("UPSTREAM_BACKGROUND_SHARE", "0.5"))
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+# Priority of the upstream calls made by the current task. Scheduled
+# refreshes and jobs set BACKGROUND; Upstream_Executor.run carries it over
+# to the worker thread.
+upstream_priority = contextvars.ContextVar('upstream_priority', default=INTERACTIVE)
+
+
+class Upstream_Rate_Limited(Exception):
+    """Raised when a call could not be admitted within the limiter's max wait."""
+
+
+def is_throttle(error):
+    return isinstance(error, YFRateLimitError) or 'Too Many Requests' in str(error)
+
+
+class Upstream_Limiter:
+    """Admission control for blocking upstream calls, used from worker threads.
+
+    A call needs a token from a bucket refilled at ``rate`` per second (up
+    to ``burst``) and a free slot under the concurrency ``limit``. The limit
+    adapts AIMD-style: each call that finishes in time raises it by
+    1/limit (about +1 per limit's worth of calls); a throttling error or a
+    call slower than ``latency_target`` halves it and a throttle also
+    empties the bucket. Calls admitted before the last decrease do not
+    decrease it again, so one burst of failures halves it once. Waiting
+    interactive calls are always admitted before background ones, and
+    background calls only ever use ``background_share`` of the limit.
+    """
+
+    def __init__(self, rate=UPSTREAM_RATE, burst=UPSTREAM_BURST, min_limit=UPSTREAM_MIN_CONCURRENCY,
+                 max_limit=UPSTREAM_MAX_CONCURRENCY, latency_target=UPSTREAM_LATENCY_TARGET,
+                 max_wait=UPSTREAM_LIMIT_WAIT, background_share=UPSTREAM_BACKGROUND_SHARE,
+                 clock=time.monotonic) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.max_wait = max_wait
+        self.background_share = background_share
+        self.clock = clock
+        self.limit = float(max_limit)
+        self.tokens = float(burst)
+        self.inflight = 0
+        self._refilled_at = clock()
+        self._decreased_at = None
+        self._waiting = {priority: deque() for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self.admitted = dict.fromkeys(PRIORITIES, 0)
+        self.rejected = dict.fromkeys(PRIORITIES, 0)
+        self.throttled = 0
+        self.slow = 0
+        self.decreases = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _next(self):
+        for priority in PRIORITIES:
+            if self._waiting[priority]:
+                return priority, self._waiting[priority][0]
+        return None, None
+
+    def _slots(self, priority):
+        limit = int(self.limit)
+        if priority == BACKGROUND:
+            limit = max(1, int(limit * self.background_share))
+        return limit
+
+    def acquire(self, priority=None):
+        """Wait for admission. Raises Upstream_Rate_Limited after ``max_wait``."""
+        priority = priority or upstream_priority.get()
+        waiter = object()
+        with self._cond:
+            self._waiting[priority].append(waiter)
+            deadline = self.clock() + self.max_wait
+            try:
+                while True:
+                    now = self.clock()
+                    wait = deadline - now
+                    if self._next()[1] is waiter and self.inflight < self._slots(priority):
+                        self._refill(now)
+                        if self.tokens >= 1:
+                            self.tokens -= 1
+                            self.inflight += 1
+                            self.admitted[priority] += 1
+                            self._waiting[priority].popleft()
+                            waiter = None
+                            return
+                        wait = min(wait, (1 - self.tokens) / self.rate)
+                    if deadline <= now:
+                        self.rejected[priority] += 1
+                        raise Upstream_Rate_Limited(f"No upstream capacity within {self.max_wait}s ({priority})")
+                    self._cond.wait(wait)
+            finally:
+                if waiter is not None:
+                    self._waiting[priority].remove(waiter)
+                # the next waiter in line may be admissible now
+                self._cond.notify_all()
+
+    def release(self, started, error=None):
+        """Finish a call admitted at ``started`` and adapt the limit to how it went."""
+        with self._cond:
+            now = self.clock()
+            self.inflight -= 1
+            throttled = error is not None and is_throttle(error)
+            slow = now - started > self.latency_target
+            if throttled or slow:
+                self.throttled += throttled
+                self.slow += slow
+                if throttled:
+                    self.tokens = 0.0
+                if self._decreased_at is None or started >= self._decreased_at:
+                    self.limit = max(float(self.min_limit), self.limit / 2)
+                    self._decreased_at = now
+                    self.decreases += 1
+            elif error is None:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def call(self, fn, *args):
+        """``fn(*args)`` once admitted."""
+        self.acquire()
+        started = self.clock()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self.release(started, e)
+            raise
+        self.release(started)
+        return result
+
+    def wrap(self, fn):
+        """``fn`` with every call going through the limiter."""
+        def limited(*args):
+            return self.call(fn, *args)
+        return limited
+
+    def stats(self):
+        with self._cond:
+            self._refill(self.clock())
+            return {
+                'rate': self.rate,
+                'burst': self.burst,
+                'tokens': round(self.tokens, 2),
+                'limit': int(self.limit),
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'inflight': self.inflight,
+                'queued': {priority: len(waiting) for priority, waiting in self._waiting.items()},
+                'admitted': dict(self.admitted),
+                'rejected': dict(self.rejected),
+                'throttled': self.throttled,
+                'slow': self.slow,
+                'decreases': self.decreases,
+            }
+
+
+upstream_limiter = Upstream_Limiter()
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import time
+
+REFERENCE_POLL_INTERVAL = float(os.getenv("REFERENCE_POLL_INTERVAL", "30"))
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Watched_File:
+    """One reference file and the callable that rebuilds state from it."""
+
+    def __init__(self, name, path, reload) -> None:
+        self.name = name
+        self.path = path
+        self.reload = reload
+        self.signature = self._signature()
+        self.sha256 = file_sha256(path)
+        self.version = 1
+        self.loaded_at = time.time()
+        self.last_checked = None
+        self.last_error = None
+        self.reloads = 0
+        self.failures = 0
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def check(self):
+        """Reload if the file content changed. Returns True when it did."""
+        self.last_checked = time.time()
+        try:
+            signature = self._signature()
+            if signature == self.signature:
+                return False
+            sha256 = file_sha256(self.path)
+            if self._signature() != signature:
+                return False  # still being written, look again next poll
+            if sha256 == self.sha256:
+                # touched but not changed (or back to what is served)
+                self.signature = signature
+                self.last_error = None
+                return False
+            self.reload()
+        except Exception as e:
+            # keep serving the previous snapshot and retry on the next poll
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.failures += 1
+            return False
+        self.signature = signature
+        self.sha256 = sha256
+        self.version += 1
+        self.reloads += 1
+        self.loaded_at = time.time()
+        self.last_error = None
+        return True
+
+    def status(self):
+        return {
+            'path': self.path,
+            'version': self.version,
+            'sha256': self.sha256,
+            'loaded_at': self.loaded_at,
+            'last_checked': self.last_checked,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+class Reference_Data_Manager:
+    """Polls the listing files and rebuilds the derived state when they change.
+
+    Rebuilds happen off the event loop and are published by swapping a single
+    reference (Data_Retriever.listing, Peers_Retriever groupings), so requests
+    already running keep the snapshot they started with. ``on_reload`` runs
+    after any swap, e.g. to drop pre-encoded payloads.
+    """
+
+    def __init__(self, interval=REFERENCE_POLL_INTERVAL, on_reload=None) -> None:
+        self.interval = interval
+        self.on_reload = on_reload
+        self.files = dict()
+        self._task = None
+        self.check_errors = 0
+        self.last_check_error = None
+
+    def watch(self, name, path, reload):
+        self.files[name] = Watched_File(name, path, reload)
+
+    def check(self):
+        reloaded = [name for name, watched in self.files.items() if watched.check()]
+        if reloaded and self.on_reload is not None:
+            self.on_reload(reloaded)
+        return reloaded
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception as e:
+                # e.g. on_reload failing; the poller keeps going
+                self.check_errors += 1
+                self.last_check_error = f"{type(e).__name__}: {e}"
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self):
+        return {
+            'poll_interval': self.interval,
+            'check_errors': self.check_errors,
+            'last_check_error': self.last_check_error,
+            'files': {name: watched.status() for name, watched in self.files.items()},
+        }
@@ -0,0 +1,116 @@
+import datetime
+import decimal
+import threading
+import time
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse, Response
+from cache import Freshness, response_freshness
+from metrics import response_render_seconds
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def json_default(obj):
+    """Fallback for the types orjson does not handle natively."""
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict(orient='records')
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=json_default, option=ORJSON_OPTIONS)
+
+
+class Fast_JSON_Response(JSONResponse):
+    """JSONResponse rendered with orjson; NaN/inf become null and numpy,
+    pandas and datetime values are serialized directly."""
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        body = dumps(content)
+        response_render_seconds.observe(time.perf_counter() - started)
+        return body
+
+
+class Encoded_JSON_Response(Response):
+    """Response for a body that is already JSON-encoded bytes."""
+
+    media_type = "application/json"
+
+
+class Payload_Cache:
+    """Encoded bodies of static payloads (ticker list, /stocks pages), built
+    once and reused until clear() is called after the data changes."""
+
+    def __init__(self) -> None:
+        self._payloads = dict()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, key, build) -> bytes:
+        body = self._payloads.get(key)
+        if body is None:
+            body = dumps(build())
+            with self._lock:
+                self._payloads[key] = body
+                self.builds += 1
+        return body
+
+    def response(self, key, build):
+        return Encoded_JSON_Response(self.get(key, build))
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+    def stats(self):
+        return {
+            'payloads': len(self._payloads),
+            'bytes': sum(len(body) for body in self._payloads.values()),
+            'builds': self.builds,
+        }
+
+
+class Freshness_Middleware:
+    """ASGI middleware giving each HTTP request a Freshness. A response for
+    which stale cached data was served gets ``X-Data-Source: stale`` and
+    ``X-Data-Age`` (seconds, of the oldest stale value)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        freshness = Freshness()
+        token = response_freshness.set(freshness)
+
+        async def send_marked(message):
+            if message['type'] == 'http.response.start' and freshness.stale_age is not None:
+                headers = [(name, value) for name, value in message.get('headers', ())
+                           if name.lower() not in (b'x-data-source', b'x-data-age')]
+                headers += [(b'x-data-source', b'stale'), (b'x-data-age', b'%.0f' % freshness.stale_age)]
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_marked)
+        finally:
+            response_freshness.reset(token)
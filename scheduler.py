@@ -0,0 +1,181 @@
+import asyncio
+import os
+import random
+import time
+from rate_limiter import upstream_priority, BACKGROUND
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "false").lower() in ("1", "true", "yes")
+SCHEDULER_UNIVERSE = os.getenv("SCHEDULER_UNIVERSE", "top:100")  # top:N, sp500, all or AAPL,MSFT,...
+SCHEDULER_QUOTE_INTERVAL = float(os.getenv("SCHEDULER_QUOTE_INTERVAL", "60"))
+SCHEDULER_FUNDAMENTALS_INTERVAL = float(os.getenv("SCHEDULER_FUNDAMENTALS_INTERVAL", str(6 * 60 * 60)))
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "50"))
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "4"))
+SCHEDULER_PUBLISH = os.getenv("SCHEDULER_PUBLISH", "false").lower() in ("1", "true", "yes")
+SCHEDULER_MAX_BACKOFF = int(os.getenv("SCHEDULER_MAX_BACKOFF", "8"))
+
+
+def scheduled_tickers(spec, retriever, peers):
+    """Resolve a SCHEDULER_UNIVERSE spec against the current listings."""
+    if spec == 'all':
+        return list(retriever.ticker_dict.symbols)
+    if spec == 'sp500':
+        return list(peers.symbols)
+    if spec.startswith('top:'):
+        universe = retriever.universe
+        return [universe.symbols[i] for i in universe.select(sort='-market_cap')[:int(spec[4:])]]
+    return list(dict.fromkeys(ticker.strip().upper() for ticker in spec.split(',') if ticker.strip()))
+
+
+class Scheduled_Task:
+
+    def __init__(self, name, interval, run) -> None:
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.next_run = None
+        self.running = None
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.deferrals = 0
+        self.last_started = None
+        self.last_finished = None
+        self.last_duration = None
+        self.last_result = None
+        self.last_error = None
+
+    def status(self, now):
+        return {
+            'interval': self.interval,
+            'running': self.running is not None,
+            'next_run': self.next_run,
+            'next_run_in': round(self.next_run - now, 3) if self.next_run is not None else None,
+            'runs': self.runs,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'deferrals': self.deferrals,
+            'last_started': self.last_started,
+            'last_finished': self.last_finished,
+            'last_duration': self.last_duration,
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
+
+
+class Refresh_Scheduler:
+    """Runs refresh tasks on fixed intervals from inside the event loop.
+
+    The next run is scheduled from the end of the previous one, spread by
+    +/- ``jitter`` of the interval so replicas and tasks do not line up.
+    After a failure (e.g. yfinance rate limiting) the interval is doubled
+    per consecutive failure, up to ``max_backoff`` times. While ``busy()`` is
+    true, i.e. user requests are waiting for upstream workers, due tasks are
+    held back and running ones pause in wait_for_capacity().
+
+    ``clock``, ``sleep`` and ``rand`` can be replaced to drive it with a fake
+    clock: call run_due() and await the tasks it started.
+    """
+
+    def __init__(self, busy=None, jitter=SCHEDULER_JITTER, max_backoff=SCHEDULER_MAX_BACKOFF, poll=1.0,
+                 clock=time.time, sleep=asyncio.sleep, rand=random.random) -> None:
+        self.busy = busy
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.poll = poll
+        self.clock = clock
+        self.sleep = sleep
+        self.rand = rand
+        self.tasks = dict()
+        self.capacity_waits = 0
+        self._loop_task = None
+
+    def add(self, name, interval, run):
+        """Schedule the coroutine function ``run``. The first run is spread
+        over the first ``jitter`` fraction of the interval."""
+        task = Scheduled_Task(name, interval, run)
+        task.next_run = self.clock() + interval * self.jitter * self.rand()
+        self.tasks[name] = task
+        return task
+
+    def _delay(self, task):
+        backoff = min(2 ** task.consecutive_failures, self.max_backoff)
+        return task.interval * backoff * (1 + self.jitter * (2 * self.rand() - 1))
+
+    @property
+    def running(self):
+        return self._loop_task is not None
+
+    def trigger(self, name):
+        """Make ``name`` due now. Returns False for an unknown task."""
+        task = self.tasks.get(name)
+        if task is None:
+            return False
+        task.next_run = self.clock()
+        return True
+
+    def run_due(self):
+        """Start every due task that is not already running."""
+        now = self.clock()
+        due = [task for task in self.tasks.values()
+               if task.running is None and task.next_run is not None and task.next_run <= now]
+        if due and self.busy is not None and self.busy():
+            for task in due:
+                task.deferrals += 1
+            return []
+        for task in due:
+            task.running = asyncio.create_task(self._execute(task))
+        return due
+
+    async def _execute(self, task):
+        upstream_priority.set(BACKGROUND)
+        task.last_started = self.clock()
+        try:
+            task.last_result = await task.run()
+            task.consecutive_failures = 0
+            task.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            task.failures += 1
+            task.consecutive_failures += 1
+            task.last_error = f"{type(e).__name__}: {e}"
+        finally:
+            task.runs += 1
+            task.last_finished = self.clock()
+            task.last_duration = round(task.last_finished - task.last_started, 3)
+            task.next_run = task.last_finished + self._delay(task)
+            task.running = None
+
+    async def wait_for_capacity(self):
+        """Called by tasks between upstream calls to yield to user traffic."""
+        while self.busy is not None and self.busy():
+            self.capacity_waits += 1
+            await self.sleep(self.poll)
+
+    async def _run(self):
+        while True:
+            self.run_due()
+            await self.sleep(self.poll)
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [task.running for task in self.tasks.values() if task.running is not None]
+        if self._loop_task is not None:
+            tasks.append(self._loop_task)
+            self._loop_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def status(self):
+        now = self.clock()
+        return {
+            'running': self.running,
+            'busy': bool(self.busy()) if self.busy is not None else False,
+            'capacity_waits': self.capacity_waits,
+            'tasks': {name: task.status(now) for name, task in self.tasks.items()},
+        }
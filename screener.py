@@ -0,0 +1,239 @@
+import os
+import threading
+import time
+import numpy as np
+
+SCREENER_ENABLED = os.getenv("SCREENER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCREENER_UNIVERSE = os.getenv("SCREENER_UNIVERSE", "all")
+SCREENER_INTERVAL = float(os.getenv("SCREENER_INTERVAL", str(24 * 60 * 60)))
+SCREEN_MAX_LIMIT = 500
+
+# numeric CompanyOverview fields kept for every ticker of the universe
+SCREEN_METRICS = (
+    'marketCap', 'enterpriseValue', 'currentPrice', 'trailingPE', 'forwardPE', 'priceToBook',
+    'priceToSalesTrailing12Months', 'enterpriseToEbitda', 'trailingPegRatio', 'beta', 'profitMargins',
+    'grossMargins', 'operatingMargins', 'ebitdaMargins', 'returnOnEquity', 'returnOnAssets', 'revenueGrowth',
+    'earningsGrowth', 'debtToEquity', 'currentRatio', 'quickRatio', 'totalRevenue', 'freeCashflow',
+    'fiveYearAvgDividendYield', 'averageVolume', 'fiftyTwoWeekLow', 'fiftyTwoWeekHigh',
+)
+SCREEN_CATEGORIES = ('sector', 'industry', 'country')
+SCREEN_OPS = ('eq', 'ne', 'lt', 'lte', 'gt', 'gte', 'in', 'between')
+
+_COMPARE = {'lt': np.less, 'lte': np.less_equal, 'gt': np.greater, 'gte': np.greater_equal}
+
+
+class Screen_Not_Ready(Exception):
+    """Raised for a screen on overview metrics before any have been loaded."""
+
+    def __init__(self, fields, coverage) -> None:
+        super().__init__(f"Screener metrics {fields} are still loading, retry later")
+        self.fields = fields
+        self.coverage = coverage
+
+
+def _number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return number if np.isfinite(number) else np.nan
+
+
+class Screen_Snapshot:
+    """One immutable set of metric columns aligned with a listing's rows."""
+
+    __slots__ = ('listing', 'metrics', 'categories', 'tables', 'as_of', 'built_at', 'covered')
+
+    def __init__(self, listing, metrics, as_of, built_at) -> None:
+        store = listing.store
+        self.listing = listing
+        self.metrics = metrics
+        self.as_of = as_of
+        self.built_at = built_at
+        # rows with overview metrics; the rest only know their listed market cap
+        self.covered = int(np.count_nonzero(~np.isnan(as_of)))
+        self.categories = {
+            'sector': np.asarray(store.sector_codes, dtype=np.uint32),
+            'industry': np.asarray(store.industry_codes, dtype=np.uint32),
+            'country': np.asarray(store.country_codes, dtype=np.uint32),
+        }
+        self.tables = {
+            'sector': {name: code for code, name in enumerate(store.sectors)},
+            'industry': {name: code for code, name in enumerate(store.industries)},
+            'country': {name: code for code, name in enumerate(store.countries)},
+        }
+
+
+class Screener:
+    """Cross-sectional screen over the whole listing.
+
+    Metrics live in one float64 column per field, NaN where unknown, so a
+    query is a handful of vectorized masks plus a sort of the matches.
+    Market cap starts out from the listing CSV; update() overlays metrics
+    from company overviews as the background refresh fetches them. Every
+    update builds new columns and swaps the snapshot reference, so queries
+    never see a half-applied batch.
+    """
+
+    def __init__(self, retriever, clock=time.time) -> None:
+        self.retriever = retriever
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.snapshot = self._rebase(retriever.listing, None)
+        self.rows_updated = 0
+        self.queries = 0
+
+    def _rebase(self, listing, previous):
+        """Empty columns for ``listing``, carrying over rows known to ``previous``."""
+        store = listing.store
+        size = len(store)
+        metrics = {field: np.full(size, np.nan) for field in SCREEN_METRICS}
+        caps = np.asarray(store.market_caps, dtype=np.float64) * 1e9
+        metrics['marketCap'] = np.where(caps > 0, caps, np.nan)
+        as_of = np.full(size, np.nan)
+        if previous is not None:
+            old_symbols = previous.listing.store.symbols
+            for old in np.flatnonzero(~np.isnan(previous.as_of)):
+                i = store.position(old_symbols[old])
+                if i is not None:
+                    for field, column in metrics.items():
+                        column[i] = previous.metrics[field][old]
+                    as_of[i] = previous.as_of[old]
+        return Screen_Snapshot(listing, metrics, as_of, self.clock())
+
+    def current(self):
+        snapshot = self.snapshot
+        if snapshot.listing is not self.retriever.listing:
+            with self._lock:
+                if self.snapshot.listing is not self.retriever.listing:
+                    self.snapshot = self._rebase(self.retriever.listing, self.snapshot)
+                snapshot = self.snapshot
+        return snapshot
+
+    def update(self, overviews):
+        """Apply ``{symbol: company overview}`` and publish a new snapshot."""
+        with self._lock:
+            previous = self.snapshot
+            if previous.listing is not self.retriever.listing:
+                previous = self._rebase(self.retriever.listing, previous)
+            store = previous.listing.store
+            metrics = {field: column.copy() for field, column in previous.metrics.items()}
+            as_of = previous.as_of.copy()
+            now = self.clock()
+            for symbol, info in overviews.items():
+                i = store.position(symbol)
+                if i is None or not info:
+                    continue
+                for field, column in metrics.items():
+                    value = _number(info.get(field))
+                    if not np.isnan(value) or field != 'marketCap':
+                        column[i] = value
+                as_of[i] = now
+                self.rows_updated += 1
+            self.snapshot = Screen_Snapshot(previous.listing, metrics, as_of, now)
+
+    def _mask(self, snapshot, condition):
+        field, op, value = condition['field'], condition['op'], condition['value']
+        if op not in SCREEN_OPS:
+            raise ValueError(f"Unknown op {op!r}, expected one of {list(SCREEN_OPS)}")
+        if field in SCREEN_CATEGORIES:
+            codes, table = snapshot.categories[field], snapshot.tables[field]
+            if op in ('eq', 'ne'):
+                if not isinstance(value, str):
+                    raise ValueError(f"{field} {op} needs a name, got {value!r}")
+                mask = codes == table.get(value, -1)
+                return mask if op == 'eq' else ~mask
+            if op == 'in':
+                if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+                    raise ValueError(f"{field} in needs a list of names, got {value!r}")
+                return np.isin(codes, [table[name] for name in value if name in table])
+            raise ValueError(f"{field} supports eq, ne and in (with a list)")
+        column = snapshot.metrics.get(field)
+        if column is None:
+            raise ValueError(f"Unknown field {field!r}, expected one of {list(SCREEN_CATEGORIES + SCREEN_METRICS)}")
+        if op == 'in':
+            if not isinstance(value, list):
+                raise ValueError(f"{field} in needs a list")
+            return np.isin(column, [_number(item) for item in value])
+        if op == 'between':
+            if not isinstance(value, list) or len(value) != 2:
+                raise ValueError(f"{field} between needs [low, high]")
+            low, high = (_number(item) for item in value)
+            return (column >= low) & (column <= high)
+        number = _number(value)
+        if np.isnan(number):
+            raise ValueError(f"{field} {op} needs a number, got {value!r}")
+        if op == 'eq':
+            return column == number
+        if op == 'ne':
+            return column != number
+        return _COMPARE[op](column, number)
+
+    def screen(self, conditions, sort='-marketCap', limit=50, offset=0, fields=None):
+        """Rows matching every condition (``{"field", "op", "value"}``), sorted
+        by a metric (``-`` prefix for descending, unknown values last).
+
+        ``coverage`` in the result tells how many rows have overview metrics
+        yet. Filtering or sorting on one before any row has them raises
+        Screen_Not_Ready instead of returning an empty match."""
+        snapshot = self.current()
+        store = snapshot.listing.store
+        coverage = {'covered': snapshot.covered, 'rows': len(store)}
+        if not snapshot.covered:
+            fields_used = [condition['field'] for condition in conditions] + [(sort or '').lstrip('-')]
+            needed = [field for field in fields_used if field in SCREEN_METRICS and field != 'marketCap']
+            if needed:
+                raise Screen_Not_Ready(list(dict.fromkeys(needed)), coverage)
+        mask = np.ones(len(store), dtype=bool)
+        for condition in conditions:
+            mask &= self._mask(snapshot, condition)
+        matches = np.flatnonzero(mask)
+
+        if sort:
+            descending = sort.startswith('-')
+            column = snapshot.metrics.get(sort.lstrip('-'))
+            if column is None:
+                raise ValueError(f"Unknown sort field {sort!r}, expected one of {list(SCREEN_METRICS)}")
+            values = column[matches]
+            order = np.lexsort((-values if descending else values, np.isnan(values)))
+            matches = matches[order]
+
+        if fields is None:
+            fields = ['marketCap'] + [condition['field'] for condition in conditions
+                                      if condition['field'] in SCREEN_METRICS]
+            if sort:
+                fields.append(sort.lstrip('-'))
+        unknown = [field for field in fields if field not in SCREEN_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown fields {unknown}, expected any of {list(SCREEN_METRICS)}")
+        fields = list(dict.fromkeys(fields))
+
+        page = matches[offset:offset + min(max(limit, 1), SCREEN_MAX_LIMIT)]
+        items = []
+        for i in page.tolist():
+            name, sector, industry, country, _ = store.row(i)
+            item = {'symbol': store.symbols[i], 'name': name, 'sector': sector, 'industry': industry,
+                    'country': country}
+            for field in fields:
+                value = snapshot.metrics[field][i]
+                item[field] = None if np.isnan(value) else float(value)
+            as_of = snapshot.as_of[i]
+            item['as_of'] = None if np.isnan(as_of) else float(as_of)
+            items.append(item)
+        self.queries += 1
+        return {'total': int(len(matches)), 'offset': offset, 'items': items, 'snapshot_at': snapshot.built_at,
+                'coverage': coverage}
+
+    def stats(self):
+        snapshot = self.snapshot
+        covered = ~np.isnan(snapshot.as_of)
+        return {
+            'rows': len(snapshot.as_of),
+            'covered': snapshot.covered,
+            'oldest': float(snapshot.as_of[covered].min()) if covered.any() else None,
+            'built_at': snapshot.built_at,
+            'listing_version': snapshot.listing.version,
+            'rows_updated': self.rows_updated,
+            'queries': self.queries,
+            'metrics': list(SCREEN_METRICS),
+        }
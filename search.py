@@ -0,0 +1,126 @@
+import re
+from bisect import bisect_left
+from array import array
+from heapq import nsmallest
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Corporate boilerplate that would otherwise match half the listing
+STOP_WORDS = frozenset({
+    'inc', 'corp', 'corporation', 'co', 'company', 'ltd', 'plc', 'llc', 'sa', 'nv', 'ag', 'the',
+    'common', 'stock', 'shares', 'class', 'a', 'b', 'c', 'ordinary', 'holdings', 'holding',
+    'american', 'depositary', 'ads', 'new', 'york', 'registry', 'of', 'and',
+})
+
+# Lower rank is better
+EXACT_SYMBOL, SYMBOL_PREFIX, EXACT_WORD, WORD_PREFIX, FUZZY_WORD = range(5)
+
+MIN_FUZZY_LENGTH = 4
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class Ticker_Search_Index:
+    """Prefix / typo-tolerant search over symbols and company names.
+
+    Symbols and name words are kept in sorted arrays, so a prefix lookup is
+    two bisects. Typo tolerance (one edit) uses a deletion dictionary: a word
+    and a query match if they share a one-character deletion.
+    """
+
+    def __init__(self, universe) -> None:
+        self.universe = universe
+        # the store sorts symbols uppercase, and '^' or '.' land elsewhere among
+        # lowercase letters, so the lowered symbols are sorted again with their positions
+        lowered = [symbol.lower() for symbol in universe.symbols]
+        self.symbol_positions = array('I', sorted(range(len(lowered)), key=lowered.__getitem__))
+        self.symbols = [lowered[i] for i in self.symbol_positions]
+
+        words = dict()
+        for i, name in enumerate(universe.store.names):
+            for word in set(tokenize(name)):
+                words.setdefault(word, array('I')).append(i)
+        self.words = sorted(words)
+        self.postings = [words[word] for word in self.words]
+
+        self.deletions = dict()
+        for w, word in enumerate(self.words):
+            if len(word) >= MIN_FUZZY_LENGTH:
+                for deletion in _deletes(word) | {word}:
+                    self.deletions.setdefault(deletion, []).append(w)
+
+    @staticmethod
+    def _prefix_range(array, prefix):
+        start = bisect_left(array, prefix)
+        return start, bisect_left(array, prefix + "\uffff", start)
+
+    def _symbol_matches(self, query, scores):
+        start, end = self._prefix_range(self.symbols, query)
+        for s in range(start, end):
+            rank = EXACT_SYMBOL if self.symbols[s] == query else SYMBOL_PREFIX
+            i = self.symbol_positions[s]
+            scores[i] = min(scores.get(i, rank), rank)
+
+    def _word_matches(self, token, fuzzy):
+        """Best rank per position for a single query token."""
+        ranks = dict()
+        start, end = self._prefix_range(self.words, token)
+        for w in range(start, end):
+            rank = EXACT_WORD if self.words[w] == token else WORD_PREFIX
+            for i in self.postings[w]:
+                if rank < ranks.get(i, FUZZY_WORD + 1):
+                    ranks[i] = rank
+        if fuzzy and len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set()
+            for deletion in _deletes(token) | {token}:
+                candidates.update(self.deletions.get(deletion, ()))
+            for w in candidates:
+                for i in self.postings[w]:
+                    ranks.setdefault(i, FUZZY_WORD)
+        return ranks
+
+    def search(self, query, limit=10, fuzzy=True):
+        """Top ``limit`` positions for ``query`` as ``(position, rank)``,
+        best match first and larger market cap first within a rank."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        scores = dict()
+        self._symbol_matches(query.replace(' ', ''), scores)
+
+        tokens = tokenize(query)
+        if tokens:
+            # every query token has to match some word of the name
+            per_token = [self._word_matches(token, fuzzy) for token in tokens]
+            per_token.sort(key=len)
+            for i, rank in per_token[0].items():
+                worst = rank
+                for ranks in per_token[1:]:
+                    other = ranks.get(i)
+                    if other is None:
+                        break
+                    worst = max(worst, other)
+                else:
+                    if worst < scores.get(i, FUZZY_WORD + 1):
+                        scores[i] = worst
+
+        caps = self.universe.store.market_caps
+        return nsmallest(limit, scores.items(), key=lambda item: (item[1], -caps[item[0]], item[0]))
+
+    def results(self, query, limit=10, fuzzy=True):
+        store = self.universe.store
+        return [
+            {
+                "symbol": store.symbols[i],
+                "name": store.names[i],
+                "market_cap": store.market_caps[i],
+                "match": ('symbol', 'symbol-prefix', 'name', 'name-prefix', 'fuzzy')[rank],
+            }
+            for i, rank in self.search(query, limit, fuzzy)
+        ]
@@ -1,4 +1,4 @@
-import csv
+import contextvars
 import json
 import os
 import yfinance as yf
@@ -7,36 +7,250 @@ import requests
 import pandas as pd
 import requests
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from cache import MISSING, note_stale
+from metrics import upstream_seconds
+from rate_limiter import BACKGROUND, upstream_priority
+from singleflight import Single_Flight
+from universe import Ticker_Universe
+from ticker_store import load_ticker_store
+from search import Ticker_Search_Index
+
+STATEMENT_SHAPES = ('records', 'columnar')
+# yfinance Ticker attribute behind each statement dataset
+STATEMENT_ATTRIBUTES = {
+    'balance-sheet': 'balance_sheet',
+    'cashflow': 'cash_flow',
+    'income-statement': 'income_stmt',
+}
+
+
+STALE_REVALIDATE_WORKERS = int(os.getenv("STALE_REVALIDATE_WORKERS", "4"))
+
+# Set for a lookup that may only be answered from the cache: anything that
+# would go upstream raises Cache_Miss instead (see Async_Data_Retriever.call).
+cache_only = contextvars.ContextVar('cache_only', default=False)
+
+
+class Cache_Miss(Exception):
+    """Raised instead of going upstream while cache_only is set."""
+
+
+# purchase dates further apart than this are fetched with separate downloads
+CLOSE_CLUSTER_GAP_DAYS = int(os.getenv("CLOSE_CLUSTER_GAP_DAYS", "30"))
+
+
+def cluster_dates(pairs, gap_days=CLOSE_CLUSTER_GAP_DAYS):
+    """Split ``(ticker, date)`` pairs into runs whose consecutive dates are at
+    most ``gap_days`` apart, so each run is one bounded range download."""
+    clusters = []
+    for pair in sorted(pairs, key=lambda pair: pair[1]):
+        if clusters and (pair[1] - clusters[-1][-1][1]).days <= gap_days:
+            clusters[-1].append(pair)
+        else:
+            clusters.append([pair])
+    return clusters
+
+
+def normalize_statement(df: pd.DataFrame, shape='records'):
+    """Serialize a yfinance statement frame (line items x periods).
+
+    ``records`` gives one dict per period with a ``year`` key, ``columnar``
+    gives ``{"periods": [...], "fields": {item: [value per period]}}``.
+    Numbers stay numeric and missing values become None.
+    """
+    if shape not in STATEMENT_SHAPES:
+        raise ValueError(f"Unknown statement shape {shape!r}")
+    periods = pd.to_datetime(df.columns).strftime('%Y-%m-%d').tolist() if len(df.columns) else []
+    fields = df.index.tolist()
+    values = df.to_numpy(dtype=object, copy=True)
+    values[df.isna().to_numpy(dtype=bool)] = None
+    if shape == 'columnar':
+        return {'periods': periods, 'fields': dict(zip(fields, values.tolist()))}
+    fields.append('year')
+    return [dict(zip(fields, column + [period])) for column, period in zip(values.T.tolist(), periods)]
+
+
+def records_to_columnar(records):
+    """``records`` statement shape (one dict per period) -> ``columnar``."""
+    fields = dict.fromkeys(field for record in records for field in record if field != 'year')
+    return {'periods': [record['year'] for record in records],
+            'fields': {field: [record.get(field) for record in records] for field in fields}}
+
+
+class Listing:
+    """Everything derived from one read of the listing CSV. Swapped as a single
+    reference on reload, so a request holding one sees a consistent view."""
+
+    __slots__ = ('store', 'universe', 'search_index', 'version', 'loaded_at')
+
+    def __init__(self, store, universe, search_index, version, loaded_at) -> None:
+        self.store = store
+        self.universe = universe
+        self.search_index = search_index
+        self.version = version
+        self.loaded_at = loaded_at
 
 
 class Data_Retriever:
     
-    ticker_dict = None
     companies = dict()
     
-    def __init__(self, filename) -> None:
+    def __init__(self, filename, cache=None, limiter=None, breakers=None) -> None:
         self.filename = filename
+        self.cache = cache
+        self.limiter = limiter
+        self.breakers = breakers
+        self.flights = Single_Flight()
+        self._revalidator = ThreadPoolExecutor(STALE_REVALIDATE_WORKERS, thread_name_prefix="revalidate")
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+        self.stale_served = 0
+        self.revalidations = 0
+        self.revalidation_errors = 0
+        self.last_revalidation_error = None
+        self.listing = None
         self.ticker_extractor()
+
+    @property
+    def ticker_dict(self):
+        return self.listing.store
+
+    @property
+    def universe(self):
+        return self.listing.universe
+
+    @property
+    def search_index(self):
+        return self.listing.search_index
+
+    def cached(self, kind, key, fetch, refresh=False):
+        """Serve ``kind`` data for ``key`` from the cache, calling ``fetch`` (the
+        upstream yfinance call) only on a miss. Concurrent misses for the same
+        key share a single upstream call. ``refresh`` fetches and overwrites
+        the entry even if it is still fresh.
+
+        An expired entry still within the kind's max staleness is returned
+        straight away (its age noted for the response) and refreshed in the
+        background, so a slow or failing upstream does not hold the request.
+        Under cache_only that holds too; only a lookup with nothing servable
+        raises Cache_Miss."""
+        only = cache_only.get()
+        if only and (self.cache is None or refresh):
+            raise Cache_Miss(kind)
+        if self.cache is not None and not refresh:
+            # a cache-only miss is retried upstream, which counts it; peek so it is counted once
+            if not only or self.cache.peek(kind, key) is not MISSING:
+                value = self.cache.get(kind, key)
+                if value is not MISSING:
+                    return value
+            stale = self.cache.get_stale(kind, key)
+            if stale is not MISSING:
+                value, age = stale
+                self.serve_stale(age)
+                self.revalidate((kind, key), lambda: self.flights.do(
+                    (kind, key), lambda: self._load(kind, key, fetch, refresh=True)))
+                return value
+            if only:
+                raise Cache_Miss(kind)
+        return self.flights.do((kind, key), lambda: self._load(kind, key, fetch, refresh))
+
+    def upstream(self, fn, *args, kind=None):
+        """Make an upstream call, through the rate limiter and ``kind``'s
+        circuit breaker when there are. An open circuit fails before waiting
+        for admission; the breaker runs inside the limiter, so only the
+        yfinance call itself is timed against its slow-call threshold."""
+        if cache_only.get():
+            raise Cache_Miss(kind)
+        call = fn
+        if self.breakers is not None and kind is not None:
+            self.breakers.check(kind)
+            call = self.breakers.wrap(kind, fn)
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = call(*args) if self.limiter is None else self.limiter.call(call, *args)
+            outcome = 'ok'
+            return result
+        finally:
+            upstream_seconds.observe(time.perf_counter() - started, kind or 'other', outcome)
+
+    def _load(self, kind, key, fetch, refresh=False):
+        if self.cache is None:
+            return self.upstream(fetch, kind=kind)
+        # another flight may have filled the entry since our lookup
+        value = MISSING if refresh else self.cache.peek(kind, key)
+        if value is MISSING:
+            value = self.upstream(fetch, kind=kind)
+            self.cache.set(kind, key, value)
+        return value
+
+    def serve_stale(self, age):
+        self.stale_served += 1
+        note_stale(age)
+
+    def revalidate(self, key, refresh):
+        """Run ``refresh()`` on a background thread at background upstream
+        priority, unless one is already running for ``key``."""
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        try:
+            self._revalidator.submit(self._revalidate, key, refresh)
+        except RuntimeError:
+            # shutting down; the stale value is still good to serve
+            with self._revalidating_lock:
+                self._revalidating.discard(key)
+
+    def _revalidate(self, key, refresh):
+        upstream_priority.set(BACKGROUND)
+        try:
+            refresh()
+            self.revalidations += 1
+        except Exception as e:
+            self.revalidation_errors += 1
+            self.last_revalidation_error = str(e) or type(e).__name__
+        finally:
+            with self._revalidating_lock:
+                self._revalidating.discard(key)
+
+    def shutdown(self):
+        self._revalidator.shutdown(wait=False, cancel_futures=True)
+
+    def stale_stats(self):
+        return {
+            'stale_served': self.stale_served,
+            'revalidating': len(self._revalidating),
+            'revalidations': self.revalidations,
+            'revalidation_errors': self.revalidation_errors,
+            'last_revalidation_error': self.last_revalidation_error,
+        }
     
     def ticker_extractor(self):
-        with open(self.filename, mode='r') as file:
-            csv_reader = csv.DictReader(file)
-            data_list = []
-            for row in csv_reader:
-                data_list.append(row)
-        ticker_list = dict()
-        for data in data_list:
-            market_cap = data['Market Cap']
-            market_cap = int(float(market_cap))/1000000000 
-            ticker_list[data['Symbol']] = [data['Name'], data['Sector'], data['Industry'], data['Country'], market_cap]
-        Data_Retriever.ticker_dict = ticker_list
+        store = load_ticker_store(self.filename)
+        universe = Ticker_Universe(store)
+        search_index = Ticker_Search_Index(universe)
+        version = self.listing.version + 1 if self.listing is not None else 1
+        self.listing = Listing(store, universe, search_index, version, time.time())
+
+    def reload(self):
+        """Rebuild the listing from the CSV and swap it in."""
+        self.ticker_extractor()
+        return self.listing.version
         
     def company_overview(self, ticker):
+        return self.cached('company-overview', ticker.upper(), lambda: self._fetch_info(ticker))
+
+    def _fetch_info(self, ticker):
         tkr = self.get_ticker(ticker)
         # print(tkr, ticker)
         info = tkr.info
         # print(info)
-        del info['companyOfficers']
+        info.pop('companyOfficers', None)
         # print(info)
         return info
         # return tkr.info['longBusinessSummary']
@@ -45,19 +259,14 @@ class Data_Retriever:
     
     def historical_data(self, ticker, period):
         tkr = self.get_ticker(ticker)
-        hist = tkr.history(period=period)
-        return hist
+        return self.cached('history', (ticker.upper(), period), lambda: tkr.history(period=period))
     
-    def get_balance_sheet(self, ticker):
-        tkr = yf.Ticker(ticker)
-        df_str = tkr.balance_sheet.astype(str)
-        dct = df_str.to_dict()
-        balance_sheet = {k.strftime('%Y-%m-%d'): v for k, v in dct.items()}
-        res = list()
-        for key, value in balance_sheet.items():
-            value['year'] = key
-            res.append(value)
-        return res
+    def get_balance_sheet(self, ticker, shape='records'):
+        return normalize_statement(self._statement('balance-sheet', ticker), shape)
+
+    def _statement(self, kind, ticker, refresh=False):
+        tkr = self.get_ticker(ticker)
+        return self.cached(kind, ticker.upper(), lambda: getattr(tkr, STATEMENT_ATTRIBUTES[kind]), refresh)
         
     def get_ticker(self, ticker):
         return yf.Ticker(ticker)
@@ -66,50 +275,38 @@ class Data_Retriever:
         tkr = self.get_ticker(ticker)
         return tkr.get_news
     
-    def get_cashflow(self, ticker):
-        tkr = self.get_ticker(ticker)
-        df_str = tkr.cash_flow.astype(str)
-        dct = df_str.to_dict()
-        cashflow = {k.strftime('%Y-%m-%d'): v for k, v in dct.items()}
-        res = list()
-        for key, value in cashflow.items():
-            value['year'] = key
-            res.append(value)
-        return res
+    def get_cashflow(self, ticker, shape='records'):
+        return normalize_statement(self._statement('cashflow', ticker), shape)
     
     def get_shareholders(self, ticker):
         
         tkr = self.get_ticker(ticker)
-        institutional_holders = tkr.institutional_holders.to_dict()
-        major_holders = tkr.institutional_holders.to_dict()
+        holders = self.cached('shareholders', ticker.upper(), lambda: tkr.institutional_holders)
+        institutional_holders = holders.to_dict()
+        major_holders = holders.to_dict()
         
         
         return {'major-holders': major_holders,
                         'institutional-holders': institutional_holders}
         
-    def get_income_statement(self, ticker):
-        tkr = self.get_ticker(ticker)
-        df_str = tkr.income_stmt.astype(str)
-        dct = df_str.to_dict()
-        income_stmt = {k.strftime('%Y-%m-%d'): v for k, v in dct.items()}
-        res = list()
-        for key, value in income_stmt.items():
-            value['year'] = key
-            res.append(value)
-        return res
+    def get_income_statement(self, ticker, shape='records'):
+        return normalize_statement(self._statement('income-statement', ticker), shape)
+
+    def refresh_fundamentals(self, ticker):
+        """Re-fetch the overview and statements of ``ticker`` into the cache,
+        replacing entries that are still fresh."""
+        key = ticker.upper()
+        self.cached('company-overview', key, lambda: self._fetch_info(ticker), refresh=True)
+        for kind in STATEMENT_ATTRIBUTES:
+            self._statement(kind, ticker, refresh=True)
     
     def convert_timestamp(self, df: pd.DataFrame):
         dct = df.to_dict()
         return {k.strftime('%Y-%m-%d'): v for k, v in dct.items()}
     
     def sector_wise_grouping(self, sector):
-        sector_dict = dict()
-        for key , val in self.ticker_dict.items():
-            if val[1] == sector:
-                if key not in sector_dict:
-                    sector_dict[key] = []
-                sector_dict[key].append(self.ticker_dict[key])
-        return sector_dict
+        universe = self.universe
+        return {universe.symbols[i]: [universe.store.row(i)] for i in universe.select(sector=sector)}
     
     def industry_wise_grouping(self, industry):
         # print(industry)
@@ -121,25 +318,113 @@ class Data_Retriever:
         #         industry_dict[key].append(self.ticker_dict[key])
         # return industry_dict
         # print(industry)
-        company = yf.Industry(industry)
-        dct = company.top_companies.to_dict()
+        top_companies = self.cached('industry', industry, lambda: yf.Industry(industry).top_companies)
+        dct = top_companies.to_dict()
         companies:dict = dct['name']
         res_list = list(companies.keys())
         res_list = res_list[:5]
         return res_list
     
     def get_history(self, ticker):
-        ticker = self.get_ticker(ticker)
-        history = ticker.history(period="5y", interval="3mo").to_json()
+        tkr = self.get_ticker(ticker)
+        history = self.cached('history', (ticker.upper(), "5y", "3mo"),
+                               lambda: tkr.history(period="5y", interval="3mo")).to_json()
         history = json.loads(history)
         return history
     
     def get_latest_history(self, ticker):
-        ticker = self.get_ticker(ticker)
-        history = ticker.history(period="1d").to_json()
+        tkr = self.get_ticker(ticker)
+        history = self.cached('quote', (ticker.upper(), "1d"), lambda: tkr.history(period="1d")).to_json()
         history = json.loads(history)
         return history
 
+    def get_quotes(self, tickers, refresh=False):
+        """Latest daily bar for many tickers with one multi-ticker download.
+
+        Cached quotes are reused unless ``refresh``; the rest are fetched
+        together and cached under the same keys get_latest_history uses.
+        Stale quotes are served as they are and refreshed together in the
+        background. Returns ``{TICKER: frame}``, leaving out tickers yfinance
+        had no data for.
+        """
+        tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers))
+        quotes, missing = dict(), tickers
+        if self.cache is not None and not refresh:
+            missing, stale = [], []
+            for ticker in tickers:
+                value = self.cache.get('quote', (ticker, "1d"))
+                if value is MISSING:
+                    value = self.cache.get_stale('quote', (ticker, "1d"))
+                    if value is MISSING:
+                        missing.append(ticker)
+                        continue
+                    value, age = value
+                    self.serve_stale(age)
+                    stale.append(ticker)
+                quotes[ticker] = value
+            if stale:
+                self.revalidate(('quote', tuple(stale)), lambda: self.get_quotes(stale, refresh=True))
+        if missing:
+            frames = self.upstream(lambda: yf.download(missing, period="1d", group_by='ticker', actions=True,
+                                                       auto_adjust=True, progress=False), kind='quote')
+            for ticker in missing:
+                if ticker not in frames.columns.get_level_values(0):
+                    continue
+                frame = frames[ticker].dropna(how='all')
+                if frame.empty:
+                    continue
+                quotes[ticker] = frame
+                if self.cache is not None:
+                    self.cache.set('quote', (ticker, "1d"), frame)
+        return quotes
+
+    def get_last_prices(self, tickers, refresh=False):
+        """Last traded price per ticker from get_quotes, None if unavailable."""
+        quotes = self.get_quotes(tickers, refresh)
+        prices = dict()
+        for ticker in dict.fromkeys(ticker.upper() for ticker in tickers):
+            frame = quotes.get(ticker)
+            close = frame['Close'].dropna() if frame is not None else ()
+            prices[ticker] = float(close.iloc[-1]) if len(close) else None
+        return prices
+
+    def get_closes(self, positions):
+        """Close of each ``(ticker, date)``, keyed by ``(TICKER, date)``. None
+        when there was no session that day (weekend, holiday, not yet listed).
+
+        Closes missing from the cache are fetched with one multi-ticker range
+        download per cluster of nearby dates (see cluster_dates). Closes are
+        adjusted for splits and dividends, like yfinance's default, so past
+        ones are only cached for a day.
+        """
+        closes, missing = dict(), []
+        for ticker, day in dict.fromkeys((ticker.upper(), day) for ticker, day in positions):
+            value = self.cache.get('close', (ticker, day.isoformat())) if self.cache is not None else MISSING
+            if value is MISSING:
+                missing.append((ticker, day))
+            else:
+                closes[(ticker, day)] = value
+        today = date.today()
+        for cluster in cluster_dates(missing):
+            tickers = sorted({ticker for ticker, _ in cluster})
+            frames = self.upstream(lambda: yf.download(
+                tickers, start=cluster[0][1].isoformat(), end=(cluster[-1][1] + timedelta(days=1)).isoformat(),
+                interval='1d', group_by='ticker', auto_adjust=True, actions=False, progress=False), kind='close')
+            downloaded = set(frames.columns.get_level_values(0)) if not frames.empty else set()
+            for ticker, day in cluster:
+                close = None
+                series = (frames[ticker]['Close'].dropna() if ticker in downloaded
+                          else pd.Series(dtype=float))
+                session = pd.Timestamp(day)
+                if session in series.index:
+                    close = float(series[session])
+                closes[(ticker, day)] = close
+                # failed tickers come back all-NaN and are retried next time;
+                # otherwise a missing session is final. Today's close is still moving.
+                if len(series) and day < today and self.cache is not None:
+                    self.cache.set('close', (ticker, day.isoformat()), close)
+        return closes
+
 
 # path = os.path.join(os.path.dirname(__file__), r"data\nasdaq.csv")
 # stocks = Data_Retriever(path)
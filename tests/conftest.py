@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+# main.py builds its singletons at import time; keep them off Kafka and the real history directory
+os.environ.setdefault("KAFKA_PRODUCER", "memory")
+os.environ.setdefault("HISTORY_STORE_PATH", tempfile.mkdtemp(prefix="history-"))
+
+import pytest
+
+NASDAQ_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "nasdaq.csv")
+
+
+class Fake_Clock:
+    """Clock for the ``clock=`` arguments; only moves when told to."""
+
+    def __init__(self, now=1_000_000.0) -> None:
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Fake_Clock()
+
+
+def history_frame(start, end):
+    """A yfinance-like daily history frame for business days in [start, end).
+    Prices depend on the date only, so overlapping fetches agree."""
+    import numpy as np
+    import pandas as pd
+    index = pd.bdate_range(start, pd.Timestamp(end) - pd.Timedelta(days=1), name='Date')
+    days = (index - pd.Timestamp('2000-01-01')).days.to_numpy()
+    close = 100 * np.exp(np.sin(days / 17.0) * 0.1 + days * 0.0001)
+    return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close,
+                         'Volume': 1000.0, 'Dividends': 0.0, 'Stock Splits': 0.0}, index=index)
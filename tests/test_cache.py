@@ -0,0 +1,117 @@
+from cache import Data_Cache, Local_Backend, Shared_Backend, Memory_Client, MISSING
+
+
+class Failing_Client(Memory_Client):
+    """Memory_Client whose server goes away while ``down`` is set."""
+
+    down = False
+
+    def get(self, name):
+        if self.down:
+            raise ConnectionError("connection refused")
+        return super().get(name)
+
+    def set(self, name, value, ex=None):
+        if self.down:
+            raise ConnectionError("connection refused")
+        return super().set(name, value, ex)
+
+    def scan_iter(self, match="*"):
+        if self.down:
+            raise ConnectionError("connection refused")
+        return super().scan_iter(match)
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = Data_Cache(ttls={'quote': 15}, clock=clock, max_stale={'quote': 0})
+    cache.set('quote', 'AAPL', 190.0)
+    clock.advance(14)
+    assert cache.get('quote', 'AAPL') == 190.0
+    clock.advance(1)
+    assert cache.get('quote', 'AAPL') is MISSING
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 1 and stats['expirations'] == 1 and stats['size'] == 0
+
+
+def test_expired_entries_are_served_stale_until_max_stale(clock):
+    cache = Data_Cache(ttls={'quote': 15}, clock=clock, max_stale={'quote': 60})
+    cache.set('quote', 'AAPL', 190.0)
+    clock.advance(30)
+    assert cache.get('quote', 'AAPL') is MISSING and cache.peek('quote', 'AAPL') is MISSING
+    assert cache.get_stale('quote', 'AAPL') == (190.0, 30)
+    clock.advance(45)
+    assert cache.get_stale('quote', 'AAPL') is MISSING
+
+
+def test_local_backend_evicts_least_recently_used(clock):
+    cache = Data_Cache(Local_Backend(max_size=2), clock=clock)
+    cache.set('quote', 'AAPL', 1)
+    cache.set('quote', 'MSFT', 2)
+    assert cache.get('quote', 'AAPL') == 1  # MSFT is now the oldest
+    cache.set('quote', 'GOOG', 3)
+    assert cache.get('quote', 'MSFT') is MISSING
+    assert cache.get('quote', 'AAPL') == 1 and cache.get('quote', 'GOOG') == 3
+    assert cache.stats()['evictions'] == 1 and cache.stats()['size'] == 2
+
+
+def test_shared_backend_is_seen_by_every_worker(clock):
+    client = Memory_Client(clock=clock)
+    first = Data_Cache(Shared_Backend(client), clock=clock, max_stale={'quote': 0})
+    second = Data_Cache(Shared_Backend(client), clock=clock, max_stale={'quote': 0})
+    first.set('quote', 'AAPL', {'price': 190.0})
+    assert second.get('quote', 'AAPL') == {'price': 190.0}
+    assert second.stats()['size'] == 1
+    second.invalidate('quote', 'AAPL')
+    assert first.get('quote', 'AAPL') is MISSING
+
+
+def test_shared_backend_keeps_entries_for_ttl_plus_max_stale(clock):
+    client = Memory_Client(clock=clock)
+    cache = Data_Cache(Shared_Backend(client), ttls={'quote': 15}, clock=clock, max_stale={'quote': 60})
+    cache.set('quote', 'AAPL', 190.0)
+    clock.advance(70)
+    assert cache.get_stale('quote', 'AAPL') == (190.0, 70)
+    clock.advance(10)
+    # the server dropped it on its own
+    assert client.get('fastapi-finance:quote|AAPL') is None
+
+
+def test_retriever_falls_back_to_upstream_when_the_backend_errors(clock):
+    from stock import Data_Retriever
+    from tests.conftest import NASDAQ_CSV
+    client = Failing_Client(clock=clock)
+    retriever = Data_Retriever(NASDAQ_CSV, cache=Data_Cache(Shared_Backend(client), clock=clock))
+    calls = []
+    fetch = lambda: calls.append(1) or {'symbol': 'AAPL'}
+    try:
+        assert retriever.cached('company-overview', 'AAPL', fetch) == {'symbol': 'AAPL'}
+        client.down = True
+        assert retriever.cached('company-overview', 'AAPL', fetch) == {'symbol': 'AAPL'}
+        client.down = False
+        assert retriever.cached('company-overview', 'AAPL', fetch) == {'symbol': 'AAPL'}
+    finally:
+        retriever.shutdown()
+    assert len(calls) == 2
+    # the lookup, the stale lookup, the re-check before fetching and the write
+    assert retriever.cache.stats()['backend_errors'] == 4
+
+
+def test_shared_backend_survives_an_outage_in_stats_and_clear(clock):
+    client = Failing_Client(clock=clock)
+    cache = Data_Cache(Shared_Backend(client), clock=clock)
+    cache.set('quote', 'AAPL', 190.0)
+    client.down = True
+    cache.clear()
+    stats = cache.stats()
+    assert stats['size'] is None and stats['backend_errors'] == 2
+    client.down = False
+    assert cache.stats()['size'] == 1
+
+
+def test_a_corrupt_shared_entry_is_a_miss(clock):
+    client = Memory_Client(clock=clock)
+    cache = Data_Cache(Shared_Backend(client), clock=clock)
+    cache.set('quote', 'AAPL', 190.0)
+    client.set('fastapi-finance:quote|AAPL', b'\x80\x05not a pickle')
+    assert cache.get('quote', 'AAPL') is MISSING
+    assert cache.stats()['misses'] == 1 and cache.stats()['backend_errors'] == 1
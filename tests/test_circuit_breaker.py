@@ -0,0 +1,199 @@
+import threading
+import time
+import pytest
+import requests
+from yfinance.exceptions import YFRateLimitError, YFTickerMissingError
+from cache import Data_Cache, Local_Backend, Freshness, response_freshness
+from circuit_breaker import Circuit_Breakers, Circuit_Open, CLOSED, OPEN, HALF_OPEN
+from rate_limiter import Upstream_Limiter
+from stock import Data_Retriever
+from tests.conftest import NASDAQ_CSV
+
+
+def failing(error):
+    def fetch():
+        raise error
+    return fetch
+
+
+def trip(breakers, kind='quote', error=None):
+    for _ in range(breakers.threshold):
+        with pytest.raises(type(error or ConnectionError())):
+            breakers.call(kind, failing(error or ConnectionError("reset by peer")))
+
+
+def test_opens_after_threshold_and_fails_fast(clock):
+    breakers = Circuit_Breakers(threshold=3, reset_timeout=30, clock=clock)
+    calls = []
+    trip(breakers)
+    assert breakers.circuits['quote'].state == OPEN
+    with pytest.raises(Circuit_Open) as raised:
+        breakers.call('quote', lambda: calls.append(1))
+    assert calls == [] and raised.value.retry_after == 30
+    # other datasets are unaffected
+    assert breakers.call('history', lambda: 'bars') == 'bars'
+
+
+def test_half_open_probe_closes_on_success(clock):
+    breakers = Circuit_Breakers(threshold=2, reset_timeout=30, clock=clock)
+    trip(breakers)
+    clock.advance(30)
+    breakers.check('quote')
+    probe = breakers.before('quote')
+    assert probe and breakers.circuits['quote'].state == HALF_OPEN
+    # only one probe at a time
+    with pytest.raises(Circuit_Open):
+        breakers.check('quote')
+    with pytest.raises(Circuit_Open):
+        breakers.before('quote')
+    breakers.after('quote', probe, clock())
+    assert breakers.circuits['quote'].state == CLOSED
+    assert breakers.call('quote', lambda: 1) == 1
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breakers = Circuit_Breakers(threshold=2, reset_timeout=30, clock=clock)
+    trip(breakers)
+    clock.advance(31)
+    with pytest.raises(requests.exceptions.Timeout):
+        breakers.call('quote', failing(requests.exceptions.Timeout("read timed out")))
+    circuit = breakers.circuits['quote']
+    assert circuit.state == OPEN and circuit.trips == 2
+    clock.advance(29)
+    with pytest.raises(Circuit_Open):
+        breakers.check('quote')
+
+
+@pytest.mark.parametrize('error', [YFRateLimitError(), TimeoutError(), requests.exceptions.ConnectionError()])
+def test_transport_errors_and_throttling_count(clock, error):
+    breakers = Circuit_Breakers(threshold=2, clock=clock)
+    trip(breakers, error=error)
+    assert breakers.circuits['quote'].state == OPEN
+
+
+@pytest.mark.parametrize('error', [YFTickerMissingError('NOPE', 'no timezone found'), KeyError('regularMarketPrice'),
+                                   ValueError("no data")])
+def test_unknown_tickers_do_not_count(clock, error):
+    breakers = Circuit_Breakers(threshold=2, clock=clock)
+    for _ in range(10):
+        with pytest.raises(type(error)):
+            breakers.call('company-overview', failing(error))
+    assert breakers.circuits['company-overview'].state == CLOSED
+
+
+def test_slow_call_counts_as_failure(clock):
+    breakers = Circuit_Breakers(threshold=2, slow_call=10, clock=clock)
+
+    def slow():
+        clock.advance(11)
+        return 'late'
+
+    assert breakers.call('quote', slow) == 'late'
+    assert breakers.call('quote', slow) == 'late'
+    assert breakers.circuits['quote'].state == OPEN
+    assert breakers.circuits['quote'].last_error.startswith('slow call')
+
+
+@pytest.fixture(scope='module')
+def nasdaq():
+    return NASDAQ_CSV
+
+
+def retriever(path, cache=None, limiter=None, breakers=None):
+    return Data_Retriever(path, cache=cache, limiter=limiter, breakers=breakers)
+
+
+def test_limiter_queueing_is_not_a_slow_call(nasdaq):
+    # a healthy 0.15s upstream behind a limiter that admits one call at a time
+    breakers = Circuit_Breakers(threshold=2, slow_call=0.3)
+    limiter = Upstream_Limiter(rate=1000, burst=1000, max_limit=1, latency_target=1)
+    stocks = retriever(nasdaq, limiter=limiter, breakers=breakers)
+
+    def fetch():
+        time.sleep(0.15)
+        return {}
+
+    threads = [threading.Thread(target=stocks.upstream, args=(fetch,), kwargs={'kind': 'company-overview'})
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    circuit = breakers.circuits['company-overview']
+    assert circuit.state == CLOSED and circuit.last_error is None and circuit.calls == 4
+
+
+def test_open_circuit_fails_before_waiting_for_the_limiter(nasdaq, clock):
+    breakers = Circuit_Breakers(threshold=1, clock=clock)
+    limiter = Upstream_Limiter(rate=1000, burst=1000)
+    stocks = retriever(nasdaq, limiter=limiter, breakers=breakers)
+    with pytest.raises(ConnectionError):
+        stocks.upstream(failing(ConnectionError()), kind='quote')
+    admitted = limiter.admitted['interactive']
+    with pytest.raises(Circuit_Open):
+        stocks.upstream(lambda: 1, kind='quote')
+    assert limiter.admitted['interactive'] == admitted
+
+
+def test_stale_value_served_and_revalidated_in_background(nasdaq, clock):
+    cache = Data_Cache(Local_Backend(), ttls={'company-overview': 60}, clock=clock,
+                       max_stale={'company-overview': 3600})
+    stocks = retriever(nasdaq, cache=cache, breakers=Circuit_Breakers(threshold=1, clock=clock))
+    upstream = {'error': None, 'version': 1}
+    refreshed = threading.Event()
+
+    def fetch():
+        if upstream['error'] is not None:
+            refreshed.set()
+            raise upstream['error']
+        refreshed.set()
+        return {'version': upstream['version']}
+
+    assert stocks.cached('company-overview', 'AAPL', fetch) == {'version': 1}
+    clock.advance(90)
+    upstream['error'] = ConnectionError("upstream down")
+    freshness = Freshness()
+    token = response_freshness.set(freshness)
+    try:
+        refreshed.clear()
+        assert stocks.cached('company-overview', 'AAPL', fetch) == {'version': 1}
+    finally:
+        response_freshness.reset(token)
+    assert freshness.stale_age == 90
+    assert refreshed.wait(5)
+    deadline = time.time() + 5
+    while stocks.revalidation_errors == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert stocks.revalidation_errors == 1
+    # the breaker is open now, yet the stale value is still served
+    assert breakers_state(stocks) == OPEN
+    assert stocks.cached('company-overview', 'AAPL', fetch) == {'version': 1}
+    assert stocks.stale_served == 2
+
+
+def breakers_state(stocks):
+    return stocks.breakers.circuits['company-overview'].state
+
+
+def test_revalidation_replaces_the_stale_value(nasdaq, clock):
+    cache = Data_Cache(Local_Backend(), ttls={'company-overview': 60}, clock=clock,
+                       max_stale={'company-overview': 3600})
+    stocks = retriever(nasdaq, cache=cache)
+    versions = iter(range(1, 10))
+    assert stocks.cached('company-overview', 'MSFT', lambda: next(versions)) == 1
+    clock.advance(61)
+    assert stocks.cached('company-overview', 'MSFT', lambda: next(versions)) == 1
+    deadline = time.time() + 5
+    while stocks.revalidations == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert stocks.cached('company-overview', 'MSFT', lambda: next(versions)) == 2
+
+
+def test_stale_entries_expire_after_max_stale(nasdaq, clock):
+    cache = Data_Cache(Local_Backend(), ttls={'company-overview': 60}, clock=clock,
+                       max_stale={'company-overview': 100})
+    stocks = retriever(nasdaq, cache=cache, breakers=Circuit_Breakers(clock=clock))
+    stocks.cached('company-overview', 'IBM', lambda: 'old')
+    clock.advance(161)
+    with pytest.raises(ConnectionError):
+        stocks.cached('company-overview', 'IBM', failing(ConnectionError()))
@@ -0,0 +1,70 @@
+import time
+import orjson
+from consumer import Materialized_View, View_Consumer, Memory_Consumer
+from fingerprints import Change_Detector
+from producer import Memory_Producer
+
+OVERVIEW = {'symbol': 'AAPL', 'marketCap': 100, 'sector': 'Technology'}
+
+
+def published(producer, detector, ticker, financials, timestamp, deltas=False):
+    changes = detector.prepare(ticker, financials, timestamp, deltas=deltas)
+    detector.commit(changes)
+    producer.produce('financial-updates', value=orjson.dumps(changes.message), key=ticker.encode())
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert condition()
+
+
+def test_consumer_applies_messages_in_order_and_reports_lag():
+    producer = Memory_Producer(partitions=2)
+    detector = Change_Detector()
+    for i in range(5):
+        published(producer, detector, 'AAPL', {'company-overview': {**OVERVIEW, 'marketCap': 100 + i}},
+                  f'2024-01-0{i + 1}T00:00:00', deltas=True)
+    published(producer, detector, 'MSFT', {'company-overview': {**OVERVIEW, 'symbol': 'MSFT'}}, '2024-01-05T00:00:00')
+    producer.produce('other-topic', value=b'{}', key=b'AAPL')
+    producer.flush()
+
+    consumer = Memory_Consumer(producer.messages)
+    view_consumer = View_Consumer(Materialized_View(), consumer_factory=lambda: consumer)
+    consumer.subscribe(['financial-updates'])
+    view_consumer.consumer = consumer
+    view_consumer._update_lag()
+    assert view_consumer.lag == 6
+
+    view_consumer.start()
+    try:
+        wait_for(lambda: view_consumer.consumed == 6 and view_consumer.lag == 0)
+    finally:
+        view_consumer.shutdown()
+    view = view_consumer.view
+    data, _ = view.get('aapl', ['company-overview'], max_age=float('inf'))
+    # four deltas applied on top of the snapshot, in order
+    assert data['company-overview']['marketCap'] == 104
+    assert view.get('MSFT', ['company-overview'], max_age=float('inf'))[0]['company-overview']['symbol'] == 'MSFT'
+    stats = view_consumer.stats()
+    assert stats['view']['applied'] == 6 and stats['view']['gaps'] == 0 and stats['view']['tickers'] == 2
+    assert stats['errors'] == 0 and not stats['running']
+
+
+def test_a_delta_without_its_base_drops_the_dataset():
+    producer = Memory_Producer()
+    detector = Change_Detector()
+    published(producer, detector, 'AAPL', {'company-overview': OVERVIEW}, '2024-01-01T00:00:00')
+    published(producer, detector, 'AAPL', {'company-overview': {**OVERVIEW, 'marketCap': 101}},
+              '2024-01-02T00:00:00', deltas=True)
+    producer.flush()
+    view = Materialized_View()
+    # the snapshot aged out of the topic: only the delta is left
+    view_consumer = View_Consumer(view, consumer_factory=lambda: Memory_Consumer(producer.messages[1:]))
+    view_consumer.start()
+    try:
+        wait_for(lambda: view_consumer.consumed == 1)
+    finally:
+        view_consumer.shutdown()
+    assert view.get('AAPL', ['company-overview'], max_age=float('inf')) is None and view.gaps == 1
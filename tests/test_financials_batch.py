@@ -0,0 +1,84 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+import main
+from async_stock import Async_Data_Retriever
+
+
+class Immediate_Executor:
+    async def run(self, fn, *args, **kwargs):
+        return fn(*args)
+
+
+class Fake_Retriever:
+    """Answers every dataset from memory; ``failing`` maps tickers to the datasets that raise."""
+
+    cache = None
+
+    def __init__(self, failing=None) -> None:
+        self.failing = failing or dict()
+        self.calls = []
+
+    def _answer(self, dataset, ticker, *args):
+        self.calls.append((ticker, dataset))
+        if dataset in self.failing.get(ticker, ()):
+            raise ConnectionError(f"{dataset} unavailable")
+        return {'ticker': ticker, 'dataset': dataset}
+
+    def company_overview(self, ticker):
+        return self._answer('company-overview', ticker)
+
+    def get_balance_sheet(self, ticker, shape):
+        return self._answer('balance-sheet', ticker)
+
+    def get_cashflow(self, ticker, shape):
+        return self._answer('cashflow', ticker)
+
+    def get_income_statement(self, ticker, shape):
+        return self._answer('income-statement', ticker)
+
+
+@pytest.fixture
+def retriever(monkeypatch):
+    retriever = Fake_Retriever()
+    monkeypatch.setattr(main, 'async_stocks', Async_Data_Retriever(retriever, Immediate_Executor()))
+    return retriever
+
+
+def post(body):
+    return TestClient(main.app).post('/stocks/financials/batch', json=body)
+
+
+def test_tickers_are_normalized_and_fetched_once(retriever):
+    response = post({'tickers': [' msft', 'AAPL', 'msft ', '', 'aapl'], 'datasets': ['cashflow']})
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body['results']) == ['MSFT', 'AAPL'] and body['requested'] == 2
+    assert body['results']['AAPL'] == {'cashflow': {'ticker': 'AAPL', 'dataset': 'cashflow'}}
+    assert sorted(retriever.calls) == [('AAPL', 'cashflow'), ('MSFT', 'cashflow')]
+
+
+def test_a_failing_dataset_is_reported_for_its_ticker_only(retriever):
+    retriever.failing = {'MSFT': ('balance-sheet',)}
+    body = post({'tickers': ['AAPL', 'MSFT']}).json()
+    assert body['errors'] == {'MSFT': {'balance-sheet': 'balance-sheet unavailable'}}
+    assert sorted(body['results']['MSFT']) == ['cashflow', 'company-overview', 'income-statement']
+    assert sorted(body['results']['AAPL']) == sorted(main.FINANCIAL_DATASETS)
+
+
+def test_streamed_batches_carry_errors_per_line(retriever):
+    retriever.failing = {'AAPL': ('company-overview',)}
+    response = post({'tickers': ['aapl', 'MSFT'], 'datasets': ['company-overview'], 'stream': True})
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    lines = {line['ticker']: line for line in map(json.loads, response.text.splitlines())}
+    assert lines['AAPL']['data'] == {} and 'company-overview' in lines['AAPL']['errors']
+    assert lines['MSFT']['errors'] == {}
+
+
+def test_batch_size_is_counted_after_deduplication(retriever, monkeypatch):
+    monkeypatch.setattr(main, 'BATCH_MAX_TICKERS', 2)
+    assert post({'tickers': ['AAPL', 'aapl', 'MSFT'], 'datasets': ['cashflow']}).status_code == 200
+    response = post({'tickers': ['AAPL', 'MSFT', 'NVDA']})
+    assert response.status_code == 400 and 'At most 2 tickers' in response.json()['error']
+    assert post({'tickers': ['AAPL'], 'datasets': ['quote']}).status_code == 400
+    assert len(retriever.calls) == 2
@@ -0,0 +1,115 @@
+import time
+from datetime import datetime
+import orjson
+from consumer import Materialized_View
+from fingerprints import Change_Detector, diff, apply_delta
+from producer import Kafka_Pipeline, Memory_Producer
+
+OVERVIEW = {'symbol': 'AAPL', 'marketCap': 100, 'sector': 'Technology'}
+STATEMENT = [{'year': '2024-09-30', 'Revenue': 10.0}, {'year': '2023-09-30', 'Revenue': 9.0}]
+
+
+def test_unchanged_datasets_are_skipped():
+    detector = Change_Detector()
+    first = detector.prepare('AAPL', {'company-overview': OVERVIEW, 'cashflow': STATEMENT}, 't1')
+    detector.commit(first)
+    second = detector.prepare('AAPL', {'company-overview': {**OVERVIEW, 'marketCap': 101}, 'cashflow': STATEMENT}, 't2')
+    assert list(second.message['financials']) == ['company-overview']
+    detector.commit(second)
+    third = detector.prepare('AAPL', {'company-overview': {**OVERVIEW, 'marketCap': 101}, 'cashflow': STATEMENT}, 't3')
+    assert third.message is None
+    detector.commit(third)
+    assert detector.stats()['messages_skipped'] == 1 and detector.stats()['heartbeats'] == 0
+
+
+def test_heartbeats_are_sent_once_per_interval(clock):
+    detector = Change_Detector(heartbeat_interval=3600, clock=clock)
+    detector.commit(detector.prepare('AAPL', {'cashflow': STATEMENT}, 't1'))
+    clock.advance(1800)
+    quiet = detector.prepare('AAPL', {'cashflow': STATEMENT}, 't2')
+    assert quiet.message is None
+    detector.commit(quiet)
+    clock.advance(1800)
+    heartbeat = detector.prepare('AAPL', {'cashflow': STATEMENT}, 't3')
+    assert heartbeat.message['mode'] == 'verified' and heartbeat.message['financials'] == {}
+    assert heartbeat.message['verified'] == heartbeat.digests
+    detector.commit(heartbeat)
+    assert detector.prepare('AAPL', {'cashflow': STATEMENT}, 't4').message is None
+    # an undelivered heartbeat is due again straight away
+    detector.forget(heartbeat)
+    assert detector.prepare('AAPL', {'cashflow': STATEMENT}, 't5').message['mode'] == 'verified'
+
+
+def test_heartbeat_keeps_unchanged_datasets_fresh_in_the_view(clock):
+    detector = Change_Detector(heartbeat_interval=0)
+    view = Materialized_View(clock=clock)
+    day = 24 * 60 * 60
+    first = detector.prepare('AAPL', {'cashflow': STATEMENT}, '2024-01-01T00:00:00')
+    detector.commit(first)
+    view.apply(orjson.dumps(first.message))
+    again = detector.prepare('AAPL', {'cashflow': STATEMENT}, '2024-01-03T00:00:00')
+    detector.commit(again)
+    view.apply(orjson.dumps(again.message))
+    clock.now = datetime(2024, 1, 3, 1).timestamp()
+    data, age = view.get('AAPL', ['cashflow'], max_age=day)
+    assert data['cashflow'] == STATEMENT and age == 3600
+    assert detector.stats()['heartbeats'] == 1
+
+
+def test_heartbeat_for_another_version_drops_the_dataset():
+    view = Materialized_View()
+    view.apply(orjson.dumps({'ticker': 'AAPL', 'timestamp': '2024-01-01T00:00:00', 'financials': {'cashflow': STATEMENT},
+                             'digests': {'cashflow': 'old'}}))
+    view.apply(orjson.dumps({'ticker': 'AAPL', 'timestamp': '2024-01-02T00:00:00', 'mode': 'verified',
+                             'financials': {}, 'digests': {}, 'verified': {'cashflow': 'new'}}))
+    assert view.get('AAPL', ['cashflow'], max_age=float('inf')) is None and view.gaps == 1
+
+
+def test_delta_round_trip():
+    new = [{'year': '2025-09-30', 'Revenue': 11.0}, {'year': '2024-09-30', 'Revenue': 10.5}, STATEMENT[1]]
+    assert apply_delta(STATEMENT, diff(STATEMENT, new)) == new
+    assert apply_delta(OVERVIEW, diff(OVERVIEW, {'symbol': 'AAPL', 'marketCap': 5})) == {'symbol': 'AAPL', 'marketCap': 5}
+
+
+def publish(pipeline, detector, ticker, financials, deltas=False):
+    changes = detector.prepare(ticker, financials, '2024-01-01T00:00:00', deltas=deltas)
+    detector.commit(changes)
+    if changes.message is not None:
+        pipeline.send('financial-updates', changes.message, key=ticker,
+                      on_delivery=lambda error: error is not None and detector.forget(changes))
+    return changes
+
+
+def drain(pipeline):
+    deadline = time.time() + 5
+    while pipeline.stats()['queued'] and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.producer.flush()
+
+
+def test_failed_delivery_is_sent_again_whole():
+    failing = {'on': False}
+    producer = Memory_Producer(fail=lambda topic, key, value: 'broker down' if failing['on'] else None)
+    pipeline = Kafka_Pipeline(lambda: producer)
+    detector = Change_Detector()
+    view = Materialized_View()
+    pipeline.start()
+    try:
+        publish(pipeline, detector, 'AAPL', {'company-overview': OVERVIEW})
+        drain(pipeline)
+        failing['on'] = True
+        publish(pipeline, detector, 'AAPL', {'company-overview': {**OVERVIEW, 'marketCap': 200}}, deltas=True)
+        drain(pipeline)
+        assert detector.stats()['undelivered'] == 1
+        failing['on'] = False
+        # the same data again: not skipped, and sent as a snapshot rather than a delta on a base nobody has
+        retry = publish(pipeline, detector, 'AAPL', {'company-overview': {**OVERVIEW, 'marketCap': 200}}, deltas=True)
+        assert retry.message is not None and retry.message['mode'] == 'snapshot'
+        drain(pipeline)
+    finally:
+        pipeline.shutdown()
+    for message in producer.messages:
+        view.apply(message.value())
+    data, _ = view.get('AAPL', ['company-overview'], max_age=float('inf'))
+    assert data['company-overview']['marketCap'] == 200 and view.gaps == 0
+    assert [orjson.loads(message.value())['mode'] for message in producer.messages] == ['snapshot', 'snapshot']
@@ -0,0 +1,113 @@
+import os
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+from history_store import History_Store
+from tests.conftest import history_frame
+
+
+class Recording_Fetch:
+
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __call__(self, ticker, start, end, interval):
+        self.calls.append((start, end))
+        return history_frame(start, end)
+
+
+def store_at(tmp_path, clock, fetch=None, today=date(2024, 6, 28)):
+    return History_Store(root=str(tmp_path), fetch=fetch or Recording_Fetch(), clock=clock, today=lambda: today)
+
+
+def test_only_missing_ranges_are_fetched(tmp_path, clock):
+    store = store_at(tmp_path, clock)
+    bars, info = store.range('aapl', date(2024, 3, 1), date(2024, 4, 1))
+    assert info['fetched'] == len(bars) == 21
+    _, info = store.range('AAPL', date(2024, 3, 5), date(2024, 3, 20))
+    assert info['fetched'] == 0
+    bars, _ = store.range('AAPL', date(2024, 1, 1), date(2024, 5, 1))
+    # one head before March, one tail from the last stored bar
+    assert store.fetch.calls[1:] == [(date(2024, 1, 1), date(2024, 3, 1)), (date(2024, 3, 29), date(2024, 5, 1))]
+    expected = history_frame(date(2024, 1, 1), date(2024, 5, 1))
+    assert np.allclose(bars['close'], expected['Close'].to_numpy())
+    assert (np.diff(bars['ts']) > 0).all()
+
+
+def test_writes_leave_no_temp_files(tmp_path, clock):
+    store = store_at(tmp_path, clock)
+    store.range('AAPL', date(2024, 3, 1), date(2024, 4, 1))
+    store.range('AAPL', date(2024, 1, 1), date(2024, 5, 1))
+    assert sorted(os.listdir(tmp_path / '1d')) == ['AAPL.bin', 'AAPL.json', 'AAPL.lock']
+    assert store.stats()['series'] == 1
+
+
+def test_stores_sharing_a_directory_do_not_corrupt_each_other(tmp_path, clock):
+    # two stores stand in for two uvicorn workers: they share files but not thread locks
+    workers = [store_at(tmp_path, clock) for _ in range(2)]
+    windows = [(date(2020 + i % 4, 1 + i % 12, 1), date(2024, 6, 1)) for i in range(8)]
+    errors = []
+
+    def read(store, start, end):
+        try:
+            store.range('MSFT', start, end)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(workers[i % 2], *window)) for i, window in enumerate(windows)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    bars, info = store_at(tmp_path, clock).range('MSFT', date(2020, 1, 1), date(2024, 6, 1))
+    expected = history_frame(date(2020, 1, 1), date(2024, 6, 1))
+    assert info['fetched'] == 0
+    assert list(bars['ts']) == list(expected.index.as_unit('ns').asi8)
+    assert not any(name.endswith('.tmp') for name in os.listdir(tmp_path / '1d'))
+
+
+def test_live_bar_is_refetched_after_the_tail_ttl(tmp_path, clock):
+    store = History_Store(root=str(tmp_path), fetch=Recording_Fetch(), tail_ttl=300, clock=clock,
+                          today=lambda: date(2024, 6, 28))
+    store.range('AAPL', date(2024, 6, 1), date(2024, 7, 1))
+    store.range('AAPL', date(2024, 6, 1), date(2024, 7, 1))
+    assert len(store.fetch.calls) == 1
+    clock.advance(301)
+    bars, _ = store.range('AAPL', date(2024, 6, 1), date(2024, 7, 1))
+    assert len(store.fetch.calls) == 2 and store.fetch.calls[1][0] == date(2024, 6, 28)
+    assert pd.Timestamp(bars['ts'][-1]).date() == date(2024, 6, 28) and len(bars) == 20
+
+
+class Flaky_Fetch(Recording_Fetch):
+    """Returns an empty frame, as yfinance does on errors, for the first ``failures`` calls."""
+
+    def __init__(self, failures) -> None:
+        super().__init__()
+        self.failures = failures
+
+    def __call__(self, ticker, start, end, interval):
+        frame = super().__call__(ticker, start, end, interval)
+        if len(self.calls) <= self.failures:
+            return frame.iloc[:0]
+        return frame
+
+
+def test_an_empty_fetch_is_asked_for_again(tmp_path, clock):
+    store = store_at(tmp_path, clock, fetch=Flaky_Fetch(failures=1))
+    bars, _ = store.range('AAPL', date(2024, 3, 1), date(2024, 4, 1))
+    assert len(bars) == 0
+    bars, info = store.range('AAPL', date(2024, 3, 1), date(2024, 4, 1))
+    assert len(bars) == info['fetched'] == 21
+
+
+def test_an_empty_head_or_tail_leaves_the_covered_range(tmp_path, clock):
+    store = store_at(tmp_path, clock, fetch=Flaky_Fetch(failures=0))
+    store.range('AAPL', date(2024, 3, 1), date(2024, 4, 1))
+    store.fetch.failures = 3  # the head and the tail below come back empty
+    bars, _ = store.range('AAPL', date(2024, 1, 1), date(2024, 5, 1))
+    assert len(bars) == 21
+    bars, _ = store.range('AAPL', date(2024, 1, 1), date(2024, 5, 1))
+    assert store.fetch.calls[3:] == [(date(2024, 1, 1), date(2024, 3, 1)), (date(2024, 3, 29), date(2024, 5, 1))]
+    assert len(bars) == len(history_frame(date(2024, 1, 1), date(2024, 5, 1)))
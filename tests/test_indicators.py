@@ -0,0 +1,139 @@
+import math
+from datetime import date
+import numpy as np
+import pytest
+from history_store import History_Store
+from indicators import (Indicator_Engine, parse_spec, sma, ema, rsi, macd, bollinger, volatility, returns,
+                        drawdown, INDICATOR_MAX_WINDOW)
+from tests.conftest import history_frame
+
+CLOSE = 100 + np.cumsum(np.random.default_rng(7).normal(0, 1, 300))
+
+
+def naive_sma(close, window):
+    return [sum(close[i - window + 1:i + 1]) / window if i >= window - 1 else math.nan for i in range(len(close))]
+
+
+def naive_ema(close, span):
+    alpha, out = 2 / (span + 1), []
+    for value in close:
+        out.append(value if not out else alpha * value + (1 - alpha) * out[-1])
+    return out
+
+
+def naive_rsi(close, period):
+    out, gain, loss = [math.nan] * len(close), 0.0, 0.0
+    for i in range(1, len(close)):
+        change = close[i] - close[i - 1]
+        up, down = max(change, 0.0), max(-change, 0.0)
+        if i == 1:
+            gain, loss = up, down
+        else:
+            gain += (up - gain) / period
+            loss += (down - loss) / period
+        if i >= period:
+            out[i] = 100.0 if loss == 0 else 100 - 100 / (1 + gain / loss)
+    return out
+
+
+def naive_std(values, ddof=0):
+    mean = sum(values) / len(values)
+    return math.sqrt(sum((value - mean) ** 2 for value in values) / (len(values) - ddof))
+
+
+def close_to(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=float), np.asarray(expected, dtype=float),
+                               rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_sma_and_ema_match_loops():
+    close_to(sma(CLOSE, 20), naive_sma(CLOSE, 20))
+    close_to(sma(CLOSE[:5], 20), [math.nan] * 5)
+    close_to(ema(CLOSE, 12), naive_ema(CLOSE, 12))
+
+
+def test_rsi_matches_wilder_loop():
+    close_to(rsi(CLOSE, 14), naive_rsi(CLOSE, 14))
+
+
+def test_macd_matches_loops():
+    result = macd(CLOSE, 12, 26, 9)
+    line = np.subtract(naive_ema(CLOSE, 12), naive_ema(CLOSE, 26))
+    signal = naive_ema(line, 9)
+    close_to(result['macd'], line)
+    close_to(result['signal'], signal)
+    close_to(result['histogram'], line - np.asarray(signal))
+
+
+def test_bollinger_matches_loop():
+    result = bollinger(CLOSE, 20, 2)
+    middle = naive_sma(CLOSE, 20)
+    deviation = [naive_std(CLOSE[i - 19:i + 1]) if i >= 19 else math.nan for i in range(len(CLOSE))]
+    close_to(result['upper'], np.add(middle, np.multiply(deviation, 2)))
+    close_to(result['lower'], np.subtract(middle, np.multiply(deviation, 2)))
+
+
+def test_volatility_returns_and_drawdown_match_loops():
+    logs = [math.log(CLOSE[i] / CLOSE[i - 1]) for i in range(1, len(CLOSE))]
+    expected = [math.nan] * 20 + [naive_std(logs[i - 20:i], ddof=1) * math.sqrt(252) for i in range(20, len(logs) + 1)]
+    close_to(volatility(CLOSE, 20), expected)
+    close_to(returns(CLOSE), [math.nan] + [CLOSE[i] / CLOSE[i - 1] - 1 for i in range(1, len(CLOSE))])
+    peak, drops = -math.inf, []
+    for value in CLOSE:
+        peak = max(peak, value)
+        drops.append(value / peak - 1)
+    result = drawdown(CLOSE)
+    close_to(result['drawdown'], drops)
+    assert result['max_drawdown'] == pytest.approx(min(drops))
+
+
+def test_parse_spec_defaults_and_bounds():
+    assert parse_spec('SMA') == parse_spec('sma:20')
+    assert parse_spec('macd:12,26') == ('macd:12,26,9', 'macd', (12, 26, 9))
+    assert parse_spec(f'sma:{INDICATOR_MAX_WINDOW}')[2] == (INDICATOR_MAX_WINDOW,)
+    for spec in ('sma:1000000', 'macd:12,1e9,9', 'sma:2.5', 'sma:0', 'bollinger:20,inf', 'sma:nan', 'nope'):
+        with pytest.raises(ValueError):
+            parse_spec(spec)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    fetches = []
+
+    def fetch(ticker, start, end, interval):
+        fetches.append((start, end))
+        return history_frame(start, end)
+
+    history = History_Store(root=str(tmp_path), fetch=fetch, today=lambda: date(2024, 6, 28))
+    engine = Indicator_Engine(history)
+    engine.fetches = fetches
+    return engine
+
+
+def test_engine_warms_up_before_start_and_memoizes(engine):
+    result = engine.compute('AAPL', ['sma:50', 'rsi'], date(2024, 1, 1), date(2024, 6, 1))
+    assert result['date'][0] >= '2024-01-01'
+    # warmed up: no leading NaN at the requested start
+    assert not np.isnan(result['sma:50'][0]) and not np.isnan(result['rsi:14'][0])
+    full, _ = engine.history.range('AAPL', date(2023, 1, 1), date(2024, 6, 1))
+    first = int(np.searchsorted(full['ts'], np.datetime64('2024-01-01', 'ns').astype('int64')))
+    close_to(result['sma:50'], sma(full['close'], 50)[first:])
+    assert engine.compute('AAPL', ['sma:50', 'rsi'], date(2024, 1, 1), date(2024, 6, 1)) is not None
+    assert engine.stats()['hits'] == 1
+
+
+def test_engine_clamps_huge_warmups(engine):
+    # the longest allowed window on quarterly bars looks back millennia; must not overflow
+    result = engine.compute('AAPL', [f'macd:12,{INDICATOR_MAX_WINDOW},9'], date(2024, 1, 1), date(2024, 6, 1), '3mo')
+    assert engine.fetches and engine.fetches[0][0] >= date(1900, 1, 1)
+    assert 'macd:12,5000,9' in result
+
+
+def test_indicator_route_rejects_unbounded_windows():
+    from fastapi.testclient import TestClient
+    import main
+    client = TestClient(main.app)
+    response = client.get('/stocks/indicators/AAPL', params={'indicators': 'sma:1000000'})
+    assert response.status_code == 400
+    response = client.post('/stocks/indicators', json={'tickers': ['AAPL'], 'indicators': ['sma:1000000']})
+    assert response.status_code == 400
@@ -0,0 +1,170 @@
+import asyncio
+import json
+from jobs import Job, Job_Runner, Memory_Job_Store
+from producer import Kafka_Pipeline, Memory_Producer
+
+
+class Fake_Fetchers:
+    """Fake dataset fetchers: ``failures[ticker]`` calls fail before one succeeds."""
+
+    def __init__(self, failures=None, delay=0.01) -> None:
+        self.failures = dict(failures or {})
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    async def financials(self, ticker):
+        self.calls.append(ticker)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.failures.get(ticker, 0):
+                self.failures[ticker] -= 1
+                raise ConnectionError(f"{ticker} reset")
+            return {'company-overview': {'symbol': ticker}}
+        finally:
+            self.active -= 1
+
+
+def updater(fetchers, pipeline):
+    async def update(ticker, force=False):
+        data = await fetchers.financials(ticker)
+        await pipeline.publish('financial-updates', {'ticker': ticker, 'force': force, **data}, key=ticker)
+    return update
+
+
+async def finished(job):
+    while job.status not in ('completed', 'cancelled'):
+        await asyncio.sleep(0.005)
+    return job.to_dict()
+
+
+def test_job_processes_every_ticker_with_bounded_concurrency_and_retries():
+    producer = Memory_Producer()
+    pipeline = Kafka_Pipeline(lambda: producer)
+    fetchers = Fake_Fetchers(failures={'MSFT': 1, 'BAD': 10})
+    delays = []
+
+    async def no_sleep(seconds):
+        delays.append(seconds)
+
+    tickers = ['AAPL', 'MSFT', 'BAD'] + [f'T{i}' for i in range(20)]
+
+    async def scenario():
+        runner = Job_Runner(updater(fetchers, pipeline), concurrency=4, max_attempts=3, backoff=0.5,
+                            sleep=no_sleep)
+        job = runner.submit(tickers, {'force': True})
+        assert job.status == 'queued'
+        return await finished(job)
+
+    pipeline.start()
+    try:
+        status = asyncio.run(scenario())
+    finally:
+        pipeline.shutdown()
+    assert status['status'] == 'completed'
+    assert status['progress'] == {'done': 23, 'total': 23, 'success': 22, 'error': 1}
+    assert status['results']['MSFT']['attempts'] == 2 and status['results']['MSFT']['error'] is None
+    assert status['results']['BAD'] == {**status['results']['BAD'], 'status': 'error', 'attempts': 3,
+                                        'error': 'BAD reset'}
+    assert fetchers.max_active == 4
+    # exponential backoff with jitter: 0.5 * 2**(attempt - 1) * [0.5, 1.5]
+    assert len(delays) == 3 and all(0.25 <= delay <= 1.5 for delay in delays)
+    published = [json.loads(message.value()) for message in producer.messages]
+    assert sorted(message['ticker'] for message in published) == sorted(set(tickers) - {'BAD'})
+    assert all(message['force'] for message in published)
+
+
+def test_cancel_marks_unfinished_tickers():
+    fetchers = Fake_Fetchers(delay=0.05)
+    pipeline = Kafka_Pipeline(lambda: Memory_Producer())
+
+    async def scenario():
+        runner = Job_Runner(updater(fetchers, pipeline), concurrency=2)
+        job = runner.submit([f'T{i}' for i in range(10)])
+        while job.status != 'running':
+            await asyncio.sleep(0.005)
+        assert runner.cancel(job.id)
+        status = await finished(job)
+        assert not runner.cancel(job.id) and runner.get(job.id) is job
+        return status
+
+    pipeline.start()
+    try:
+        status = asyncio.run(scenario())
+    finally:
+        pipeline.shutdown()
+    assert status['status'] == 'cancelled' and status['progress']['cancelled'] == 10
+    assert len(fetchers.calls) == 2
+
+
+def test_store_drops_oldest_finished_jobs_first():
+    store = Memory_Job_Store(max_jobs=2)
+    running, done, newer = Job(['AAPL']), Job(['MSFT']), Job(['GOOG'])
+    running.status, done.status = 'running', 'completed'
+    for job in (running, done, newer):
+        store.add(job)
+    # the running job is older but kept; the finished one goes
+    assert len(store) == 2 and store.get(done.id) is None
+    assert store.get(running.id) is running and store.get(newer.id) is newer
+
+
+def test_update_route_normalizes_tickers(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    runner = Job_Runner(lambda ticker, force=False, deltas=False: asyncio.sleep(0))
+    monkeypatch.setattr(main, 'jobs', runner)
+    client = TestClient(main.app)
+    response = client.post('/stocks/get_tickers_update',
+                           json=[{'ticker': 'aapl'}, {'ticker': ' AAPL '}, {'ticker': ''}, {'ticker': 'msft'}])
+    assert response.status_code == 202 and response.json()['tickers'] == 2
+    assert list(runner.get(response.json()['job_id']).outcomes) == ['AAPL', 'MSFT']
+
+
+def test_update_publishes_freshly_fetched_data(monkeypatch):
+    import pandas as pd
+    import main
+    from fingerprints import Change_Detector
+
+    def statement(value):
+        return pd.DataFrame({pd.Timestamp('2024-09-30'): [value]}, index=['Revenue'])
+
+    class Immediate_Executor:
+        async def run(self, fn, *args, **kwargs):
+            return fn(*args)
+
+    class Recording_Pipeline:
+        def __init__(self) -> None:
+            self.messages = []
+
+        async def publish(self, topic, message, key=None, on_delivery=None):
+            self.messages.append(message)
+
+    fetched = []
+
+    def refresh_fundamentals(ticker):
+        fetched.append(main.datetime.now().isoformat())
+        main.stocks.cache.set('company-overview', ticker, {'symbol': ticker, 'marketCap': 200})
+        for kind in ('balance-sheet', 'cashflow', 'income-statement'):
+            main.stocks.cache.set(kind, ticker, statement(2.0))
+
+    pipeline = Recording_Pipeline()
+    monkeypatch.setattr(main, 'executor', Immediate_Executor())
+    monkeypatch.setattr(main, 'pipeline', pipeline)
+    monkeypatch.setattr(main, 'change_detector', Change_Detector())
+    monkeypatch.setattr(main.stocks, 'refresh_fundamentals', refresh_fundamentals)
+    # what a read through the cache would have returned
+    main.stocks.cache.set('company-overview', 'ZZZT', {'symbol': 'ZZZT', 'marketCap': 100})
+    for kind in ('balance-sheet', 'cashflow', 'income-statement'):
+        main.stocks.cache.set(kind, 'ZZZT', statement(1.0))
+    try:
+        asyncio.run(main.update_ticker('ZZZT'))
+    finally:
+        for kind in ('company-overview', 'balance-sheet', 'cashflow', 'income-statement'):
+            main.stocks.cache.invalidate(kind, 'ZZZT')
+    message, = pipeline.messages
+    assert message['financials']['company-overview']['marketCap'] == 200
+    assert message['financials']['cashflow'] == [{'Revenue': 2.0, 'year': '2024-09-30'}]
+    assert message['timestamp'] <= fetched[0]
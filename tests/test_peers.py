@@ -0,0 +1,86 @@
+import pytest
+from peers import Peers_Retriever
+
+COLUMNS = 'Symbol,Shortname,Sector,Industry,Marketcap,Ebitda,Revenuegrowth,Fulltimeemployees,Currentprice'
+ROWS = [
+    'NVDA,NVIDIA,Technology,Semiconductors,3000,60,1.2,30000,120.5',
+    'AVGO,Broadcom,Technology,Semiconductors,800,23,0.4,20000,170',
+    'AMD,Advanced Micro Devices,Technology,Semiconductors,250,5,0.1,26000,150',
+    'INTC,Intel,Technology,Semiconductors,,12,-0.1,120000,30',
+    'AAPL,Apple,Technology,Consumer Electronics,3400,130,0.06,160000,230',
+    'JPM,JPMorgan,Financial Services,Banks,600,,0.1,300000,210',
+]
+
+
+@pytest.fixture
+def peers(tmp_path):
+    path = tmp_path / 'sp500.csv'
+    path.write_text('\n'.join([COLUMNS, *ROWS]) + '\n', encoding='utf-8')
+    return Peers_Retriever(str(path), info_fields=('shortName', 'marketCap', 'ebitda', 'currentPrice', 'beta'))
+
+
+def test_members_are_ranked_best_first(peers):
+    assert peers.top_peers('industry', 'Semiconductors', n=10) == ['NVDA', 'AVGO', 'AMD', 'INTC']
+    assert peers.top_peers('industry', 'Semiconductors', n=2, metric='employees') == ['INTC', 'NVDA']
+    assert peers.top_peers('sector', 'Technology', n=3) == ['AAPL', 'NVDA', 'AVGO']
+    assert peers.symbols == ['AAPL', 'NVDA', 'AVGO', 'JPM', 'AMD', 'INTC']
+    assert peers.top_peers('industry', 'Shipbuilding') == []
+    with pytest.raises(ValueError):
+        peers.top_peers('industry', 'Semiconductors', metric='beta')
+
+
+def test_peers_exclude_the_ticker_itself(peers):
+    assert peers.peers_of('avgo', n=2) == ('Semiconductors', ['NVDA', 'AMD'])
+    assert peers.peers_of('NVDA', n=2) == ('Semiconductors', ['AVGO', 'AMD'])
+    assert peers.peers_of('AAPL', group='sector', n=10) == ('Technology', ['NVDA', 'AVGO', 'AMD', 'INTC'])
+    assert peers.peers_of('AAPL') == ('Consumer Electronics', [])
+    assert peers.peers_of('TSLA') is None
+
+
+def test_symbols_missing_from_the_snapshot_fall_back_to_the_listing(peers, clock):
+    peers.clock = clock
+    peers.update_info({'NVDA': {'shortName': 'NVIDIA Corporation', 'marketCap': '3000', 'beta': 1.7}})
+    results, missing, outdated = peers.peer_info(['NVDA', 'JPM', 'TSLA'])
+    assert missing == ['JPM', 'TSLA'] and outdated == []
+    assert results[0]['beta'] == 1.7 and results[0]['fetched_at'] == clock.now
+    assert results[1] == {'shortName': 'JPMorgan', 'marketCap': '600', 'ebitda': None,
+                          'currentPrice': '210', 'beta': None, 'fetched_at': None}
+    assert len(results) == 2
+    assert peers.stats()['info_snapshot'] == 1 and peers.stats()['info_updated_at'] == clock.now
+
+
+def test_old_entries_are_reported_outdated(peers, clock):
+    peers.clock = clock
+    peers.update_info({'NVDA': {'shortName': 'NVIDIA'}})
+    clock.advance(1800)
+    peers.update_info({'AVGO': {'shortName': 'Broadcom'}})
+    clock.advance(1800)
+    results, missing, outdated = peers.peer_info(['NVDA', 'AVGO'], max_age=3600)
+    assert outdated == ['NVDA'] and missing == []
+    assert [result['fetched_at'] for result in results] == [clock.now - 3600, clock.now - 1800]
+    assert peers.stats()['info_oldest'] == clock.now - 3600
+
+
+def test_peers_route_refreshes_outdated_entries_in_the_background(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    fills = []
+
+    async def fill_peer_info(tickers, refresh=False):
+        fills.append((tickers, refresh))
+        main.peer_fills.difference_update(tickers)
+
+    monkeypatch.setattr(main, 'fill_peer_info', fill_peer_info)
+    monkeypatch.setattr(main.peers, 'info', {})
+    symbol, other = main.peers.symbols[:2]
+    main.peers.update_info({symbol: {'shortName': 'Fresh'}, other: {'shortName': 'Old'}})
+    fetched_at = main.peers.info[other][1] - main.PEERS_REFRESH_INTERVAL
+    main.peers.info[other] = (main.peers.info[other][0], fetched_at)
+    third = main.peers.symbols[2]
+    monkeypatch.setattr(main.peers, 'top_peers', lambda *args: [symbol, other, third])
+    response = TestClient(main.app).get('/stocks/peers/sector/Technology', params={'fields': 'shortName'})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item['shortName'] for item in body[:2]] == ['Fresh', 'Old'] and body[1]['fetched_at'] == fetched_at
+    assert body[2]['fetched_at'] is None
+    assert fills == [([third], False), ([other], True)]
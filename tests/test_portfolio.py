@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+import pandas as pd
+import pytest
+import stock
+from cache import Data_Cache
+from models.portfolio import Position
+from portfolio import value_positions
+from stock import Data_Retriever, cluster_dates
+from tests.conftest import NASDAQ_CSV, Fake_Clock, history_frame
+
+
+class Fake_Download:
+    """Stand-in for yf.download(group_by='ticker'); ``failing`` tickers come back all-NaN."""
+
+    def __init__(self, failing=()) -> None:
+        self.failing = set(failing)
+        self.calls = []
+
+    def __call__(self, tickers, start, end, **kwargs):
+        self.calls.append((tuple(tickers), start, end))
+        frames = dict()
+        for ticker in tickers:
+            frame = history_frame(start, end)
+            frames[ticker] = frame * float('nan') if ticker in self.failing else frame
+        return pd.concat(frames, axis=1)
+
+
+def close_on(day):
+    frame = history_frame(day, day + timedelta(days=1))
+    return float(frame['Close'].iloc[0])
+
+
+@pytest.fixture
+def retriever():
+    retriever = Data_Retriever(NASDAQ_CSV, cache=Data_Cache(clock=Fake_Clock()))
+    yield retriever
+    retriever.shutdown()
+
+
+def test_cluster_dates_splits_on_gaps():
+    pairs = [('AAPL', date(2024, 1, 2)), ('MSFT', date(2024, 6, 3)), ('MSFT', date(2024, 1, 31)),
+             ('AAPL', date(2024, 3, 15))]
+    assert cluster_dates(pairs, gap_days=30) == [
+        [('AAPL', date(2024, 1, 2)), ('MSFT', date(2024, 1, 31))],
+        [('AAPL', date(2024, 3, 15))],
+        [('MSFT', date(2024, 6, 3))],
+    ]
+    assert cluster_dates([]) == []
+
+
+def test_closes_are_downloaded_per_cluster_and_cached_for_a_day(retriever, monkeypatch):
+    download = Fake_Download()
+    monkeypatch.setattr(stock.yf, 'download', download)
+    positions = [('aapl', date(2024, 1, 2)), ('MSFT', date(2024, 1, 10)), ('AAPL', date(2024, 6, 3)),
+                 ('AAPL', date(2024, 1, 6))]  # a Saturday
+    closes = retriever.get_closes(positions)
+    # the gap between January and June is not downloaded
+    assert download.calls == [(('AAPL', 'MSFT'), '2024-01-02', '2024-01-11'), (('AAPL',), '2024-06-03', '2024-06-04')]
+    assert closes[('AAPL', date(2024, 1, 2))] == pytest.approx(close_on(date(2024, 1, 2)))
+    assert closes[('AAPL', date(2024, 6, 3))] == pytest.approx(close_on(date(2024, 6, 3)))
+    assert closes[('AAPL', date(2024, 1, 6))] is None
+
+    assert retriever.get_closes(positions) == closes and len(download.calls) == 2
+    # adjusted closes change with every later dividend or split
+    retriever.cache.clock.advance(24 * 60 * 60)
+    retriever.get_closes(positions)
+    assert len(download.calls) == 4
+
+
+def test_failed_tickers_are_not_cached(retriever, monkeypatch):
+    download = Fake_Download(failing={'MSFT'})
+    monkeypatch.setattr(stock.yf, 'download', download)
+    positions = [('AAPL', date(2024, 1, 2)), ('MSFT', date(2024, 1, 2))]
+    assert retriever.get_closes(positions)[('MSFT', date(2024, 1, 2))] is None
+    retriever.get_closes(positions)
+    assert download.calls[1][0] == ('MSFT',)
+
+
+def test_value_positions():
+    positions = [Position(ticker='aapl', date=date(2024, 1, 2), quantity=10),
+                 Position(ticker='MSFT', date=date(2024, 1, 6), quantity=1),
+                 Position(ticker='GOOG', date=date(2024, 1, 2), quantity=2)]
+    closes = {('AAPL', date(2024, 1, 2)): 100.0, ('MSFT', date(2024, 1, 6)): None,
+              ('GOOG', date(2024, 1, 2)): 50.0}
+    result = value_positions(positions, closes, {'AAPL': 110.0, 'MSFT': 400.0, 'GOOG': None})
+    aapl, msft, goog = result['positions']
+    assert aapl['cost_basis'] == 1000.0 and aapl['market_value'] == 1100.0 and aapl['pnl_pct'] == 10.0
+    assert 'error' in msft and 'error' in goog
+    assert result['totals'] == {'cost_basis': 1000.0, 'market_value': 1100.0, 'pnl': 100.0, 'pnl_pct': 10.0,
+                                'valued': 1, 'errors': 2}
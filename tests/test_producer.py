@@ -0,0 +1,62 @@
+import asyncio
+import orjson
+import pytest
+from producer import Kafka_Pipeline, Memory_Producer, Producer_Queue_Full
+
+
+class Unacknowledged_Producer(Memory_Producer):
+    """Memory_Producer whose broker only answers on flush()."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.flushes = 0
+
+    def poll(self, timeout=0):
+        return 0
+
+    def flush(self, timeout=None):
+        self.flushes += 1
+        super().poll()
+        return len(self)
+
+
+def test_a_full_queue_pushes_back():
+    # not started: nothing drains the queue
+    pipeline = Kafka_Pipeline(Memory_Producer, max_queue=2, enqueue_timeout=0.01)
+    pipeline.send('financial-updates', {'ticker': 'AAPL'}, key='AAPL')
+    pipeline.send('financial-updates', {'ticker': 'MSFT'}, key='MSFT')
+    with pytest.raises(Producer_Queue_Full):
+        pipeline.send('financial-updates', {'ticker': 'GOOG'}, key='GOOG')
+    with pytest.raises(Producer_Queue_Full):
+        asyncio.run(pipeline.publish('financial-updates', {'ticker': 'GOOG'}, key='GOOG'))
+    stats = pipeline.stats()
+    assert stats['enqueued'] == 2 and stats['rejected'] == 2 and stats['queued'] == 2
+
+
+def test_queued_messages_are_delivered_and_flushed_once_on_shutdown():
+    producer = Unacknowledged_Producer()
+    pipeline = Kafka_Pipeline(lambda: producer, max_queue=1000)
+    outcomes = []
+    pipeline.start()
+    for i in range(500):
+        pipeline.send('financial-updates', {'ticker': f'T{i}', 'seq': i}, key=f'T{i}', on_delivery=outcomes.append)
+    pipeline.shutdown()
+    assert producer.flushes == 1
+    assert [orjson.loads(message.value())['seq'] for message in producer.messages] == list(range(500))
+    assert outcomes == [None] * 500
+    stats = pipeline.stats()
+    assert stats['delivered'] == 500 and stats['queued'] == 0 and stats['undelivered_on_shutdown'] == 0
+    assert not stats['running']
+
+
+def test_delivery_failures_are_reported():
+    producer = Memory_Producer(fail=lambda topic, key, value: 'broker down' if key == b'MSFT' else None)
+    pipeline = Kafka_Pipeline(lambda: producer)
+    outcomes = dict()
+    pipeline.start()
+    for ticker in ('AAPL', 'MSFT'):
+        pipeline.send('financial-updates', {'ticker': ticker}, key=ticker,
+                      on_delivery=lambda error, ticker=ticker: outcomes.__setitem__(ticker, error))
+    pipeline.shutdown()
+    assert outcomes == {'AAPL': None, 'MSFT': 'broker down'}
+    assert pipeline.stats()['failed'] == 1 and 'MSFT' in pipeline.stats()['last_error']
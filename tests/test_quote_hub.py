@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from quote_hub import Quote_Hub, Quote_Subscriber, parse_tickers
+
+
+class Fake_Quotes:
+    """Fake upstream: one tick per requested ticker, priced by poll number."""
+
+    def __init__(self) -> None:
+        self.batches = []
+        self.price = 100.0
+
+    async def __call__(self, tickers):
+        self.batches.append(list(tickers))
+        return {ticker: {'ticker': ticker, 'price': self.price} for ticker in tickers}
+
+
+async def park(_):
+    # polls only happen when a test calls poll() itself
+    await asyncio.Event().wait()
+
+
+def test_parse_tickers_accepts_lists_and_strings():
+    assert parse_tickers(['aapl', ' msft', 'AAPL', '']) == ['AAPL', 'MSFT']
+    assert parse_tickers('AAPL') == ['AAPL']
+    assert parse_tickers('aapl,msft') == ['AAPL', 'MSFT']
+    for value in (5, None, {'AAPL': 1}, [1, 2], ['AA PL']):
+        with pytest.raises(ValueError):
+            parse_tickers(value)
+
+
+def test_refcounted_subscriptions_and_poller_lifecycle():
+    async def scenario():
+        fetch = Fake_Quotes()
+        hub = Quote_Hub(fetch, batch_size=50, sleep=park)
+        first, second = Quote_Subscriber(), Quote_Subscriber()
+        hub.subscribe(first, ['AAPL', 'MSFT'])
+        hub.subscribe(second, 'AAPL')
+        await asyncio.sleep(0)
+        assert hub.refcounts == {'AAPL': 2, 'MSFT': 1} and hub.stats()['polling']
+        assert fetch.batches == [['AAPL', 'MSFT']]
+        assert {tick['ticker'] for tick in await second.next()} == {'AAPL'}
+        hub.unsubscribe(first, 'AAPL')
+        hub.unsubscribe(first)
+        assert hub.refcounts == {'AAPL': 1} and hub.stats()['connections'] == 1
+        task = hub._task
+        hub.unsubscribe(second)
+        await asyncio.gather(task, return_exceptions=True)
+        assert hub.refcounts == {} and not hub.stats()['polling'] and task.cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_one_upstream_call_per_batch():
+    async def scenario():
+        fetch = Fake_Quotes()
+        hub = Quote_Hub(fetch, batch_size=50, sleep=park)
+        subscribers = [Quote_Subscriber(max_tickers=50) for _ in range(3)]
+        for i, subscriber in enumerate(subscribers):
+            hub.subscribe(subscriber, [f'T{n}' for n in range(i * 40, i * 40 + 50)])
+        await asyncio.sleep(0)
+        fetch.batches.clear()
+        await hub.poll()
+        assert [len(batch) for batch in fetch.batches] == [50, 50, 30]
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_slow_consumer_keeps_only_the_newest_tick():
+    async def scenario():
+        fetch = Fake_Quotes()
+        hub = Quote_Hub(fetch, sleep=park)
+        subscriber = Quote_Subscriber()
+        hub.subscribe(subscriber, ['AAPL'])
+        await asyncio.sleep(0)
+        for price in (101.0, 102.0, 103.0):
+            fetch.price = price
+            await hub.poll()
+        ticks = await subscriber.next()
+        assert ticks == [{'ticker': 'AAPL', 'price': 103.0}]
+        assert subscriber.dropped == 3 and hub.stats()['dropped'] == 3
+        # an unchanged price is not sent again
+        await hub.poll()
+        assert not subscriber.ready.is_set()
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_many_subscribers_share_one_poll():
+    async def scenario():
+        fetch = Fake_Quotes()
+        hub = Quote_Hub(fetch, batch_size=50, sleep=park)
+        tickers = [f'T{n}' for n in range(20)]
+        subscribers = [Quote_Subscriber() for _ in range(2000)]
+        for i, subscriber in enumerate(subscribers):
+            hub.subscribe(subscriber, [tickers[(i + k) % 20] for k in range(5)])
+        await asyncio.sleep(0)
+        fetch.batches.clear()
+        fetch.price = 101.0
+        await hub.poll()
+        assert len(fetch.batches) == 1
+        received = await asyncio.gather(*(subscriber.next() for subscriber in subscribers))
+        assert all(len(ticks) == 5 for ticks in received)
+        assert hub.stats()['subscriptions'] == 10000 and hub.stats()['connections'] == 2000
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_websocket_rejects_invalid_subscriptions():
+    import main
+    client = TestClient(main.app)
+    with client.websocket_connect('/stocks/ws/quotes') as socket:
+        socket.send_json({'subscribe': 'aapl'})
+        assert socket.receive_json() == {'type': 'subscribed', 'tickers': ['AAPL']}
+        socket.send_json({'subscribe': 5})
+        assert socket.receive_json()['type'] == 'error'
+        socket.send_json({'subscribe': ['MSFT', 7]})
+        assert socket.receive_json()['type'] == 'error'
+        socket.send_json({'unsubscribe': 'AAPL'})
+        assert socket.receive_json() == {'type': 'subscribed', 'tickers': []}
@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+import pytest
+from yfinance.exceptions import YFRateLimitError
+from async_stock import Async_Data_Retriever
+from cache import Data_Cache
+from executor import Upstream_Executor
+from rate_limiter import Upstream_Limiter, Upstream_Rate_Limited, INTERACTIVE, BACKGROUND
+from stock import Data_Retriever
+from tests.conftest import NASDAQ_CSV, Fake_Clock
+
+
+class Throttling_Upstream:
+    """Fake yfinance that answers Too Many Requests to the first ``throttle`` calls."""
+
+    def __init__(self, throttle) -> None:
+        self.throttle = throttle
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, ticker='AAPL'):
+        with self._lock:
+            self.calls += 1
+            throttled = self.calls <= self.throttle
+        if throttled:
+            raise YFRateLimitError()
+        return {'symbol': ticker}
+
+
+def test_throttling_halves_the_limit_once_per_burst_then_recovers():
+    limiter = Upstream_Limiter(rate=10000, burst=100, max_limit=8, latency_target=5)
+    upstream = Throttling_Upstream(throttle=3)
+    # three calls admitted before the first throttle comes back: one decrease
+    started = [limiter.clock() for _ in range(3)]
+    for _ in range(3):
+        limiter.acquire()
+    for at in started:
+        try:
+            upstream()
+        except YFRateLimitError as e:
+            limiter.release(at, e)
+    stats = limiter.stats()
+    assert stats['limit'] == 4 and stats['throttled'] == 3 and stats['decreases'] == 1
+    # additive increase: back to the maximum after a few limits' worth of successes
+    for _ in range(40):
+        assert limiter.call(upstream) == {'symbol': 'AAPL'}
+    assert limiter.stats()['limit'] == 8
+
+
+def test_throttle_empties_the_bucket():
+    limiter = Upstream_Limiter(rate=20, burst=10, max_limit=4)
+    with pytest.raises(YFRateLimitError):
+        limiter.call(Throttling_Upstream(throttle=1))
+    assert limiter.stats()['tokens'] < 1
+    started = time.monotonic()
+    limiter.call(lambda: None)
+    # the next call waited for a token to be refilled
+    assert time.monotonic() - started >= 0.03
+
+
+def test_interactive_calls_are_admitted_before_background():
+    limiter = Upstream_Limiter(rate=10000, burst=100, max_limit=1, max_wait=5)
+    limiter.acquire()
+    admitted = []
+
+    def wait(priority):
+        limiter.acquire(priority)
+        admitted.append(priority)
+        limiter.release(limiter.clock())
+
+    background = threading.Thread(target=wait, args=(BACKGROUND,))
+    background.start()
+    while limiter.stats()['queued'][BACKGROUND] == 0:
+        time.sleep(0.001)
+    interactive = threading.Thread(target=wait, args=(INTERACTIVE,))
+    interactive.start()
+    while limiter.stats()['queued'][INTERACTIVE] == 0:
+        time.sleep(0.001)
+    limiter.release(limiter.clock())
+    background.join(5)
+    interactive.join(5)
+    assert admitted == [INTERACTIVE, BACKGROUND]
+
+
+def test_background_share_of_the_limit():
+    limiter = Upstream_Limiter(rate=10000, burst=100, max_limit=4, max_wait=0.05, background_share=0.5)
+    limiter.acquire(BACKGROUND)
+    limiter.acquire(BACKGROUND)
+    with pytest.raises(Upstream_Rate_Limited):
+        limiter.acquire(BACKGROUND)
+    limiter.acquire(INTERACTIVE)
+    assert limiter.stats()['rejected'] == {INTERACTIVE: 0, BACKGROUND: 1}
+
+
+def test_cache_hits_do_not_wait_behind_the_limiter():
+    limiter = Upstream_Limiter(rate=10000, burst=100, max_limit=1, max_wait=2)
+    retriever = Data_Retriever(NASDAQ_CSV, cache=Data_Cache(), limiter=limiter)
+    retriever._fetch_info = Throttling_Upstream(throttle=0)
+    retriever.cache.set('company-overview', 'AAPL', {'symbol': 'AAPL'})
+    executor = Upstream_Executor(max_workers=2, max_queue=4, timeout=5)
+
+    async def scenario():
+        executor.start()
+        stocks = Async_Data_Retriever(retriever, executor)
+        limiter.acquire()  # the only upstream slot is taken
+        # every executor worker blocks waiting for admission
+        misses = [asyncio.ensure_future(stocks.company_overview(ticker)) for ticker in ('MSFT', 'GOOG')]
+        while executor.active < 2:
+            await asyncio.sleep(0.005)
+        started = time.monotonic()
+        hit = await asyncio.wait_for(stocks.company_overview('aapl'), 1)
+        waited = time.monotonic() - started
+        limiter.release(limiter.clock())
+        return hit, waited, await asyncio.gather(*misses)
+
+    try:
+        hit, waited, misses = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+        retriever.shutdown()
+    assert hit == {'symbol': 'AAPL'} and waited < 0.5
+    assert misses == [{'symbol': 'MSFT'}, {'symbol': 'GOOG'}]
+    assert retriever._fetch_info.calls == 2
+    assert retriever.cache.stats()['hits'] == 1
+
+
+def test_stale_hits_do_not_wait_behind_the_limiter():
+    clock = Fake_Clock()
+    limiter = Upstream_Limiter(rate=10000, burst=100, max_limit=1, max_wait=2)
+    retriever = Data_Retriever(NASDAQ_CSV, cache=Data_Cache(clock=clock), limiter=limiter)
+    retriever._fetch_info = Throttling_Upstream(throttle=0)
+    retriever.cache.set('company-overview', 'AAPL', {'symbol': 'AAPL', 'old': True})
+    clock.advance(retriever.cache.ttl_for('company-overview') + 1)
+    executor = Upstream_Executor(max_workers=2, max_queue=4, timeout=5)
+
+    async def scenario():
+        executor.start()
+        stocks = Async_Data_Retriever(retriever, executor)
+        limiter.acquire()
+        misses = [asyncio.ensure_future(stocks.company_overview(ticker)) for ticker in ('MSFT', 'GOOG')]
+        while executor.active < 2:
+            await asyncio.sleep(0.005)
+        started = time.monotonic()
+        stale = await asyncio.wait_for(stocks.company_overview('aapl'), 1)
+        waited = time.monotonic() - started
+        limiter.release(limiter.clock())
+        return stale, waited, await asyncio.gather(*misses)
+
+    try:
+        stale, waited, misses = asyncio.run(scenario())
+        deadline = time.monotonic() + 5
+        while retriever.stale_stats()['revalidations'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.005)
+    finally:
+        executor.shutdown()
+        retriever.shutdown()
+    assert stale == {'symbol': 'AAPL', 'old': True} and waited < 0.5
+    assert misses == [{'symbol': 'MSFT'}, {'symbol': 'GOOG'}]
+    # the stale value was refreshed in the background, not by the request
+    assert retriever.stale_stats()['stale_served'] == 1
+    assert retriever.stale_stats()['revalidations'] == 1
+    assert retriever.cache.peek('company-overview', 'AAPL') == {'symbol': 'aapl'}
+    assert retriever._fetch_info.calls == 3
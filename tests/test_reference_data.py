@@ -0,0 +1,115 @@
+import asyncio
+import os
+import shutil
+import threading
+import pytest
+from reference_data import Reference_Data_Manager
+from stock import Data_Retriever
+from tests.conftest import NASDAQ_CSV
+
+
+def listing_versions():
+    """The full listing and one with only the first half of its rows."""
+    with open(NASDAQ_CSV) as file:
+        lines = file.readlines()
+    return ''.join(lines), ''.join(lines[:len(lines) // 2])
+
+
+def replace(path, content):
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as file:
+        file.write(content)
+    os.replace(temporary, path)
+
+
+@pytest.fixture
+def watched(tmp_path):
+    path = str(tmp_path / 'nasdaq.csv')
+    shutil.copy(NASDAQ_CSV, path)
+    retriever = Data_Retriever(path)
+    manager = Reference_Data_Manager(interval=0)
+    manager.watch('nasdaq', path, retriever.reload)
+    yield path, retriever, manager
+    retriever.shutdown()
+
+
+def test_readers_see_whole_listings_while_the_file_is_rewritten(watched):
+    path, retriever, manager = watched
+    full, half = listing_versions()
+    done = threading.Event()
+    problems = []
+
+    def read():
+        last_version = 0
+        while not done.is_set():
+            listing = retriever.listing
+            if listing.universe.store is not listing.store or listing.search_index.universe is not listing.universe:
+                problems.append('mixed listing')
+            if len(listing.universe.symbols) != len(listing.store):
+                problems.append('universe size')
+            if listing.version < last_version:
+                problems.append('version went back')
+            last_version = listing.version
+            symbol = listing.universe.symbols[len(listing.store) - 1]
+            listing.store[symbol]
+
+    def poll():
+        while not done.is_set():
+            manager.check()
+
+    threads = [threading.Thread(target=read) for _ in range(4)] + [threading.Thread(target=poll)]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(40):
+            replace(path, half if i % 2 == 0 else full)
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join(10)
+    manager.check()
+    assert problems == []
+    # the last write (full) is what is served once the poller caught up
+    assert len(retriever.listing.store) == len(Data_Retriever(NASDAQ_CSV).listing.store)
+    status = manager.status()['files']['nasdaq']
+    assert status['reloads'] >= 1 and status['failures'] == 0 and status['last_error'] is None
+    assert retriever.listing.version == status['version']
+
+
+def test_unreadable_file_keeps_the_previous_listing(watched):
+    path, retriever, manager = watched
+    listing = retriever.listing
+    replace(path, "Ticker,Company\nAAPL,Apple\n")
+    assert manager.check() == []
+    assert retriever.listing is listing
+    status = manager.status()['files']['nasdaq']
+    assert status['failures'] == 1 and status['last_error'].startswith('ValueError')
+    # put back as it was: nothing to reload, and no error any more
+    replace(path, listing_versions()[0])
+    assert manager.check() == [] and retriever.listing is listing
+    assert manager.status()['files']['nasdaq']['last_error'] is None
+    replace(path, listing_versions()[1])
+    assert manager.check() == ['nasdaq']
+    assert manager.status()['files']['nasdaq']['failures'] == 1
+
+
+def test_poller_counts_failed_checks(watched):
+    path, retriever, manager = watched
+
+    def fail(names):
+        raise RuntimeError("warm-up failed")
+
+    manager.on_reload = fail
+    manager.interval = 0.01
+
+    async def scenario():
+        manager.start()
+        replace(path, listing_versions()[1])
+        while manager.check_errors == 0:
+            await asyncio.sleep(0.01)
+        await manager.stop()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    status = manager.status()
+    assert status['check_errors'] == 1 and status['last_check_error'] == 'RuntimeError: warm-up failed'
+    assert len(retriever.listing.store) < len(Data_Retriever(NASDAQ_CSV).listing.store)
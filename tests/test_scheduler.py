@@ -0,0 +1,101 @@
+import asyncio
+from scheduler import Refresh_Scheduler
+
+
+class Flaky_Task:
+    """Refresh task that fails its first ``failures`` runs."""
+
+    def __init__(self, failures=0) -> None:
+        self.failures = failures
+        self.runs = 0
+
+    async def __call__(self):
+        self.runs += 1
+        if self.runs <= self.failures:
+            raise ConnectionError("Too Many Requests")
+        return {'refreshed': self.runs}
+
+
+async def run_due(scheduler):
+    started = scheduler.run_due()
+    await asyncio.gather(*(task.running for task in started if task.running is not None))
+    return started
+
+
+def test_runs_are_spread_by_jitter(clock):
+    scheduler = Refresh_Scheduler(jitter=0.1, clock=clock, rand=lambda: 1.0)
+    task = scheduler.add('quotes', 60, Flaky_Task())
+    # the first run lands in the first jitter fraction of the interval
+    assert task.next_run == clock.now + 6
+
+    async def scenario():
+        assert await run_due(scheduler) == []
+        clock.advance(6)
+        assert await run_due(scheduler) == [task]
+
+    asyncio.run(scenario())
+    assert task.runs == 1 and task.last_result == {'refreshed': 1}
+    assert task.next_run == clock.now + 66
+    scheduler.rand = lambda: 0.0
+    assert scheduler._delay(task) == 54
+
+
+def test_failures_back_off_exponentially_up_to_the_cap(clock):
+    scheduler = Refresh_Scheduler(jitter=0, max_backoff=4, clock=clock, rand=lambda: 0.0)
+    run = Flaky_Task(failures=3)
+    task = scheduler.add('fundamentals', 10, run)
+
+    async def scenario():
+        delays = []
+        for _ in range(4):
+            clock.now = task.next_run
+            await run_due(scheduler)
+            delays.append(task.next_run - clock.now)
+        return delays
+
+    assert asyncio.run(scenario()) == [20, 40, 40, 10]
+    assert task.failures == 3 and task.consecutive_failures == 0 and task.last_error is None
+
+
+def test_due_tasks_are_deferred_while_the_executor_is_busy(clock):
+    busy = {'on': True}
+    scheduler = Refresh_Scheduler(busy=lambda: busy['on'], jitter=0, clock=clock, rand=lambda: 0.0)
+    run = Flaky_Task()
+    task = scheduler.add('quotes', 60, run)
+
+    async def scenario():
+        assert await run_due(scheduler) == []
+        assert await run_due(scheduler) == []
+        busy['on'] = False
+        assert await run_due(scheduler) == [task]
+
+    asyncio.run(scenario())
+    assert task.deferrals == 2 and run.runs == 1
+
+
+def test_wait_for_capacity_sleeps_until_idle(clock):
+    busy = iter([True, True, False])
+    slept = []
+
+    async def sleep(seconds):
+        slept.append(seconds)
+
+    scheduler = Refresh_Scheduler(busy=lambda: next(busy), poll=0.5, clock=clock, sleep=sleep)
+    asyncio.run(scheduler.wait_for_capacity())
+    assert slept == [0.5, 0.5] and scheduler.capacity_waits == 2
+
+
+def test_trigger_makes_a_task_due_now(clock):
+    scheduler = Refresh_Scheduler(jitter=0, clock=clock, rand=lambda: 0.0)
+    run = Flaky_Task()
+    task = scheduler.add('fundamentals', 6 * 60 * 60, run)
+
+    async def scenario():
+        await run_due(scheduler)
+        clock.advance(60)
+        assert await run_due(scheduler) == []
+        assert scheduler.trigger('fundamentals') and not scheduler.trigger('news')
+        assert await run_due(scheduler) == [task]
+
+    asyncio.run(scenario())
+    assert run.runs == 2 and scheduler.status()['tasks']['fundamentals']['runs'] == 2
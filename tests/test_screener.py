@@ -0,0 +1,90 @@
+import pytest
+from screener import Screener, Screen_Not_Ready
+from stock import Data_Retriever
+from tests.conftest import NASDAQ_CSV
+
+
+@pytest.fixture(scope='module')
+def screener():
+    screener = Screener(Data_Retriever(NASDAQ_CSV))
+    store = screener.retriever.listing.store
+    screener.update({symbol: {'trailingPE': float(i % 40), 'marketCap': 1e9 * (i + 1)}
+                     for i, symbol in enumerate(store.symbols)})
+    return screener
+
+
+def naive(screener, predicate):
+    store = screener.retriever.listing.store
+    return {symbol for i, symbol in enumerate(store.symbols) if predicate(store.row(i), i)}
+
+
+def symbols(result):
+    return {item['symbol'] for item in result['items']}
+
+
+def test_matches_a_row_by_row_filter(screener):
+    sector = screener.retriever.listing.store.row(0)[1]
+    result = screener.screen([{'field': 'sector', 'op': 'eq', 'value': sector},
+                              {'field': 'trailingPE', 'op': 'lt', 'value': 20}], limit=500)
+    expected = naive(screener, lambda row, i: row[1] == sector and i % 40 < 20)
+    assert result['total'] == len(expected) and symbols(result) == expected
+
+
+def test_in_and_between(screener):
+    store = screener.retriever.listing.store
+    sectors = [store.row(0)[1], 'No Such Sector']
+    result = screener.screen([{'field': 'sector', 'op': 'in', 'value': sectors},
+                              {'field': 'trailingPE', 'op': 'between', 'value': [5, 10]}], limit=500)
+    assert symbols(result) == naive(screener, lambda row, i: row[1] in sectors and 5 <= i % 40 <= 10)
+
+
+@pytest.mark.parametrize('condition', [
+    {'field': 'sector', 'op': 'eq', 'value': ['Technology']},
+    {'field': 'sector', 'op': 'ne', 'value': 3.0},
+    {'field': 'industry', 'op': 'in', 'value': 'Semiconductors'},
+    {'field': 'country', 'op': 'in', 'value': [1.0]},
+    {'field': 'trailingPE', 'op': 'gt', 'value': ['10']},
+    {'field': 'trailingPE', 'op': 'between', 'value': [1]},
+    {'field': 'sector', 'op': 'gt', 'value': 'A'},
+    {'field': 'nope', 'op': 'eq', 'value': 1},
+])
+def test_wrong_value_types_are_value_errors(screener, condition):
+    with pytest.raises(ValueError):
+        screener.screen([condition])
+
+
+def test_screen_route_rejects_a_list_for_eq():
+    from fastapi.testclient import TestClient
+    import main
+    response = TestClient(main.app).post('/stocks/screen', json={
+        'filters': [{'field': 'sector', 'op': 'eq', 'value': ['Technology']}]})
+    assert response.status_code == 400 and 'needs a name' in response.json()['error']
+
+
+def test_screens_on_metrics_wait_for_the_first_refresh():
+    screener = Screener(Data_Retriever(NASDAQ_CSV))
+    rows = len(screener.retriever.listing.store)
+    with pytest.raises(Screen_Not_Ready) as info:
+        screener.screen([{'field': 'trailingPE', 'op': 'lt', 'value': 20}])
+    assert info.value.fields == ['trailingPE'] and info.value.coverage == {'covered': 0, 'rows': rows}
+    with pytest.raises(Screen_Not_Ready):
+        screener.screen([], sort='-beta')
+    # market cap comes with the listing
+    result = screener.screen([{'field': 'marketCap', 'op': 'gt', 'value': 0}], limit=5)
+    assert result['coverage'] == {'covered': 0, 'rows': rows} and len(result['items']) == 5
+
+
+def test_coverage_is_reported_with_the_result(screener):
+    result = screener.screen([{'field': 'trailingPE', 'op': 'lt', 'value': 20}])
+    store = screener.retriever.listing.store
+    assert result['coverage'] == {'covered': len(store), 'rows': len(store)}
+
+
+def test_screen_route_answers_503_until_metrics_are_loaded(monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    monkeypatch.setattr(main, 'screener', Screener(main.stocks))
+    response = TestClient(main.app).post('/stocks/screen', json={
+        'filters': [{'field': 'trailingPE', 'op': 'lt', 'value': 20}]})
+    assert response.status_code == 503 and response.headers['Retry-After'] == '60'
+    assert response.json()['coverage']['covered'] == 0
@@ -0,0 +1,53 @@
+from search import Ticker_Search_Index
+from ticker_store import Ticker_Store
+from universe import Ticker_Universe
+
+COLUMNS = 'Symbol,Name,Last Sale,Net Change,% Change,Market Cap,Country,IPO Year,Volume,Sector,Industry'
+ROWS = [
+    ('BAC', 'Bank of America Corporation Common Stock', 300e9),
+    ('BAC^B', 'Bank of America Corporation Depositary Shares Series GG', 1e9),
+    ('BACK', 'IMAC Holdings Inc. Common Stock', 5e6),
+    ('BK', 'The Bank of New York Mellon Corporation Common Stock', 40e9),
+    ('BKNG', 'Booking Holdings Inc. Common Stock', 120e9),
+    ('MSFT', 'Microsoft Corporation Common Stock', 3000e9),
+]
+
+
+def index_of(tmp_path, rows=ROWS):
+    path = tmp_path / 'nasdaq.csv'
+    lines = [f'{symbol},{name},$1.00,0,0%,{cap},United States,2000,100,Finance,Banks' for symbol, name, cap in rows]
+    path.write_text('\n'.join([COLUMNS, *lines]) + '\n', encoding='utf-8')
+    return Ticker_Search_Index(Ticker_Universe(Ticker_Store.from_csv(str(path))))
+
+
+def matches(index, query, **kwargs):
+    return [(result['symbol'], result['match']) for result in index.results(query, **kwargs)]
+
+
+def test_symbol_prefixes_follow_the_lowercased_order(tmp_path):
+    index = index_of(tmp_path)
+    assert matches(index, 'back', fuzzy=False) == [('BACK', 'symbol')]
+    assert matches(index, 'bac^')[0] == ('BAC^B', 'symbol-prefix')
+    assert index.symbols == sorted(index.symbols)
+
+
+def test_exact_symbol_then_prefix_then_name_by_market_cap(tmp_path):
+    index = index_of(tmp_path)
+    assert matches(index, 'bk') == [('BK', 'symbol'), ('BKNG', 'symbol-prefix')]
+    assert matches(index, 'BAC', limit=3) == [('BAC', 'symbol'), ('BAC^B', 'symbol-prefix'),
+                                              ('BACK', 'symbol-prefix')]
+    assert matches(index, 'bank') == [('BAC', 'name'), ('BK', 'name'), ('BAC^B', 'name')]
+    assert matches(index, 'book') == [('BKNG', 'name-prefix')]
+    # every word has to match, and boilerplate words match nothing on their own
+    assert matches(index, 'bank mellon') == [('BK', 'name')]
+    assert matches(index, 'corporation') == []
+
+
+def test_one_typo_is_forgiven_for_longer_words(tmp_path):
+    index = index_of(tmp_path)
+    assert matches(index, 'microsft') == [('MSFT', 'fuzzy')]
+    assert matches(index, 'micorsoft') == [('MSFT', 'fuzzy')]  # both drop to 'micrsoft'
+    assert matches(index, 'mcrosft') == []
+    assert matches(index, 'bnak')[0] == ('BAC', 'fuzzy')
+    assert matches(index, 'bnk') == []  # too short for fuzzy matching
+    assert matches(index, 'microsft', fuzzy=False) == []
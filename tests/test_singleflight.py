@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+import pytest
+from singleflight import Single_Flight, Async_Single_Flight
+from stock import Data_Retriever
+from tests.conftest import NASDAQ_CSV
+
+
+class Slow_Upstream:
+    """Fake yfinance call that takes ``delay`` seconds and counts its calls."""
+
+    def __init__(self, delay=0.2, error=None) -> None:
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, ticker='AAPL'):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {'symbol': ticker.upper()}
+
+
+def run_concurrently(fn, n=20):
+    results, errors = [None] * n, [None] * n
+    barrier = threading.Barrier(n)
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = fn()
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, errors
+
+
+def test_concurrent_callers_share_one_fetch():
+    flights, upstream = Single_Flight(), Slow_Upstream()
+    results, errors = run_concurrently(lambda: flights.do(('company-overview', 'AAPL'), upstream))
+    assert upstream.calls == 1
+    assert results == [{'symbol': 'AAPL'}] * 20 and errors == [None] * 20
+    assert flights.stats() == {'calls': 20, 'executions': 1, 'coalesced': 19, 'in_flight': 0}
+    # finished flights are not reused
+    flights.do(('company-overview', 'AAPL'), upstream)
+    assert upstream.calls == 2
+
+
+def test_concurrent_callers_share_the_error():
+    flights, upstream = Single_Flight(), Slow_Upstream(error=KeyError('AAPL'))
+    results, errors = run_concurrently(lambda: flights.do('AAPL', upstream))
+    assert upstream.calls == 1 and all(isinstance(error, KeyError) for error in errors)
+
+
+def test_retriever_collapses_concurrent_overviews():
+    retriever = Data_Retriever(NASDAQ_CSV)
+    retriever._fetch_info = upstream = Slow_Upstream()
+    try:
+        results, _ = run_concurrently(lambda: retriever.company_overview('aapl'))
+        other, _ = run_concurrently(lambda: retriever.company_overview('MSFT'), n=5)
+    finally:
+        retriever.shutdown()
+    # one fetch per key, different keys do not share
+    assert upstream.calls == 2
+    assert results == [{'symbol': 'AAPL'}] * 20 and other == [{'symbol': 'MSFT'}] * 5
+
+
+def test_async_callers_share_one_fetch_and_survive_cancellation():
+    async def scenario():
+        flights, calls = Async_Single_Flight(), []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'info'
+
+        callers = [asyncio.ensure_future(flights.do('AAPL', fetch)) for _ in range(50)]
+        await asyncio.sleep(0)
+        # a client going away does not cancel the fetch the others wait on
+        callers[0].cancel()
+        results = await asyncio.gather(*callers[1:])
+        assert calls == [1] and results == ['info'] * 49
+        assert flights.stats()['coalesced'] == 49 and flights.stats()['in_flight'] == 0
+        with pytest.raises(asyncio.CancelledError):
+            await callers[0]
+
+    asyncio.run(scenario())
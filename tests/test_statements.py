@@ -0,0 +1,57 @@
+import math
+import pandas as pd
+from stock import normalize_statement, records_to_columnar
+
+PERIODS = [pd.Timestamp('2024-09-30'), pd.Timestamp('2023-09-30'), pd.Timestamp('2022-09-30')]
+
+
+def old_records(df):
+    """get_balance_sheet before normalize_statement."""
+    df_str = df.astype(str)
+    dct = df_str.to_dict()
+    balance_sheet = {k.strftime('%Y-%m-%d'): v for k, v in dct.items()}
+    res = list()
+    for key, value in balance_sheet.items():
+        value['year'] = key
+        res.append(value)
+    return res
+
+
+def statement():
+    return pd.DataFrame({
+        PERIODS[0]: [391035000000.0, 15408095000, 0.25, float('nan')],
+        PERIODS[1]: [383285000000.0, 15812547000, float('nan'), 7],
+        PERIODS[2]: [float('nan'), 16325819000, 0.3, 8],
+    }, index=['Total Revenue', 'Diluted Average Shares', 'Tax Rate', 'Employees'], dtype=object)
+
+
+def test_records_match_the_old_rows_with_numbers_kept():
+    df = statement()
+    new, old = normalize_statement(df), old_records(df)
+    assert [list(record) for record in new] == [list(record) for record in old]
+    for new_record, old_record in zip(new, old):
+        for field, value in new_record.items():
+            # old values were strings; a missing one was 'nan' (still NaN with pandas 3's str dtype)
+            if value is None:
+                assert pd.isna(old_record[field]) or old_record[field] == 'nan'
+            else:
+                assert old_record[field] == str(value)
+    assert new[1]['Employees'] == 7 and isinstance(new[1]['Employees'], int)
+    assert new[0]['Employees'] is None and new[2]['Total Revenue'] is None
+
+
+def test_float_frames_and_shapes_agree():
+    df = statement().astype(float)
+    records = normalize_statement(df)
+    assert [record['year'] for record in records] == ['2024-09-30', '2023-09-30', '2022-09-30']
+    assert records[0]['Total Revenue'] == 391035000000.0 and records[0]['Employees'] is None
+    assert not any(isinstance(value, float) and math.isnan(value) for record in records for value in record.values())
+    assert normalize_statement(df, 'columnar') == records_to_columnar(records)
+    # the frame itself is left alone
+    assert df.isna().to_numpy().sum() == 3
+
+
+def test_empty_statement():
+    for df in (pd.DataFrame(), pd.DataFrame(index=['Total Revenue'], columns=PERIODS[:0], dtype=float)):
+        assert normalize_statement(df) == old_records(df) == []
+        assert normalize_statement(df, 'columnar') == {'periods': [], 'fields': dict.fromkeys(df.index, [])}
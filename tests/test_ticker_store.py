@@ -0,0 +1,26 @@
+import csv
+import ticker_store
+from ticker_store import Ticker_Store, load_ticker_store, snapshot_status
+from tests.conftest import NASDAQ_CSV
+
+
+def test_snapshot_matches_csv(tmp_path):
+    path = str(tmp_path / 'nasdaq.snap')
+    store = load_ticker_store(NASDAQ_CSV, path)
+    assert dict(store) == dict(Ticker_Store.from_csv(NASDAQ_CSV))
+    with open(NASDAQ_CSV, newline='') as file:
+        assert len(store) == len({row['Symbol'] for row in csv.DictReader(file)})
+    # reused while the CSV is unchanged
+    rebuilds = snapshot_status['rebuilds']
+    assert dict(load_ticker_store(NASDAQ_CSV, path)) == dict(store)
+    assert snapshot_status['rebuilds'] == rebuilds
+
+
+def test_unreadable_snapshot_is_rebuilt_and_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(ticker_store, 'snapshot_status', dict(snapshot_status, unreadable=0, last_error=None))
+    path = tmp_path / 'nasdaq.snap'
+    path.write_bytes(b'not a snapshot')
+    store = load_ticker_store(NASDAQ_CSV, str(path))
+    assert len(store) == len(Ticker_Store.from_csv(NASDAQ_CSV))
+    assert ticker_store.snapshot_status['unreadable'] == 1
+    assert ticker_store.snapshot_status['last_error'].startswith('ValueError')
@@ -0,0 +1,238 @@
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+
+NASDAQ_SNAPSHOT_PATH = os.getenv("NASDAQ_SNAPSHOT_PATH")
+
+SNAPSHOT_MAGIC = b"TKRSNAP1"
+_HEADER_LENGTH = struct.Struct("<I")
+
+# how load_ticker_store got on with the snapshot, shown by /reference/status
+snapshot_status = {'path': None, 'rebuilds': 0, 'unreadable': 0, 'last_error': None}
+
+
+class String_Column:
+    """Strings packed into one UTF-8 blob plus an offsets array.
+
+    Works the same over in-memory bytes or a memory-mapped snapshot. Indexing
+    decodes one string; the column is sorted by the store where needed so
+    ``bisect`` works on it directly.
+    """
+
+    def __init__(self, offsets, blob) -> None:
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_strings(cls, strings):
+        offsets = array('I', [0])
+        parts = []
+        size = 0
+        for string in strings:
+            encoded = string.encode()
+            parts.append(encoded)
+            size += len(encoded)
+            offsets.append(size)
+        return cls(offsets, b"".join(parts))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class Ticker_Store(Mapping):
+    """Column-oriented listing, sorted by symbol.
+
+    Behaves like the old ``ticker_dict``: ``store[symbol]`` returns
+    ``[name, sector, industry, country, market_cap_in_billions]``. Sector,
+    industry and country are stored once in small tables and referenced by
+    code, market caps live in a double array.
+    """
+
+    def __init__(self, symbols, names, sectors, industries, countries,
+                 sector_codes, industry_codes, country_codes, market_caps, source=None) -> None:
+        self.symbols = symbols
+        self.names = names
+        self.sectors = sectors
+        self.industries = industries
+        self.countries = countries
+        self.sector_codes = sector_codes
+        self.industry_codes = industry_codes
+        self.country_codes = country_codes
+        self.market_caps = market_caps
+        self.source = source or dict()
+        self._mmap = None
+
+    @classmethod
+    def from_csv(cls, path):
+        """Build from a NASDAQ screener CSV in a single pass over the rows."""
+        tables = (dict(), dict(), dict())
+        rows = dict()
+        with open(path, mode='r', newline='') as file:
+            reader = csv.reader(file)
+            header = [column.strip() for column in next(reader)]
+            symbol_at, name_at, sector_at, industry_at, country_at, cap_at = (
+                header.index(column) for column in
+                ('Symbol', 'Name', 'Sector', 'Industry', 'Country', 'Market Cap'))
+            for record in reader:
+                if not record:
+                    continue
+                symbol = record[symbol_at].strip()
+                codes = tuple(table.setdefault(record[at].strip(), len(table))
+                              for table, at in zip(tables, (sector_at, industry_at, country_at)))
+                try:
+                    market_cap = int(float(record[cap_at])) / 1000000000
+                except ValueError:
+                    market_cap = 0.0
+                # later rows win, as they did with the dict this replaces
+                rows[sys.intern(symbol)] = (record[name_at].strip(),) + codes + (market_cap,)
+
+        symbols = sorted(rows)
+        ordered = [rows.pop(symbol) for symbol in symbols]
+        sectors, industries, countries = (tuple(sys.intern(value) for value in table) for table in tables)
+        stat = os.stat(path)
+        return cls(
+            String_Column.from_strings(symbols),
+            String_Column.from_strings(row[0] for row in ordered),
+            sectors, industries, countries,
+            array('I', (row[1] for row in ordered)),
+            array('I', (row[2] for row in ordered)),
+            array('I', (row[3] for row in ordered)),
+            array('d', (row[4] for row in ordered)),
+            source={'path': os.path.abspath(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size},
+        )
+
+    def __len__(self):
+        return len(self.market_caps)
+
+    def position(self, symbol):
+        i = bisect_left(self.symbols, symbol)
+        if i < len(self) and self.symbols[i] == symbol:
+            return i
+        return None
+
+    def row(self, i):
+        return [self.names[i], self.sectors[self.sector_codes[i]], self.industries[self.industry_codes[i]],
+                self.countries[self.country_codes[i]], self.market_caps[i]]
+
+    def __getitem__(self, symbol):
+        i = self.position(symbol) if isinstance(symbol, str) else None
+        if i is None:
+            raise KeyError(symbol)
+        return self.row(i)
+
+    def __contains__(self, symbol):
+        return isinstance(symbol, str) and self.position(symbol) is not None
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def write_snapshot(self, path):
+        """Write a binary snapshot that from_snapshot() can memory-map. The
+        file is replaced atomically so concurrent readers never see a partial
+        write."""
+        sections = [
+            ('market_caps', self.market_caps, 'd'),
+            ('sector_codes', self.sector_codes, 'I'),
+            ('industry_codes', self.industry_codes, 'I'),
+            ('country_codes', self.country_codes, 'I'),
+            ('symbol_offsets', self.symbols.offsets, 'I'),
+            ('name_offsets', self.names.offsets, 'I'),
+            ('symbol_blob', self.symbols.blob, 'B'),
+            ('name_blob', self.names.blob, 'B'),
+        ]
+        layout, payload, offset = dict(), [], 0
+        for name, values, typecode in sections:
+            data = bytes(memoryview(values).cast('B')) if typecode != 'B' else bytes(values)
+            layout[name] = [offset, len(data), typecode]
+            payload.append(data + b"\0" * (-len(data) % 8))
+            offset += len(payload[-1])
+        header = json.dumps({
+            'sections': layout,
+            'sectors': self.sectors,
+            'industries': self.industries,
+            'countries': self.countries,
+            'source': self.source,
+        }).encode()
+        header += b" " * (-(len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size + len(header)) % 8)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            file.write(_HEADER_LENGTH.pack(len(header)))
+            file.write(header)
+            for data in payload:
+                file.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_snapshot(cls, path):
+        """Memory-map a snapshot read-only. Pages are shared through the OS
+        page cache by every worker mapping the same file."""
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        if bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a ticker snapshot")
+        start = len(SNAPSHOT_MAGIC) + _HEADER_LENGTH.size
+        (header_length,) = _HEADER_LENGTH.unpack_from(view, len(SNAPSHOT_MAGIC))
+        header = json.loads(bytes(view[start:start + header_length]))
+        base = start + header_length
+
+        def section(name):
+            offset, length, typecode = header['sections'][name]
+            data = view[base + offset:base + offset + length]
+            return data if typecode == 'B' else data.cast(typecode)
+
+        store = cls(
+            String_Column(section('symbol_offsets'), section('symbol_blob')),
+            String_Column(section('name_offsets'), section('name_blob')),
+            tuple(sys.intern(value) for value in header['sectors']),
+            tuple(sys.intern(value) for value in header['industries']),
+            tuple(sys.intern(value) for value in header['countries']),
+            section('sector_codes'), section('industry_codes'), section('country_codes'),
+            section('market_caps'),
+            source=header['source'],
+        )
+        store._mmap = mapped
+        return store
+
+
+def load_ticker_store(csv_path, snapshot_path=NASDAQ_SNAPSHOT_PATH):
+    """Ticker_Store for ``csv_path``. With a snapshot path the store is
+    memory-mapped from a snapshot, which is (re)built whenever the CSV
+    changed since it was written."""
+    if not snapshot_path:
+        return Ticker_Store.from_csv(csv_path)
+    snapshot_status['path'] = snapshot_path
+    stat = os.stat(csv_path)
+    if os.path.exists(snapshot_path):
+        try:
+            store = Ticker_Store.from_snapshot(snapshot_path)
+            source = store.source
+            if (source.get('path') == os.path.abspath(csv_path) and source.get('mtime_ns') == stat.st_mtime_ns
+                    and source.get('size') == stat.st_size):
+                return store
+        except (ValueError, KeyError, OSError) as e:
+            # rebuilt below; the error stays visible in the status
+            snapshot_status['unreadable'] += 1
+            snapshot_status['last_error'] = f"{type(e).__name__}: {e}"
+    Ticker_Store.from_csv(csv_path).write_snapshot(snapshot_path)
+    snapshot_status['rebuilds'] += 1
+    return Ticker_Store.from_snapshot(snapshot_path)
@@ -0,0 +1,86 @@
+from array import array
+from bisect import bisect_left
+
+SORTS = ('symbol', '-symbol', 'name', 'market_cap', '-market_cap')
+MAX_VIEWS = 512
+
+
+class Ticker_Universe:
+    """Read-only index over a Ticker_Store.
+
+    Rows are addressed by their position in the store, which is sorted by
+    symbol. Each sort order and each sector/industry/country posting list is
+    built once as a compact array, and every distinct filter combination is
+    materialized on first use, so paging through a result is a slice.
+    """
+
+    def __init__(self, store) -> None:
+        self.store = store
+        self.symbols = store.symbols
+        self.by_sector = self._postings(store.sector_codes, store.sectors)
+        self.by_industry = self._postings(store.industry_codes, store.industries)
+        self.by_country = self._postings(store.country_codes, store.countries)
+
+        caps = store.market_caps
+        by_symbol = range(len(store))
+        by_cap = array('I', sorted(by_symbol, key=lambda i: (-caps[i], i)))
+        names = store.names
+        self.orders = {
+            'symbol': by_symbol,
+            '-symbol': by_symbol[::-1],
+            'name': array('I', sorted(by_symbol, key=lambda i: (names[i].lower(), i))),
+            'market_cap': by_cap[::-1],
+            '-market_cap': by_cap,
+        }
+        # ascending caps aligned with orders['market_cap'] for bisecting
+        self._ascending_caps = array('d', (caps[i] for i in self.orders['market_cap']))
+        self._views = dict()
+
+    @staticmethod
+    def _postings(codes, table):
+        postings = [array('I') for _ in table]
+        for i, code in enumerate(codes):
+            postings[code].append(i)
+        return dict(zip(table, postings))
+
+    def __len__(self):
+        return len(self.store)
+
+    def select(self, sector=None, industry=None, country=None, min_market_cap=None, sort='symbol'):
+        """Positions matching every given filter, in ``sort`` order."""
+        if sort not in SORTS:
+            raise ValueError(f"Unknown sort {sort!r}, expected one of {list(SORTS)}")
+        key = (sector, industry, country, min_market_cap, sort)
+        view = self._views.get(key)
+        if view is not None:
+            return view
+
+        postings = [index.get(value, ()) for index, value in
+                    ((self.by_sector, sector), (self.by_industry, industry), (self.by_country, country))
+                    if value is not None]
+        order = self.orders[sort]
+        caps = self.store.market_caps
+        if min_market_cap is not None and not postings and sort in ('market_cap', '-market_cap'):
+            cut = bisect_left(self._ascending_caps, min_market_cap)
+            view = order[cut:] if sort == 'market_cap' else order[:len(order) - cut]
+        elif not postings and min_market_cap is None:
+            view = order
+        else:
+            postings.sort(key=len)
+            allowed = set(postings[0]) if postings else None
+            for other in postings[1:]:
+                allowed.intersection_update(other)
+            if sort == 'symbol' and len(postings) == 1 and min_market_cap is None:
+                view = postings[0]
+            else:
+                view = array('I', (i for i in order
+                                   if (allowed is None or i in allowed)
+                                   and (min_market_cap is None or caps[i] >= min_market_cap)))
+
+        if len(self._views) >= MAX_VIEWS:
+            self._views.clear()
+        self._views[key] = view
+        return view
+
+    def items(self, positions):
+        return {self.symbols[i]: self.store.row(i) for i in positions}